@@ -0,0 +1,44 @@
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+import numpy as np
+
+def indices_asof(cierres: np.ndarray, instantes: np.ndarray) -> np.ndarray:
+    """Índice de la última vela cerrada en cada instante (cierre <= instante); -1 si aún no había ninguna"""
+    return np.searchsorted(cierres, instantes, side='right') - 1
+
+def valores_asof(cierres: np.ndarray, valores: Dict[str, np.ndarray], instantes: np.ndarray) -> Dict[str, np.ndarray]:
+    """Valores vigentes en cada instante (NaN antes de la primera vela cerrada), sin reindexar ningún DataFrame"""
+    indices = indices_asof(cierres, instantes)
+    validos = indices >= 0
+    resultado = {}
+    for nombre, serie in valores.items():
+        columna = np.full(len(indices), np.nan)
+        columna[validos] = np.asarray(serie, dtype=np.float64)[indices[validos]]
+        resultado[nombre] = columna
+    return resultado
+
+class SerieAsOf:
+    """Últimos valores de una temporalidad mayor por hora de cierre, consultables a fecha de un instante en O(1)"""
+
+    def __init__(self, capacidad: int = 3):
+        self.cierres: Deque[int] = deque(maxlen=capacidad)
+        self.valores: Deque[Tuple] = deque(maxlen=capacidad)
+
+    def __len__(self) -> int:
+        return len(self.cierres)
+
+    def agregar(self, cierre: int, valores: Tuple):
+        """Registrar los valores de la vela que cierra en cierre (ms); si ya estaba, se sustituyen"""
+        if self.cierres and self.cierres[-1] == cierre:
+            self.valores[-1] = valores
+            return
+        self.cierres.append(cierre)
+        self.valores.append(valores)
+
+    def en(self, instante: int) -> Optional[Tuple]:
+        """Valores de la última vela cerrada en instante (None si ninguna de las retenidas lo estaba)"""
+        # Solo se retienen unas pocas velas: el recorrido desde la más reciente está acotado
+        for i in range(len(self.cierres) - 1, -1, -1):
+            if self.cierres[i] <= instante:
+                return self.valores[i]
+        return None
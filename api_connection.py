@@ -1,56 +1,123 @@
 import websockets
-import json
 import asyncio
 import hmac
 import hashlib
 import time
-from typing import Dict, Any, Callable
+from typing import Dict, Any, Callable, List, Optional
+from binance import AsyncClient
 from binance.client import Client
 from binance.exceptions import BinanceAPIException
-from config import API_KEY, API_SECRET, TESTNET
+from config import (API_KEY, API_SECRET, TESTNET, TTL_INFO_SIMBOLOS, MAX_STREAMS_POR_CONEXION,
+                    CONFIG_WEBSOCKET, CONFIG_ENDPOINTS)
+from registro_simbolos import RegistroSimbolos
+from decodificacion import decodificar, es_kline_parcial
 
 class APIConnection:
     def __init__(self):
-        self.base_url = 'https://testnet.binancefuture.com' if TESTNET else 'https://fapi.binance.com'
-        self.ws_url = 'wss://stream.binancefuture.com/ws' if TESTNET else 'wss://fstream.binance.com/ws'
-        self.client = Client(API_KEY, API_SECRET, testnet=TESTNET)
-        self.ws_connection = None
+        self.base_url = CONFIG_ENDPOINTS['rest'] or ('https://testnet.binancefuture.com' if TESTNET else 'https://fapi.binance.com')
+        ws = CONFIG_ENDPOINTS['ws'] or ('wss://stream.binancefuture.com' if TESTNET else 'wss://fstream.binance.com')
+        self.ws_url = f"{ws}/ws"
+        # Endpoint combinado: varios streams multiplexados en una sola conexión
+        self.stream_url = f"{ws}/stream"
+        if CONFIG_ENDPOINTS['rest']:
+            # Sin ping inicial: apuntaría a api.binance.com antes de cambiar las URLs
+            self.client = self.apuntar_cliente(Client(API_KEY, API_SECRET, ping=False))
+        else:
+            self.client = Client(API_KEY, API_SECRET, testnet=TESTNET)
+        self.simbolos = RegistroSimbolos(self.client, TTL_INFO_SIMBOLOS)
+        # Cliente asíncrono con sesión HTTP persistente (keep-alive), creado dentro del bucle de eventos
+        self.async_client = None
+        # Código de Binance de la última orden rechazada (se consulta justo después de recibir None)
+        self.ultimo_error_orden: Optional[int] = None
+        self.ws_connections = []
         self.callbacks = {}
+        self.callbacks_conexion = []
+        # Si hay pipeline, la lectura del WebSocket solo decodifica y encola
+        self.pipeline = None
+        self.mensajes_recibidos = 0
+        
+    def apuntar_cliente(self, client):
+        """Dirigir las peticiones REST de un cliente de python-binance a CONFIG_ENDPOINTS['rest']"""
+        client.API_URL = f"{self.base_url}/api"
+        client.FUTURES_URL = f"{self.base_url}/fapi"
+        client.FUTURES_DATA_URL = f"{self.base_url}/futures/data"
+        return client
+    
+    async def conectar_streams(self, streams: list):
+        """Repartir los streams en el mínimo de conexiones combinadas que permite Binance"""
+        grupos = [streams[i:i + MAX_STREAMS_POR_CONEXION] for i in range(0, len(streams), MAX_STREAMS_POR_CONEXION)]
+        print(f"Suscribiendo {len(streams)} streams en {len(grupos)} conexiones")
+        await asyncio.gather(*(self.connect_websocket(grupo) for grupo in grupos))
         
     async def connect_websocket(self, streams: list):
-        """Conectar a WebSocket con los streams especificados"""
+        """Mantener una conexión WebSocket con los streams especificados, reconectando si se cae"""
         stream_str = '/'.join(streams)
-        url = f"{self.ws_url}/{stream_str}"
+        url = f"{self.stream_url}?streams={stream_str}"
+        espera = CONFIG_WEBSOCKET['backoff_inicial']
         
-        try:
-            self.ws_connection = await websockets.connect(url)
-            print(f"Conectado a WebSocket: {url}")
-            
-            # Mantener la conexión activa
-            while True:
-                try:
-                    message = await self.ws_connection.recv()
-                    data = json.loads(message)
-                    
-                    # Ejecutar callback correspondiente
-                    if 'stream' in data:
-                        stream_name = data['stream']
-                        if stream_name in self.callbacks:
-                            self.callbacks[stream_name](data['data'])
-                    else:
-                        # Mensaje individual (no multiplexado)
-                        if 'e' in data and data['e'] in self.callbacks:
-                            self.callbacks[data['e']](data)
-                            
-                except websockets.exceptions.ConnectionClosed:
-                    print("Conexión WebSocket cerrada")
-                    break
-                except Exception as e:
-                    print(f"Error en WebSocket: {e}")
-                    break
+        while True:
+            ws_connection = None
+            try:
+                ws_connection = await websockets.connect(url)
+                self.ws_connections.append(ws_connection)
+                print(f"Conectado a WebSocket con {len(streams)} streams")
+                espera = CONFIG_WEBSOCKET['backoff_inicial']
+                
+                # Recuperar las velas perdidas antes de procesar mensajes en vivo; los mensajes
+                # que lleguen mientras tanto esperan en el buffer de la conexión
+                for callback in self.callbacks_conexion:
+                    try:
+                        await callback(streams)
+                    except Exception as e:
+                        print(f"Error recuperando datos tras la conexión: {e}")
+                
+                # Mantener la conexión activa; el watchdog reinicia si no llegan mensajes
+                while True:
+                    message = await asyncio.wait_for(
+                        ws_connection.recv(), timeout=CONFIG_WEBSOCKET['timeout_sin_mensajes']
+                    )
+                    await self.recibir_mensaje(message)
                     
+            except asyncio.TimeoutError:
+                print(f"Sin mensajes en {CONFIG_WEBSOCKET['timeout_sin_mensajes']}s, reiniciando WebSocket")
+            except websockets.exceptions.ConnectionClosed:
+                print("Conexión WebSocket cerrada")
+            except Exception as e:
+                print(f"Error en WebSocket: {e}")
+            finally:
+                if ws_connection is not None:
+                    self.ws_connections.remove(ws_connection)
+                    await ws_connection.close()
+            
+            print(f"Reconectando WebSocket en {espera}s...")
+            await asyncio.sleep(espera)
+            espera = min(espera * 2, CONFIG_WEBSOCKET['backoff_maximo'])
+    
+    async def recibir_mensaje(self, message):
+        """Decodificar un mensaje y entregarlo al pipeline o, si no hay, a su callback"""
+        self.mensajes_recibidos += 1
+        # Las klines sin cerrar solo le interesan al grabador: sin él se descartan sin decodificar
+        if (self.pipeline is None or self.pipeline.grabador is None) and es_kline_parcial(message):
+            return
+        clave, payload = decodificar(message)
+        
+        if self.pipeline is not None:
+            await self.pipeline.recibir(clave, payload, message)
+        else:
+            self.despachar_mensaje(clave, payload)
+    
+    def despachar_mensaje(self, clave: str, payload: Dict):
+        """Ejecutar el callback correspondiente a un stream o tipo de evento"""
+        try:
+            if clave in self.callbacks:
+                self.callbacks[clave](payload)
         except Exception as e:
-            print(f"Error conectando a WebSocket: {e}")
+            # Un error en un callback no debe tumbar la conexión
+            print(f"Error procesando mensaje de WebSocket: {e}")
+    
+    def register_reconnect_callback(self, callback: Callable):
+        """Registrar una corrutina que se ejecuta tras cada (re)conexión con la lista de streams"""
+        self.callbacks_conexion.append(callback)
     
     def register_callback(self, stream_name: str, callback: Callable):
         """Registrar un callback para un stream específico"""
@@ -64,14 +131,19 @@ class APIConnection:
             print(f"Error obteniendo información de cuenta: {e}")
             return None
     
-    def get_symbol_info(self, symbol: str):
-        """Obtener información de un símbolo"""
+    async def get_account_info_async(self):
+        """Obtener información de la cuenta sin bloquear el bucle de eventos"""
         try:
-            return self.client.futures_exchange_info()
+            client = await self.obtener_async_client()
+            return await client.futures_account()
         except BinanceAPIException as e:
-            print(f"Error obteniendo información del símbolo: {e}")
+            print(f"Error obteniendo información de cuenta: {e}")
             return None
     
+    def get_symbol_info(self, symbol: str):
+        """Obtener información de un símbolo (filtros y precisión) desde la caché"""
+        return self.simbolos.obtener(symbol)
+    
     def set_leverage(self, symbol: str, leverage: int):
         """Establecer apalancamiento"""
         try:
@@ -90,25 +162,30 @@ class APIConnection:
                 print(f"Error estableciendo tipo de margen: {e}")
             return None
     
+    def _parametros_orden(self, symbol: str, side: str, quantity: float, order_type: str,
+                          price: float = None, stop_price: float = None, reduce_only: bool = False) -> Dict[str, Any]:
+        """Construir los parámetros de una orden de futuros"""
+        params = {
+            'symbol': symbol,
+            'side': side,
+            'type': order_type,
+            'quantity': quantity,
+        }
+        
+        if price:
+            params['price'] = price
+        if stop_price:
+            params['stopPrice'] = stop_price
+        if reduce_only:
+            params['reduceOnly'] = True
+        return params
+    
     def create_order(self, symbol: str, side: str, quantity: float, 
                     order_type: str = 'MARKET', price: float = None, 
                     stop_price: float = None, reduce_only: bool = False):
         """Crear una orden"""
         try:
-            params = {
-                'symbol': symbol,
-                'side': side,
-                'type': order_type,
-                'quantity': quantity,
-            }
-            
-            if price:
-                params['price'] = price
-            if stop_price:
-                params['stopPrice'] = stop_price
-            if reduce_only:
-                params['reduceOnly'] = True
-                
+            params = self._parametros_orden(symbol, side, quantity, order_type, price, stop_price, reduce_only)
             return self.client.futures_create_order(**params)
         except BinanceAPIException as e:
             print(f"Error creando orden: {e}")
@@ -121,6 +198,83 @@ class APIConnection:
             print(f"Error inesperado creando orden: {e}")
             return None
     
+    async def obtener_async_client(self) -> AsyncClient:
+        """Cliente REST asíncrono reutilizado por todas las órdenes (conexiones keep-alive)"""
+        if self.async_client is None:
+            if CONFIG_ENDPOINTS['rest']:
+                self.async_client = self.apuntar_cliente(AsyncClient(API_KEY, API_SECRET))
+            else:
+                self.async_client = await AsyncClient.create(API_KEY, API_SECRET, testnet=TESTNET)
+        return self.async_client
+    
+    async def create_order_async(self, symbol: str, side: str, quantity: float,
+                                 order_type: str = 'MARKET', price: float = None,
+                                 stop_price: float = None, reduce_only: bool = False):
+        """Crear una orden sin bloquear el bucle de eventos"""
+        try:
+            client = await self.obtener_async_client()
+            params = self._parametros_orden(symbol, side, quantity, order_type, price, stop_price, reduce_only)
+            return await client.futures_create_order(**params)
+        except BinanceAPIException as e:
+            self.ultimo_error_orden = e.code
+            print(f"Error creando orden: {e}")
+            print(f"Parámetros usados: symbol={symbol}, side={side}, quantity={quantity}, type={order_type}")
+            if stop_price:
+                print(f"stopPrice={stop_price}")
+            return None
+        except Exception as e:
+            self.ultimo_error_orden = None
+            print(f"Error inesperado creando orden: {e}")
+            return None
+    
+    async def create_orders_concurrentes(self, ordenes: List[Dict[str, Any]]) -> List[Any]:
+        """Enviar varias órdenes a la vez por la misma sesión; devuelve un resultado por orden (None si falla)"""
+        return await asyncio.gather(*(self.create_order_async(**orden) for orden in ordenes))
+    
+    async def cancel_order_async(self, symbol: str, order_id: int, condicional: bool = False):
+        """Cancelar una orden pendiente (TP/SL que ya no protege nada)"""
+        try:
+            client = await self.obtener_async_client()
+            if condicional:
+                # Las órdenes STOP/TAKE_PROFIT viven en el servicio de órdenes algorítmicas
+                return await client.futures_cancel_order(symbol=symbol, algoId=order_id)
+            return await client.futures_cancel_order(symbol=symbol, orderId=order_id)
+        except BinanceAPIException as e:
+            print(f"Error cancelando orden {order_id}: {e}")
+            return None
+        except Exception as e:
+            print(f"Error inesperado cancelando orden {order_id}: {e}")
+            return None
+    
+    async def get_symbol_ticker_async(self, symbol: str):
+        """Obtener el último precio de un símbolo sin bloquear el bucle de eventos"""
+        client = await self.obtener_async_client()
+        return await client.futures_symbol_ticker(symbol=symbol)
+    
+    async def get_klines_async(self, symbol: str, interval: str, start_time: int = None, limit: int = 1500):
+        """Obtener klines históricas por REST sin bloquear el bucle de eventos"""
+        client = await self.obtener_async_client()
+        params = {'symbol': symbol, 'interval': interval, 'limit': limit}
+        if start_time is not None:
+            params['startTime'] = start_time
+        return await client.futures_klines(**params)
+    
+    async def crear_listen_key_async(self) -> str:
+        """Crear (o recuperar) la listenKey del user data stream de futuros"""
+        client = await self.obtener_async_client()
+        return await client.futures_stream_get_listen_key()
+    
+    async def renovar_listen_key_async(self, listen_key: str):
+        """Keepalive de la listenKey para que no caduque"""
+        client = await self.obtener_async_client()
+        return await client.futures_stream_keepalive(listenKey=listen_key)
+    
+    async def cerrar_async_client(self):
+        """Cerrar la sesión HTTP del cliente asíncrono"""
+        if self.async_client is not None:
+            await self.async_client.close_connection()
+            self.async_client = None
+    
     def close_position(self, symbol: str, side: str, quantity: float):
         """Cerrar una posición"""
         try:
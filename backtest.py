@@ -0,0 +1,258 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+from estrategia import EstrategiaMACD, Signal, intervalo_ms
+from indicadores import MotorIndicadores
+from alineacion import valores_asof
+from diario_operaciones import COLUMNAS_OPERACIONES
+from config import CONFIG_TRADING
+from registro_mercado import LectorMercado
+
+COLUMNAS_KLINES = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+
+def cargar_klines(ruta: str) -> Dict[str, np.ndarray]:
+    """Cargar klines históricas desde un CSV con el formato de Binance (open_time, open, high, low, close, volume, ...)"""
+    datos = pd.read_csv(ruta, header=None, usecols=range(6), names=COLUMNAS_KLINES)
+
+    # Los CSV de data.binance.vision pueden traer o no fila de cabecera
+    if not str(datos.iloc[0, 0]).isdigit():
+        datos = datos.iloc[1:]
+
+    velas = {'timestamp': datos['timestamp'].to_numpy(dtype=np.int64)}
+    for columna in COLUMNAS_KLINES[1:]:
+        velas[columna] = datos[columna].to_numpy(dtype=np.float64)
+
+    # Garantizar orden cronológico y sin duplicados
+    _, indices = np.unique(velas['timestamp'], return_index=True)
+    if len(indices) != len(velas['timestamp']):
+        velas = {columna: valores[indices] for columna, valores in velas.items()}
+    return velas
+
+class Backtester:
+    """Reproduce klines históricas a través de EstrategiaMACD y simula la ejecución de GestorOperaciones"""
+
+    def __init__(self, config: Optional[Dict] = None):
+        self.config = dict(CONFIG_TRADING, **(config or {}))
+        self.estrategia = EstrategiaMACD(self.config)
+
+    def generar_senales(self, velas_1m: Dict[str, np.ndarray], velas_macd: Dict[str, np.ndarray]) -> List[Tuple[int, Signal]]:
+        """Mismas señales que generar_senales_por_vela, con el MACD consultado a fecha de cada vela de 1m de golpe"""
+        duracion_1m = intervalo_ms(self.config['temporalidad_operaciones'])
+
+        # Indicadores de cada vela del MACD (su cálculo es secuencial, pero solo hay una por hora)
+        motor = MotorIndicadores(self.config)
+        indicadores = np.array([
+            motor.actualizar(h, l, c) for h, l, c in zip(
+                velas_macd['high'].tolist(), velas_macd['low'].tolist(), velas_macd['close'].tolist()
+            )
+        ], dtype=np.float64).reshape(-1, 4)
+        cierres = velas_macd['timestamp'] + intervalo_ms(self.config['temporalidad_macd'])
+        valores = {'macd': indicadores[:, 0], 'signal': indicadores[:, 1], 'atr': indicadores[:, 3]}
+
+        # Valores vigentes al cierre de cada vela de 1m y al de la anterior (NaN si aún no había MACD)
+        instantes = velas_1m['timestamp'] + duracion_1m
+        actual = valores_asof(cierres, valores, instantes)
+        anterior = valores_asof(cierres, valores, instantes - duracion_1m)
+
+        # Mismo calentamiento que generar_senal: más de macd_slow + 10 velas del MACD en el buffer
+        vistas = np.searchsorted(cierres, instantes, side='right')
+        listas = np.minimum(vistas, self.estrategia.buffer_macd.capacidad) > self.config['macd_slow'] + 10
+
+        # Las comparaciones con NaN son falsas: descartan las velas sin datos como generar_senal
+        largos = listas & (actual['macd'] > actual['signal']) & (anterior['macd'] <= anterior['signal'])
+        cortos = listas & (actual['macd'] < actual['signal']) & (anterior['macd'] >= anterior['signal'])
+
+        precios = velas_1m['close']
+        timestamps = velas_1m['timestamp']
+        atr = np.nan_to_num(actual['atr'], nan=0.0)
+        senales = []
+        for i in np.flatnonzero(largos | cortos).tolist():
+            senales.append((i, Signal(tipo='long' if largos[i] else 'short', precio=float(precios[i]),
+                                      timestamp=int(timestamps[i]), atr=float(atr[i]))))
+        return senales
+
+    def generar_senales_por_vela(self, velas_1m: Dict[str, np.ndarray],
+                                 velas_macd: Dict[str, np.ndarray]) -> List[Tuple[int, Signal]]:
+        """Alimentar la estrategia vela a vela, como en vivo, y devolver (índice de vela 1m, señal)"""
+        estrategia = self.estrategia
+        tf_operaciones = self.config['temporalidad_operaciones']
+        tf_macd = self.config['temporalidad_macd']
+
+        # Cada vela se entrega cuando cierra, igual que por WebSocket. Si una vela del MACD
+        # y una de 1m cierran a la vez, se entrega primero la del MACD
+        cierre_macd = velas_macd['timestamp'] + intervalo_ms(tf_macd)
+        cierre_1m = velas_1m['timestamp'] + intervalo_ms(tf_operaciones)
+        siguiente_macd = np.searchsorted(cierre_macd, cierre_1m, side='right')
+
+        # Convertir a listas evita crear escalares NumPy en cada iteración
+        t1, o1, h1, l1, c1, v1 = (velas_1m[c].tolist() for c in COLUMNAS_KLINES)
+        th, oh, hh, lh, ch, vh = (velas_macd[c].tolist() for c in COLUMNAS_KLINES)
+
+        senales = []
+        j = 0
+        for i in range(len(t1)):
+            limite = siguiente_macd[i]
+            while j < limite:
+                estrategia.agregar_dato_ohlcv(th[j], oh[j], hh[j], lh[j], ch[j], vh[j], tf_macd)
+                j += 1
+
+            estrategia.agregar_dato_ohlcv(t1[i], o1[i], h1[i], l1[i], c1[i], v1[i], tf_operaciones)
+            senal = estrategia.generar_senal()
+            if senal:
+                senales.append((i, senal))
+
+        return senales
+
+    def _buscar_salida(self, velas_1m: Dict[str, np.ndarray], inicio: int, direccion: str,
+                       stop_loss: float, take_profit: float) -> Tuple[int, float, str]:
+        """Buscar la primera vela desde inicio en la que salta el TP o el SL"""
+        high, low, open_ = velas_1m['high'], velas_1m['low'], velas_1m['open']
+        total = len(high)
+        bloque = 256
+
+        while inicio < total:
+            fin = min(inicio + bloque, total)
+            if direccion == 'long':
+                toca_tp = high[inicio:fin] >= take_profit
+                toca_sl = low[inicio:fin] <= stop_loss if stop_loss > 0 else np.zeros(fin - inicio, dtype=bool)
+            else:
+                toca_tp = low[inicio:fin] <= take_profit
+                toca_sl = high[inicio:fin] >= stop_loss if stop_loss > 0 else np.zeros(fin - inicio, dtype=bool)
+
+            toca = toca_tp | toca_sl
+            if toca.any():
+                k = int(np.argmax(toca))
+                indice = inicio + k
+                apertura = open_[indice]
+                # Si ambos niveles caen en la misma vela se asume el stop loss (caso conservador)
+                if toca_sl[k]:
+                    precio = min(stop_loss, apertura) if direccion == 'long' else max(stop_loss, apertura)
+                    return indice, precio, 'stop_loss'
+                precio = max(take_profit, apertura) if direccion == 'long' else min(take_profit, apertura)
+                return indice, precio, 'take_profit'
+
+            inicio = fin
+            bloque *= 2
+
+        return total - 1, float(velas_1m['close'][-1]), 'fin_backtest'
+
+    def simular(self, senales: List[Tuple[int, Signal]], velas_1m: Dict[str, np.ndarray]) -> List[Dict]:
+        """Simular entradas a mercado, comisiones y disparos de TP/SL para una lista de señales"""
+        comision = self.config['comision']
+        activo = self.config['activo']
+        # Un solo activo: rige el más restrictivo de los dos límites
+        maximo = min(self.config['max_operaciones_simultaneas'], self.config['max_operaciones_por_activo'])
+        duracion_1m = intervalo_ms(self.config['temporalidad_operaciones'])
+
+        operaciones = []
+        salidas_activas = []
+        for indice, senal in senales:
+            # Las operaciones que cerraron durante esta vela liberan su hueco
+            salidas_activas = [salida for salida in salidas_activas if salida > indice]
+            if len(salidas_activas) >= maximo:
+                continue
+
+            precio_entrada = senal.precio
+            cantidad = round(self.config['monto_operacion'] / precio_entrada, 6)
+            if cantidad <= 0:
+                continue
+            stop_loss, take_profit = self.estrategia.calcular_stop_loss_take_profit(
+                precio_entrada, senal.atr, senal.tipo
+            )
+
+            salida, precio_salida, razon = self._buscar_salida(
+                velas_1m, indice + 1, senal.tipo, stop_loss, take_profit
+            )
+            salidas_activas.append(salida)
+
+            if senal.tipo == 'long':
+                pnl = (precio_salida - precio_entrada) * cantidad
+            else:
+                pnl = (precio_entrada - precio_salida) * cantidad
+
+            operaciones.append({
+                'id': len(operaciones) + 1,
+                'timestamp': int(velas_1m['timestamp'][indice]) + duracion_1m,
+                'activo': activo,
+                'direccion': senal.tipo,
+                'precio_entrada': precio_entrada,
+                'cantidad': cantidad,
+                'stop_loss': stop_loss,
+                'take_profit': take_profit,
+                'precio_salida': precio_salida,
+                'comision': (precio_entrada + precio_salida) * cantidad * comision,
+                'pnl': pnl,
+                'pnl_percentaje': (pnl / (precio_entrada * cantidad)) * 100,
+                'razon_cierre': razon,
+                'estado': 'cerrada',
+                'timestamp_cierre': int(velas_1m['timestamp'][salida]) + duracion_1m
+            })
+
+        return operaciones
+
+    def ejecutar(self, velas_1m: Dict[str, np.ndarray], velas_macd: Dict[str, np.ndarray],
+                 por_vela: bool = False) -> List[Dict]:
+        """Ejecutar el backtest completo"""
+        if por_vela:
+            senales = self.generar_senales_por_vela(velas_1m, velas_macd)
+        else:
+            senales = self.generar_senales(velas_1m, velas_macd)
+        return self.simular(senales, velas_1m)
+
+def operaciones_a_dataframe(operaciones: List[Dict]) -> pd.DataFrame:
+    """Convertir operaciones al esquema de operaciones.csv"""
+    filas = [{**operacion, 'operacion': operacion['id']} for operacion in operaciones]
+    return pd.DataFrame(filas, columns=list(COLUMNAS_OPERACIONES))
+
+def resumir(operaciones: List[Dict]) -> Dict:
+    """Métricas agregadas de una lista de operaciones cerradas"""
+    pnl_neto = np.array([op['pnl'] - op['comision'] for op in operaciones], dtype=np.float64)
+    curva = np.cumsum(pnl_neto) if len(pnl_neto) else np.zeros(1)
+    drawdown = np.maximum.accumulate(np.maximum(curva, 0)) - curva
+    return {
+        'operaciones': len(operaciones),
+        'pnl': float(sum(op['pnl'] for op in operaciones)),
+        'comisiones': float(sum(op['comision'] for op in operaciones)),
+        'pnl_neto': float(pnl_neto.sum()),
+        'tasa_acierto': float((pnl_neto > 0).mean()) if len(pnl_neto) else 0.0,
+        'max_drawdown': float(drawdown.max())
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest de EstrategiaMACD sobre klines históricas")
+    parser.add_argument('--velas-1m', help="CSV de klines de la temporalidad de operaciones")
+    parser.add_argument('--velas-macd', help="CSV de klines de la temporalidad del MACD")
+    parser.add_argument('--registro', help="Directorio de GrabadorMercado a usar en lugar de los CSV")
+    parser.add_argument('--desde', type=int, default=None, help="Timestamp inicial (ms) al leer del registro")
+    parser.add_argument('--hasta', type=int, default=None, help="Timestamp final (ms) al leer del registro")
+    parser.add_argument('--salida', default='backtest_operaciones.csv', help="CSV de operaciones resultante")
+    parser.add_argument('--por-vela', action='store_true',
+                        help="Generar las señales vela a vela con la estrategia en vivo en lugar de vectorizadas")
+    args = parser.parse_args()
+
+    if args.registro:
+        # Vistas memmap: no se carga en RAM más de lo que recorre el backtest
+        lector = LectorMercado(args.registro)
+        velas_1m = lector.velas(CONFIG_TRADING['activo'], CONFIG_TRADING['temporalidad_operaciones'], args.desde, args.hasta)
+        velas_macd = lector.velas(CONFIG_TRADING['activo'], CONFIG_TRADING['temporalidad_macd'], args.desde, args.hasta)
+    elif args.velas_1m and args.velas_macd:
+        velas_1m = cargar_klines(args.velas_1m)
+        velas_macd = cargar_klines(args.velas_macd)
+    else:
+        parser.error("Indica --registro o bien --velas-1m y --velas-macd")
+    print(f"Velas cargadas: {len(velas_1m['timestamp'])} de operaciones, {len(velas_macd['timestamp'])} de MACD")
+
+    inicio = time.perf_counter()
+    operaciones = Backtester().ejecutar(velas_1m, velas_macd, args.por_vela)
+    duracion = time.perf_counter() - inicio
+
+    operaciones_a_dataframe(operaciones).to_csv(args.salida, index=False)
+    resumen = resumir(operaciones)
+    print(f"✅ Backtest completado en {duracion:.2f}s")
+    print(f"   Operaciones: {resumen['operaciones']}")
+    print(f"   PNL neto: {resumen['pnl_neto']:.2f} USDT (comisiones: {resumen['comisiones']:.2f})")
+    print(f"   Tasa de acierto: {resumen['tasa_acierto'] * 100:.1f}%")
+    print(f"   Máximo drawdown: {resumen['max_drawdown']:.2f} USDT")
+    print(f"   Operaciones guardadas en {args.salida}")
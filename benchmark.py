@@ -0,0 +1,320 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from typing import Callable, Dict, List, Optional
+from config import CONFIG_TRADING
+from decodificacion import decodificar, es_kline_parcial
+from diario_operaciones import DiarioOperaciones
+from ejecucion import GestorOperaciones
+from estrategia import EstrategiaMACD, intervalo_ms
+from exchange_simulado import ExchangeSimulado
+from remuestreo import Remuestreador
+
+TAMANOS_POR_DEFECTO = [1_000, 10_000, 100_000, 1_000_000]
+MAX_LLAMADAS = 100_000  # Límite de llamadas medidas por función y tamaño
+MAX_LLAMADAS_MEMORIA = 1_000  # Llamadas medidas con tracemalloc (es mucho más lento)
+# Apertura de la primera vela sintética, múltiplo de una hora como las de Binance (el remuestreo lo necesita)
+INICIO_VELAS_MS = 1_699_999_200_000
+
+def generar_velas(n: int, temporalidad: str, semilla: int = 42) -> Dict[str, np.ndarray]:
+    """Velas sintéticas (paseo aleatorio) reproducibles"""
+    rng = np.random.default_rng(semilla)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.001, n)))
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    return {
+        'timestamp': INICIO_VELAS_MS + np.arange(n, dtype=np.int64) * intervalo_ms(temporalidad),
+        'open': open_,
+        'high': np.maximum(open_, close) * (1 + rng.random(n) * 0.001),
+        'low': np.minimum(open_, close) * (1 - rng.random(n) * 0.001),
+        'close': close,
+        'volume': rng.random(n) * 10
+    }
+
+def estadisticas(tiempos_ns: np.ndarray) -> Dict:
+    tiempos_us = tiempos_ns / 1000
+    return {
+        'llamadas': int(len(tiempos_us)),
+        'media_us': float(tiempos_us.mean()),
+        'p50_us': float(np.percentile(tiempos_us, 50)),
+        'p90_us': float(np.percentile(tiempos_us, 90)),
+        'p99_us': float(np.percentile(tiempos_us, 99)),
+        'max_us': float(tiempos_us.max())
+    }
+
+def medir(llamadas: List[Callable]) -> Dict:
+    """Medir cada llamada por separado y luego las asignaciones de memoria de una muestra"""
+    tiempos = np.empty(len(llamadas), dtype=np.int64)
+    reloj = time.perf_counter_ns
+    for i, llamada in enumerate(llamadas):
+        inicio = reloj()
+        llamada()
+        tiempos[i] = reloj() - inicio
+    return estadisticas(tiempos)
+
+def medir_memoria(llamadas: List[Callable]) -> Dict:
+    """Bytes asignados por llamada (pico y neto) medidos con tracemalloc"""
+    muestra = llamadas[:MAX_LLAMADAS_MEMORIA]
+    tracemalloc.start()
+    inicial, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    for llamada in muestra:
+        llamada()
+    final, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'memoria_pico_kb': (pico - inicial) / 1024,
+        'memoria_neta_bytes_por_llamada': (final - inicial) / max(len(muestra), 1)
+    }
+
+def medir_async(corrutinas: List[Callable]) -> Dict:
+    """Igual que medir() pero para corrutinas, todas dentro del mismo bucle de eventos"""
+    async def ejecutar():
+        tiempos = np.empty(len(corrutinas), dtype=np.int64)
+        reloj = time.perf_counter_ns
+        for i, corrutina in enumerate(corrutinas):
+            inicio = reloj()
+            await corrutina()
+            tiempos[i] = reloj() - inicio
+        return tiempos
+    return estadisticas(asyncio.run(ejecutar()))
+
+def config_para(tamano: int) -> Dict:
+    """Config con buffers del tamaño de historial a medir"""
+    return dict(CONFIG_TRADING, max_velas_1m=tamano, max_velas_macd=tamano)
+
+def estrategia_cargada(tamano: int) -> EstrategiaMACD:
+    """Estrategia con los buffers llenos y el MACD calculado"""
+    estrategia = EstrategiaMACD(config_para(tamano))
+    estrategia.sembrar_historial(generar_velas(tamano, '1m'), generar_velas(tamano, '1h'))
+    return estrategia
+
+def bench_agregar_dato_ohlcv(tamano: int) -> Dict:
+    # Velas extra al final para medir las asignaciones sobre velas aún no vistas
+    velas = generar_velas(tamano + MAX_LLAMADAS_MEMORIA, '1m')
+    estrategia = EstrategiaMACD(config_para(tamano))
+    filas = list(zip(*(velas[c].tolist() for c in ('timestamp', 'open', 'high', 'low', 'close', 'volume'))))
+    filas, filas_memoria = filas[:tamano], filas[tamano:]
+    # Llenar el buffer hasta el tamaño pedido antes de medir
+    medidas = min(tamano, MAX_LLAMADAS)
+    for fila in filas[:tamano - medidas]:
+        estrategia.agregar_dato_ohlcv(*fila, '1m')
+    resultado = medir([lambda f=fila: estrategia.agregar_dato_ohlcv(*f, '1m') for fila in filas[tamano - medidas:]])
+    resultado.update(medir_memoria([lambda f=fila: estrategia.agregar_dato_ohlcv(*f, '1m') for fila in filas_memoria]))
+    return resultado
+
+def bench_calcular_macd(tamano: int) -> Dict:
+    # Cada llamada incorpora una vela del MACD nueva: el paso incremental que hace el bot cada hora
+    medidas = min(tamano, MAX_LLAMADAS)
+    velas = generar_velas(tamano + medidas + MAX_LLAMADAS_MEMORIA, '1h')
+    estrategia = EstrategiaMACD(config_para(tamano))
+    estrategia.sembrar_historial(generar_velas(tamano, '1m'), {c: v[:tamano] for c, v in velas.items()})
+    filas = list(zip(*(velas[c][tamano:].tolist() for c in ('timestamp', 'open', 'high', 'low', 'close', 'volume'))))
+    filas, filas_memoria = filas[:medidas], filas[medidas:]
+    resultado = medir([lambda f=fila: estrategia.agregar_dato_ohlcv(*f, '1h') for fila in filas])
+    resultado.update(medir_memoria([lambda f=fila: estrategia.agregar_dato_ohlcv(*f, '1h') for fila in filas_memoria]))
+    return resultado
+
+def bench_valores_macd_en(tamano: int) -> Dict:
+    estrategia = estrategia_cargada(tamano)
+    instante = estrategia.buffer_1m.ultimo_timestamp + estrategia.duracion_1m
+    llamadas = [lambda: estrategia.valores_macd_en(instante)] * MAX_LLAMADAS
+    resultado = medir(llamadas)
+    resultado.update(medir_memoria(llamadas))
+    return resultado
+
+def bench_generar_senal(tamano: int) -> Dict:
+    estrategia = estrategia_cargada(tamano)
+    llamadas = [estrategia.generar_senal] * MAX_LLAMADAS
+    resultado = medir(llamadas)
+    resultado.update(medir_memoria(llamadas))
+    return resultado
+
+def bench_remuestreo(tamano: int) -> Dict:
+    # Velas de 1m a 5m, 15m, 1h, 4h y 1d a la vez
+    medidas = min(tamano, MAX_LLAMADAS)
+    velas = generar_velas(medidas + MAX_LLAMADAS_MEMORIA, '1m')
+    remuestreador = Remuestreador('1m', ('5m', '15m', '1h', '4h', '1d'))
+    filas = list(zip(*(velas[c].tolist() for c in ('timestamp', 'open', 'high', 'low', 'close', 'volume'))))
+    # Con velas desalineadas ninguna vela mayor se completa y solo se mediría el descarte por hueco
+    comprobacion = Remuestreador('1m', ('5m',))
+    emitidas = sum(len(comprobacion.agregar(*fila)) for fila in filas[:medidas])
+    assert emitidas == medidas // 5, f"El remuestreo emitió {emitidas} velas de 5m de {medidas // 5} esperadas"
+    resultado = medir([lambda f=fila: remuestreador.agregar(*f) for fila in filas[:medidas]])
+    resultado.update(medir_memoria([lambda f=fila: remuestreador.agregar(*f) for fila in filas[medidas:]]))
+    return resultado
+
+def gestor_simulado(directorio: str) -> GestorOperaciones:
+    """Gestor contra el exchange simulado con su propio diario (hay que cerrarlo al terminar)"""
+    api = ExchangeSimulado()
+    api.actualizar_precio('BTCUSDT', 30000.0)
+    diario = DiarioOperaciones(os.path.join(directorio, 'operaciones_benchmark.db'))
+    return GestorOperaciones(api, EstrategiaMACD(), diario=diario)
+
+def operacion_ejemplo(i: int) -> Dict:
+    return {'id': i, 'timestamp': 1_700_000_000_000 + i, 'activo': 'BTCUSDT', 'direccion': 'long',
+            'precio_entrada': 30000.0, 'cantidad': 0.002, 'stop_loss': 29700.0, 'take_profit': 30600.0,
+            'comision': 0.0, 'estado': 'abierta'}
+
+def bench_verificar_cierre_operaciones(tamano: int) -> Dict:
+    # Una operación activa por cada 1000 velas de historial (de 1 a 1000 operaciones)
+    with tempfile.TemporaryDirectory() as directorio:
+        gestor = gestor_simulado(directorio)
+        try:
+            for i in range(max(1, tamano // 1000)):
+                operacion = operacion_ejemplo(i)
+                gestor.operaciones_activas.append(operacion)
+                gestor.niveles.agregar(operacion)
+                # Posición real en el exchange para que los cierres reduceOnly se acepten
+                gestor.api.create_order('BTCUSDT', 'BUY', operacion['cantidad'])
+            precios = 30000 + np.random.default_rng(1).normal(0, 50, MAX_LLAMADAS // 10)
+            return medir_async([lambda p=precio: gestor.verificar_cierre_operaciones(p) for precio in precios.tolist()])
+        finally:
+            gestor.diario.cerrar()
+
+def bench_guardar_operacion(tamano: int) -> Dict:
+    with tempfile.TemporaryDirectory() as directorio:
+        gestor = gestor_simulado(directorio)
+        try:
+            llamadas = [lambda i=i: gestor.guardar_operacion(operacion_ejemplo(i))
+                        for i in range(min(tamano, MAX_LLAMADAS // 10))]
+            resultado = medir(llamadas)
+            resultado.update(medir_memoria(llamadas))
+            return resultado
+        finally:
+            gestor.diario.cerrar()
+
+def bench_exchange_simulado(tamano: int) -> Dict:
+    # Órdenes a mercado alternas y un tick de precio que dispara tamano // 1000 pares de TP/SL
+    exchange = ExchangeSimulado(balance_inicial=1e9)
+    exchange.actualizar_precio('BTCUSDT', 30000.0)
+    for i in range(max(1, tamano // 1000)):
+        exchange.create_order('BTCUSDT', 'BUY', 0.001)
+        exchange.create_order('BTCUSDT', 'SELL', 0.001, 'TAKE_PROFIT_MARKET', stop_price=30100.0 + i, reduce_only=True)
+        exchange.create_order('BTCUSDT', 'SELL', 0.001, 'STOP_MARKET', stop_price=29900.0 - i, reduce_only=True)
+    llamadas = [lambda lado=('BUY', 'SELL')[i % 2]: exchange.create_order('BTCUSDT', lado, 0.001)
+                for i in range(MAX_LLAMADAS)]
+    llamadas.append(lambda: exchange.actualizar_precio('BTCUSDT', 31000.0))
+    return medir(llamadas)
+
+def frames_websocket(n: int) -> List[str]:
+    """Frames combinados con la mezcla real de un minuto: ~240 klines parciales de 1m por cada cerrada y un markPrice por segundo"""
+    frames = []
+    for i in range(n):
+        t = 1_700_000_000_000 + i * 250
+        if i % 4 == 0:
+            datos = {'e': 'markPriceUpdate', 'E': t, 's': 'BTCUSDT', 'p': '30000.10', 'i': '30000.00',
+                     'P': '30001.00', 'r': '0.00010000', 'T': t}
+            frames.append(json.dumps({'stream': 'btcusdt@markPrice@1s', 'data': datos}, separators=(',', ':')))
+            continue
+        inicio = t // 60_000 * 60_000
+        datos = {'e': 'kline', 'E': t, 's': 'BTCUSDT', 'k': {
+            't': inicio, 'T': inicio + 59_999, 's': 'BTCUSDT', 'i': '1m', 'f': 100, 'L': 200,
+            'o': '30000.00', 'c': '30010.50', 'h': '30020.00', 'l': '29990.00', 'v': '12.345', 'n': 100,
+            'x': i % 240 == 1, 'q': '370000.00', 'V': '6.000', 'Q': '180000.00', 'B': '0'}}
+        frames.append(json.dumps({'stream': 'btcusdt@kline_1m', 'data': datos}, separators=(',', ':')))
+    return frames
+
+def decodificar_antes(frame: str):
+    """Camino anterior: json.loads completo y conversiones en el callback"""
+    data = json.loads(frame)
+    payload = data['data']
+    if payload['e'] == 'kline':
+        kline = payload['k']
+        if not kline['x']:
+            return None
+        return (kline['t'], float(kline['o']), float(kline['h']), float(kline['l']),
+                float(kline['c']), float(kline['v']))
+    return float(payload['p'])
+
+def decodificar_ahora(frame: str):
+    """Camino de APIConnection.recibir_mensaje sin grabador"""
+    if es_kline_parcial(frame):
+        return None
+    return decodificar(frame)
+
+def medir_decodificacion(funcion: Callable, tamano: int) -> Dict:
+    frames = frames_websocket(min(tamano, MAX_LLAMADAS))
+    resultado = medir([lambda frame=frame: funcion(frame) for frame in frames])
+    resultado['mensajes_por_segundo'] = 1e6 / resultado['media_us']
+    return resultado
+
+def bench_decodificar_antes(tamano: int) -> Dict:
+    return medir_decodificacion(decodificar_antes, tamano)
+
+def bench_decodificar_mensaje(tamano: int) -> Dict:
+    return medir_decodificacion(decodificar_ahora, tamano)
+
+BENCHMARKS = {
+    'agregar_dato_ohlcv': bench_agregar_dato_ohlcv,
+    'calcular_macd': bench_calcular_macd,
+    'valores_macd_en': bench_valores_macd_en,
+    'generar_senal': bench_generar_senal,
+    'remuestreo': bench_remuestreo,
+    'verificar_cierre_operaciones': bench_verificar_cierre_operaciones,
+    'guardar_operacion': bench_guardar_operacion,
+    'exchange_simulado': bench_exchange_simulado,
+    'decodificar_antes': bench_decodificar_antes,
+    'decodificar_mensaje': bench_decodificar_mensaje
+}
+
+def commit_actual() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def comparar(actual: Dict, anterior: Dict):
+    """Mostrar la variación de p50 respecto a una ejecución anterior"""
+    previos = {(r['nombre'], r['tamano']): r for r in anterior['resultados']}
+    print(f"\nComparación con {anterior.get('commit')}:")
+    for resultado in actual['resultados']:
+        previo = previos.get((resultado['nombre'], resultado['tamano']))
+        if previo and previo['p50_us'] > 0:
+            ratio = resultado['p50_us'] / previo['p50_us']
+            marca = '⚠️ ' if ratio > 1.2 else '   '
+            print(f"{marca}{resultado['nombre']:<30} {resultado['tamano']:>9}  x{ratio:.2f}")
+
+def ejecutar(nombres: List[str], tamanos: List[int]) -> Dict:
+    resultados = []
+    for nombre in nombres:
+        for tamano in tamanos:
+            inicio = time.perf_counter()
+            resultado = {'nombre': nombre, 'tamano': tamano, **BENCHMARKS[nombre](tamano)}
+            resultados.append(resultado)
+            print(f"{nombre:<30} {tamano:>9}  p50={resultado['p50_us']:>10.2f}us  "
+                  f"p99={resultado['p99_us']:>10.2f}us  ({time.perf_counter() - inicio:.1f}s)")
+    return {
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit_actual(),
+        'python': platform.python_version(),
+        'maquina': platform.machine(),
+        'resultados': resultados
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks de los caminos críticos de estrategia, ejecución y registro")
+    parser.add_argument('--tamanos', default=','.join(map(str, TAMANOS_POR_DEFECTO)),
+                        help="Tamaños de historial separados por comas")
+    parser.add_argument('--solo', default=None, help="Benchmarks a ejecutar separados por comas")
+    parser.add_argument('--salida', default='benchmark_resultados.json', help="Archivo JSON de resultados")
+    parser.add_argument('--comparar', default=None, help="JSON de una ejecución anterior para comparar")
+    args = parser.parse_args()
+
+    nombres = args.solo.split(',') if args.solo else list(BENCHMARKS)
+    resultado = ejecutar(nombres, [int(t) for t in args.tamanos.split(',')])
+
+    with open(args.salida, 'w') as f:
+        json.dump(resultado, f, indent=2)
+    print(f"Resultados guardados en {args.salida}")
+
+    if args.comparar:
+        with open(args.comparar) as f:
+            comparar(resultado, json.load(f))
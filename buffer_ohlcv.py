@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+from typing import Optional, Sequence
+
+COLUMNAS_OHLCV = ('open', 'high', 'low', 'close', 'volume')
+COLUMNAS_VELAS = ('timestamp',) + COLUMNAS_OHLCV
+
+class BufferOHLCV:
+    """Buffer circular de capacidad fija para velas OHLCV respaldado por NumPy"""
+
+    def __init__(self, capacidad: int, columnas_extra: Sequence[str] = ()):
+        if capacidad <= 0:
+            raise ValueError("La capacidad del buffer debe ser positiva")
+
+        self.capacidad = capacidad
+        self.columnas = COLUMNAS_OHLCV + tuple(columnas_extra)
+
+        # Cada columna reserva el doble de la capacidad y cada valor se escribe en
+        # dos posiciones (i e i + capacidad): así las últimas N velas siempre forman
+        # un tramo contiguo y se pueden devolver como vista sin copiar
+        self._timestamps = np.zeros(2 * capacidad, dtype=np.int64)
+        self._datos = {columna: np.full(2 * capacidad, np.nan) for columna in self.columnas}
+        self._ultima_posicion = -1
+        self._tamano = 0
+
+    def __len__(self) -> int:
+        return self._tamano
+
+    @property
+    def ultimo_timestamp(self) -> Optional[int]:
+        """Timestamp de la última vela almacenada"""
+        if self._tamano == 0:
+            return None
+        return int(self._timestamps[self._ultima_posicion])
+
+    def agregar(self, timestamp: int, open: float, high: float, low: float, close: float, volume: float):
+        """Agregar una vela en O(1), sobrescribiendo la más antigua si el buffer está lleno"""
+        posicion = (self._ultima_posicion + 1) % self.capacidad
+        espejo = posicion + self.capacidad
+
+        self._timestamps[posicion] = self._timestamps[espejo] = timestamp
+        for columna, valor in zip(COLUMNAS_OHLCV, (open, high, low, close, volume)):
+            datos = self._datos[columna]
+            datos[posicion] = datos[espejo] = valor
+
+        # Las columnas extra (indicadores) empiezan vacías para la nueva vela
+        for columna in self.columnas[len(COLUMNAS_OHLCV):]:
+            datos = self._datos[columna]
+            datos[posicion] = datos[espejo] = np.nan
+
+        self._ultima_posicion = posicion
+        if self._tamano < self.capacidad:
+            self._tamano += 1
+
+    def _tramo(self, n: Optional[int]) -> slice:
+        """Tramo contiguo del arreglo espejado que contiene las últimas n velas"""
+        if n is None or n > self._tamano:
+            n = self._tamano
+        fin = self._ultima_posicion + self.capacidad + 1
+        return slice(fin - n, fin)
+
+    def ultimos(self, columna: str, n: Optional[int] = None) -> np.ndarray:
+        """Vista de solo lectura (sin copia) de las últimas n velas de una columna"""
+        arreglo = self._timestamps if columna == 'timestamp' else self._datos[columna]
+        vista = arreglo[self._tramo(n)]
+        vista.flags.writeable = False
+        return vista
+
+    def ultimo(self, columna: str) -> float:
+        """Valor de una columna en la última vela"""
+        if self._tamano == 0:
+            return np.nan
+        return float(self._datos[columna][self._ultima_posicion])
+
+    def asignar_ultimo(self, columna: str, valor: float):
+        """Escribir el valor de una columna extra para la última vela en O(1)"""
+        if self._tamano == 0:
+            return
+        datos = self._datos[columna]
+        datos[self._ultima_posicion] = datos[self._ultima_posicion + self.capacidad] = valor
+
+    def a_dataframe(self, n: Optional[int] = None) -> pd.DataFrame:
+        """Construir un DataFrame indexado por timestamp con las últimas n velas"""
+        tramo = self._tramo(n)
+        datos = {columna: self._datos[columna][tramo] for columna in self.columnas}
+        indice = pd.Index(self._timestamps[tramo], name='timestamp')
+        return pd.DataFrame(datos, index=indice)
@@ -0,0 +1,54 @@
+import asyncio
+import json
+from typing import Any, Optional, Set
+from config import CONFIG_EVENTOS
+
+def frame_sse(tipo: str, datos: Any) -> bytes:
+    """Mensaje Server-Sent Events (event + data) listo para escribir en la respuesta"""
+    return f"event: {tipo}\ndata: {json.dumps(datos, separators=(',', ':'), default=str)}\n\n".encode()
+
+class BusEventos:
+    """Publicación de eventos del bot a los navegadores conectados (solo desde el bucle de eventos)
+
+    Cada evento se serializa una vez y el mismo frame se encola a todos los clientes: el coste por
+    cliente es un put_nowait, sin consultas a Binance.
+    """
+
+    def __init__(self, capacidad: Optional[int] = None):
+        self.capacidad = capacidad or CONFIG_EVENTOS['cola_cliente']
+        self.suscriptores: Set[asyncio.Queue] = set()
+        self.publicados = 0
+        self.desbordados = 0
+
+    def suscribir(self) -> asyncio.Queue:
+        cola = asyncio.Queue(self.capacidad)
+        self.suscriptores.add(cola)
+        return cola
+
+    def desuscribir(self, cola: asyncio.Queue):
+        self.suscriptores.discard(cola)
+
+    def publicar(self, tipo: str, datos: Any):
+        if not self.suscriptores:
+            return
+        frame = frame_sse(tipo, datos)
+        self.publicados += 1
+        for cola in list(self.suscriptores):
+            try:
+                cola.put_nowait(frame)
+            except asyncio.QueueFull:
+                # Cliente que no da abasto: al reconectar recibe el estado completo
+                self.desbordados += 1
+                self.desconectar(cola)
+
+    def desconectar(self, cola: asyncio.Queue):
+        """Descartar lo pendiente y terminar el stream del cliente (None)"""
+        self.desuscribir(cola)
+        while not cola.empty():
+            cola.get_nowait()
+        cola.put_nowait(None)
+
+    def cerrar(self):
+        """Terminar todos los streams (los clientes EventSource reconectan solos)"""
+        for cola in list(self.suscriptores):
+            self.desconectar(cola)
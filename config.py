@@ -8,15 +8,24 @@ API_KEY = os.getenv("API_KEY", "aabd5bd51a0557c33255327005fdbde372fb3c0e18b63906
 API_SECRET = os.getenv("API_SECRET", "6f7e966d1ffddbbc2ded9f997bae330e50056ad2c80ec6b584c3f48a333e2486")
 TESTNET = True
 
+# Servidor alternativo (p. ej. servidor_simulado.py); None usa los de Binance según TESTNET
+CONFIG_ENDPOINTS = {
+    'rest': os.getenv("BINANCE_REST_URL"),  # p. ej. http://127.0.0.1:8765
+    'ws': os.getenv("BINANCE_WS_URL")  # p. ej. ws://127.0.0.1:8765
+}
+
 # Configuración de trading
 CONFIG_TRADING = {
     'monto_operacion': 50.0,  # USDT (valor fijo)
     'apalancamiento': 20,
-    'max_operaciones_simultaneas': 1,
+    'max_operaciones_simultaneas': 1,  # Límite global entre todos los activos
+    'max_operaciones_por_activo': 1,
     'activo': 'BTCUSDT',
+    'activos': ['BTCUSDT'],  # Símbolos operados por el bot (una estrategia por símbolo)
     'tipo_margen': 'ISOLATED',
     'temporalidad_operaciones': '1m',  # 1 minuto
     'temporalidad_macd': '1h',  # 1 hora
+    'remuestrear_macd': True,  # Construir las velas del MACD a partir de las de operaciones (sin su stream)
     'macd_fast': 12,
     'macd_slow': 26,
     'macd_signal': 9,
@@ -26,8 +35,95 @@ CONFIG_TRADING = {
     'stop_loss_valor': 1.0,  # Porcentaje o relación riesgo/beneficio
     'stop_loss_habilitado': True,
     'comision': 0.0004,  # 0.04% de Binance
-    'atr_periodo': 14
+    'atr_periodo': 14,
+    'reintento_cierre_segundos': 1.0,  # Espera tras el primer cierre fallido (se duplica en cada fallo)
+    'max_reintentos_cierre': 5,  # Después, la operación queda en 'cerrando' a la espera del user data stream
+    'stream_precio': 'markPrice@1s',  # Stream que vigila TP/SL en tiempo real (markPrice@1s o bookTicker)
+    'max_velas_1m': 1000,  # Capacidad del buffer de velas de operaciones
+    'max_velas_macd': 1000,  # Capacidad del buffer de velas del MACD
+    'modo_papel': False,  # True: órdenes contra exchange_simulado con datos de mercado reales
+    'balance_papel': 10000.0  # Saldo inicial (USDT) del modo papel
 }
 
 # Configuración de archivos
-ARCHIVO_OPERACIONES = 'operaciones.csv'
\ No newline at end of file
+ARCHIVO_OPERACIONES = 'operaciones.csv'  # Exportación CSV del diario
+ARCHIVO_DIARIO = 'operaciones.db'  # Diario de operaciones (SQLite)
+DIRECTORIO_CACHE_VELAS = 'cache_velas'  # Historial local para el arranque en caliente
+
+# Segundos que se conserva en caché la información de símbolos (exchangeInfo)
+TTL_INFO_SIMBOLOS = 3600
+
+# Binance Futures admite como máximo 200 streams por conexión WebSocket
+MAX_STREAMS_POR_CONEXION = 200
+
+# Código -2022 de Binance: orden ReduceOnly rechazada (no queda posición que reducir)
+CODIGO_REDUCE_ONLY_RECHAZADA = -2022
+
+# Supervisión de la conexión WebSocket
+CONFIG_WEBSOCKET = {
+    'timeout_sin_mensajes': 30,  # Segundos sin mensajes antes de reiniciar la conexión
+    'backoff_inicial': 1,  # Segundos de espera antes del primer reintento
+    'backoff_maximo': 60  # Espera máxima entre reintentos
+}
+
+# Etapas del pipeline de eventos (recepción → estrategia → ejecución)
+CONFIG_PIPELINE = {
+    'capacidad_cola': 1000,  # Eventos de mercado pendientes antes de aplicar contrapresión
+    'trabajadores_ejecucion': 4  # Corrutinas de órdenes que pueden estar en vuelo a la vez
+}
+
+# User data stream (ejecuciones reales de las órdenes)
+CONFIG_FLUJO_USUARIO = {
+    'keepalive_segundos': 1800,  # Binance caduca la listenKey a los 60 minutos sin keepalive
+    'timeout_relleno': 5,  # Segundos máximos esperando el ORDER_TRADE_UPDATE de una orden
+    'max_ordenes_recordadas': 1000
+}
+
+# Saldos y posiciones que muestran /status y /balance
+CONFIG_ESTADO_CUENTA = {
+    'ttl_segundos': 30,  # Antigüedad máxima sin user data stream antes de volver a consultar por REST
+    'ttl_con_flujo': 300  # Con el stream conectado los ACCOUNT_UPDATE mantienen el estado al día
+}
+
+# Operaciones cerradas en memoria y paginación de /operaciones (las anteriores se leen del diario)
+CONFIG_OPERACIONES = {
+    'ventana_memoria': 1000,
+    'limite_pagina': 50,
+    'limite_maximo': 500
+}
+
+# Panel en vivo (Server-Sent Events en /eventos)
+CONFIG_EVENTOS = {
+    'intervalo_estado': 0.5,  # Segundos entre comprobaciones del estado compartido (solo se envía si cambia)
+    'cola_cliente': 256,  # Eventos pendientes por navegador antes de desconectarlo
+    'keepalive_segundos': 15  # Comentario periódico para que proxies no cierren la conexión
+}
+
+# Escritura del diario de operaciones (hilo propio, fuera del camino de las órdenes)
+CONFIG_DIARIO = {
+    'intervalo_volcado': 1.0,  # Segundos que se agrupan escrituras en una misma transacción
+    'max_lote': 500,  # Filas máximas por transacción
+    'sincronizacion': 'NORMAL'  # PRAGMA synchronous: OFF, NORMAL (fsync en checkpoints) o FULL (fsync por lote)
+}
+
+# Grabación de datos de mercado recibidos por WebSocket
+CONFIG_REGISTRO = {
+    'habilitado': True,
+    'directorio': 'datos_mercado',
+    'frames_crudos': False,  # Guardar también cada mensaje tal cual llega
+    'filas_por_indice': 1024,  # Densidad del índice temporal
+    'intervalo_volcado': 5  # Segundos entre escrituras a disco
+}
+
+# Servidor local que imita la API de Binance Futures para pruebas de carga
+CONFIG_SERVIDOR_SIMULADO = {
+    'host': '127.0.0.1',
+    'puerto': 8765,
+    'simbolos': 10,  # Símbolos sintéticos en exchangeInfo además de los de CONFIG_TRADING
+    'mensajes_por_segundo': 4,  # Mensajes por stream y segundo (Binance: 4 por kline, 1 por markPrice@1s)
+    'latencia_ms': 0,  # Retardo fijo de cada respuesta REST
+    'jitter_ms': 0,  # Retardo aleatorio adicional (uniforme) de cada respuesta REST
+    'tasa_errores': 0.0,  # Probabilidad de que una petición REST devuelva un error interno
+    'tasa_desconexiones': 0.0,  # Probabilidad por envío de cortar una conexión WebSocket de mercado
+    'balance': 10000.0
+}
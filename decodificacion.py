@@ -0,0 +1,62 @@
+import json
+from typing import Any, Dict, Tuple, Union
+
+try:
+    import orjson
+    cargar_json = orjson.loads
+except ImportError:  # orjson es opcional: sin él se usa la librería estándar
+    cargar_json = json.loads
+
+# Binance envía el JSON compacto: una kline sin cerrar contiene exactamente este texto
+MARCA_KLINE_PARCIAL = '"x":false'
+MARCA_KLINE_PARCIAL_BYTES = MARCA_KLINE_PARCIAL.encode()
+
+class VelaKline:
+    """Evento kline del WebSocket con los campos ya convertidos (sin diccionarios anidados)"""
+    __slots__ = ('simbolo', 'temporalidad', 'timestamp', 'cierre', 'open', 'high', 'low', 'close',
+                 'volume', 'cerrada', 'evento')
+
+    def __init__(self, simbolo: str, temporalidad: str, timestamp: int, cierre: int, open: float,
+                 high: float, low: float, close: float, volume: float, cerrada: bool, evento: int = 0):
+        self.simbolo = simbolo
+        self.temporalidad = temporalidad
+        self.timestamp = timestamp  # Apertura de la vela (ms)
+        self.cierre = cierre  # Último ms de la vela
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.cerrada = cerrada
+        self.evento = evento  # Hora de evento de Binance (ms)
+
+    @classmethod
+    def desde_evento(cls, data: Dict) -> 'VelaKline':
+        """Construir a partir del payload {'e': 'kline', 'E': ..., 'k': {...}}"""
+        k = data['k']
+        return cls(k['s'], k['i'], k['t'], k['T'], float(k['o']), float(k['h']), float(k['l']),
+                   float(k['c']), float(k['v']), k['x'], data.get('E', 0))
+
+def es_kline_parcial(mensaje: Union[str, bytes]) -> bool:
+    """Comprobación sobre el texto sin decodificar; si falla, solo cuesta un parseo completo"""
+    if isinstance(mensaje, str):
+        return MARCA_KLINE_PARCIAL in mensaje
+    return MARCA_KLINE_PARCIAL_BYTES in mensaje
+
+def decodificar(mensaje: Union[str, bytes]) -> Tuple[str, Any]:
+    """(stream o tipo de evento, payload); las klines se devuelven como VelaKline"""
+    data = cargar_json(mensaje)
+    if 'stream' in data:
+        clave, payload = data['stream'], data['data']
+    else:
+        # Mensaje individual (no multiplexado)
+        clave, payload = data.get('e'), data
+    if payload.get('e') == 'kline':
+        payload = VelaKline.desde_evento(payload)
+    return clave, payload
+
+def hora_evento(payload: Any) -> int:
+    """Hora de evento (ms) de un payload decodificado"""
+    if isinstance(payload, VelaKline):
+        return payload.evento
+    return payload.get('E', 0)
@@ -0,0 +1,263 @@
+import argparse
+import csv
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from config import CONFIG_DIARIO, ARCHIVO_DIARIO, ARCHIVO_OPERACIONES
+
+# Esquema del CSV histórico (operaciones.csv), que se mantiene como formato de exportación
+COLUMNAS_OPERACIONES = ('timestamp', 'operacion', 'activo', 'direccion', 'precio_entrada', 'cantidad',
+                        'stop_loss', 'take_profit', 'precio_salida', 'comision', 'pnl',
+                        'pnl_percentaje', 'razon_cierre')
+
+# Campos de la operación (diccionario de GestorOperaciones) que se guardan en la tabla
+CAMPOS_DIARIO = ('id', 'activo', 'direccion', 'estado', 'timestamp', 'timestamp_cierre', 'precio_entrada',
+                 'cantidad', 'stop_loss', 'take_profit', 'precio_salida', 'comision', 'pnl',
+                 'pnl_percentaje', 'razon_cierre', 'secuencia')
+
+# Los orderId de Binance son únicos por símbolo: la clave es (activo, id)
+SQL_TABLA = """
+CREATE TABLE IF NOT EXISTS operaciones (
+    id INTEGER NOT NULL,
+    activo TEXT NOT NULL,
+    direccion TEXT,
+    estado TEXT,
+    timestamp INTEGER,
+    timestamp_cierre INTEGER,
+    precio_entrada REAL,
+    cantidad REAL,
+    stop_loss REAL,
+    take_profit REAL,
+    precio_salida REAL,
+    comision REAL,
+    pnl REAL,
+    pnl_percentaje REAL,
+    razon_cierre TEXT,
+    secuencia INTEGER,
+    PRIMARY KEY (activo, id)
+)
+"""
+SQL_INDICES = """
+CREATE INDEX IF NOT EXISTS idx_operaciones_id ON operaciones (id);
+CREATE INDEX IF NOT EXISTS idx_operaciones_timestamp ON operaciones (timestamp);
+CREATE INDEX IF NOT EXISTS idx_operaciones_activo_timestamp ON operaciones (activo, timestamp);
+CREATE INDEX IF NOT EXISTS idx_operaciones_cierre ON operaciones (timestamp_cierre);
+CREATE INDEX IF NOT EXISTS idx_operaciones_secuencia ON operaciones (secuencia);
+"""
+
+# Agregados por símbolo de las operaciones cerradas (para sembrar EstadisticasOperaciones)
+SQL_AGREGADOS_ACTIVO = """
+SELECT activo, COUNT(*), TOTAL(pnl - comision > 0), TOTAL(pnl), TOTAL(comision),
+       TOTAL(timestamp_cierre - timestamp), MAX(secuencia)
+FROM operaciones WHERE secuencia IS NOT NULL GROUP BY activo
+"""
+# Pico y mayor caída de la curva de PnL neto acumulado en orden de cierre (criterio de backtest.resumir)
+SQL_DRAWDOWN = """
+WITH curva AS (
+    SELECT secuencia, SUM(pnl - comision) OVER (ORDER BY secuencia) AS neto
+    FROM operaciones WHERE secuencia IS NOT NULL
+), picos AS (
+    SELECT neto, MAX(neto) OVER (ORDER BY secuencia) AS pico FROM curva
+)
+SELECT MAX(MAX(pico), 0), MAX(MAX(pico, 0) - neto) FROM picos
+"""
+
+# Apertura y cierre de una operación actualizan la misma fila
+SQL_GUARDAR = (
+    f"INSERT INTO operaciones ({', '.join(CAMPOS_DIARIO)}) VALUES ({', '.join('?' * len(CAMPOS_DIARIO))}) "
+    f"ON CONFLICT (activo, id) DO UPDATE SET "
+    + ', '.join(f"{campo} = excluded.{campo}" for campo in CAMPOS_DIARIO if campo not in ('id', 'activo'))
+)
+
+class DiarioOperaciones:
+    """Diario de operaciones en SQLite (WAL) con un hilo escritor que agrupa las escrituras en lotes"""
+
+    def __init__(self, ruta: str = ARCHIVO_DIARIO, config: Optional[Dict] = None):
+        self.ruta = ruta
+        self.config = config or CONFIG_DIARIO
+        self.cola = queue.SimpleQueue()
+        self.filas_escritas = 0
+        self.lotes_escritos = 0
+
+        # Conexión de lectura (consultas desde el bucle de eventos o la CLI); el WAL permite leer mientras se escribe
+        self.lectura = sqlite3.connect(ruta, check_same_thread=False)
+        self.lectura.row_factory = sqlite3.Row
+        self.lock_lectura = threading.Lock()
+        self.lectura.execute("PRAGMA journal_mode=WAL")
+        self.lectura.execute(SQL_TABLA)
+        # Diarios creados antes de existir la columna (secuencia de cierre, cursor de /operaciones)
+        columnas = {fila['name'] for fila in self.lectura.execute("PRAGMA table_info(operaciones)")}
+        if 'secuencia' not in columnas:
+            self.lectura.execute("ALTER TABLE operaciones ADD COLUMN secuencia INTEGER")
+        self.lectura.executescript(SQL_INDICES)
+
+        self.hilo = threading.Thread(target=self._escribir, name='diario_operaciones', daemon=True)
+        self.hilo.start()
+
+    def registrar(self, operacion: Dict):
+        """Encolar el estado actual de la operación (no toca el disco: apto para el camino de las órdenes)"""
+        self.cola.put(tuple(operacion.get(campo) for campo in CAMPOS_DIARIO))
+
+    def volcar(self, timeout: Optional[float] = None) -> bool:
+        """Esperar a que todo lo registrado hasta ahora esté escrito"""
+        if not self.hilo.is_alive():
+            return True
+        aviso = threading.Event()
+        self.cola.put(aviso)
+        return aviso.wait(timeout)
+
+    def cerrar(self):
+        """Escribir lo pendiente y detener el hilo escritor (las consultas siguen disponibles)"""
+        if self.hilo.is_alive():
+            self.cola.put(None)
+            self.hilo.join()
+
+    def _escribir(self):
+        conexion = sqlite3.connect(self.ruta)
+        # NORMAL: con WAL solo se sincroniza en los checkpoints; FULL: fsync en cada lote
+        conexion.execute(f"PRAGMA synchronous={self.config['sincronizacion']}")
+        activo = True
+        while activo:
+            filas: List[Tuple] = []
+            avisos: List[threading.Event] = []
+            elemento = self.cola.get()
+            # Lo que llegue durante intervalo_volcado se escribe en la misma transacción
+            limite = time.monotonic() + self.config['intervalo_volcado']
+            while True:
+                if elemento is None:
+                    activo = False
+                    break
+                if isinstance(elemento, threading.Event):
+                    avisos.append(elemento)
+                    break
+                filas.append(elemento)
+                restante = limite - time.monotonic()
+                if len(filas) >= self.config['max_lote'] or restante <= 0:
+                    break
+                try:
+                    elemento = self.cola.get(timeout=restante)
+                except queue.Empty:
+                    break
+            if filas:
+                try:
+                    with conexion:
+                        conexion.executemany(SQL_GUARDAR, filas)
+                    self.filas_escritas += len(filas)
+                    self.lotes_escritos += 1
+                except sqlite3.Error as e:
+                    print(f"Error escribiendo el diario de operaciones: {e}")
+            for aviso in avisos:
+                aviso.set()
+        conexion.close()
+
+    def _consultar(self, sql: str, parametros: Tuple = ()) -> List[sqlite3.Row]:
+        with self.lock_lectura:
+            return self.lectura.execute(sql, parametros).fetchall()
+
+    @staticmethod
+    def _filtros(activo: Optional[str], desde: Optional[int], hasta: Optional[int],
+                 estado: Optional[str] = None) -> Tuple[str, Tuple]:
+        """Cláusula WHERE sobre columnas indexadas (timestamp de apertura en ms)"""
+        condiciones, parametros = [], []
+        if activo is not None:
+            condiciones.append("activo = ?")
+            parametros.append(activo)
+        if desde is not None:
+            condiciones.append("timestamp >= ?")
+            parametros.append(desde)
+        if hasta is not None:
+            condiciones.append("timestamp <= ?")
+            parametros.append(hasta)
+        if estado is not None:
+            condiciones.append("estado = ?")
+            parametros.append(estado)
+        where = f" WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        return where, tuple(parametros)
+
+    def consultar(self, activo: Optional[str] = None, desde: Optional[int] = None, hasta: Optional[int] = None,
+                  estado: Optional[str] = None, limite: Optional[int] = None) -> List[Dict]:
+        """Operaciones escritas en un rango de tiempo, ordenadas por apertura"""
+        where, parametros = self._filtros(activo, desde, hasta, estado)
+        sql = f"SELECT * FROM operaciones{where} ORDER BY timestamp, id"
+        if limite is not None:
+            sql += f" LIMIT {int(limite)}"
+        return [dict(fila) for fila in self._consultar(sql, parametros)]
+
+    def cerradas(self, desde: Optional[int] = None, antes: Optional[int] = None,
+                 limite: Optional[int] = None) -> List[Dict]:
+        """Operaciones cerradas por secuencia de cierre: posteriores a desde (ascendente) o anteriores a antes (descendente)"""
+        if desde is not None:
+            sql, parametros = "SELECT * FROM operaciones WHERE secuencia > ? ORDER BY secuencia", (desde,)
+        elif antes is not None:
+            sql, parametros = "SELECT * FROM operaciones WHERE secuencia < ? ORDER BY secuencia DESC", (antes,)
+        else:
+            sql, parametros = "SELECT * FROM operaciones WHERE secuencia IS NOT NULL ORDER BY secuencia DESC", ()
+        if limite is not None:
+            sql += f" LIMIT {int(limite)}"
+        return [dict(fila) for fila in self._consultar(sql, parametros)]
+
+    def obtener(self, order_id: int, activo: Optional[str] = None) -> Optional[Dict]:
+        """Operación por orderId de entrada"""
+        if activo is None:
+            filas = self._consultar("SELECT * FROM operaciones WHERE id = ?", (order_id,))
+        else:
+            filas = self._consultar("SELECT * FROM operaciones WHERE activo = ? AND id = ?", (activo, order_id))
+        return dict(filas[0]) if filas else None
+
+    def resumen(self, activo: Optional[str] = None, desde: Optional[int] = None,
+                hasta: Optional[int] = None) -> Dict:
+        """Agregados de las operaciones cerradas (mismas claves que backtest.resumir, sin drawdown)"""
+        where, parametros = self._filtros(activo, desde, hasta, 'cerrada')
+        fila = self._consultar(
+            "SELECT COUNT(*), TOTAL(pnl), TOTAL(comision), TOTAL(pnl - comision), "
+            f"TOTAL(pnl - comision > 0) FROM operaciones{where}", parametros
+        )[0]
+        operaciones, pnl, comisiones, pnl_neto, ganadoras = fila
+        return {
+            'operaciones': operaciones,
+            'pnl': pnl,
+            'comisiones': comisiones,
+            'pnl_neto': pnl_neto,
+            'tasa_acierto': ganadoras / operaciones if operaciones else 0.0
+        }
+
+    def agregados_cerradas(self) -> Dict:
+        """Totales de las operaciones cerradas calculados en SQLite, sin traer las filas a memoria"""
+        por_activo = {}
+        for activo, operaciones, ganadoras, pnl, comisiones, duracion_ms, secuencia in self._consultar(
+                SQL_AGREGADOS_ACTIVO):
+            por_activo[activo] = {'operaciones': operaciones, 'ganadoras': int(ganadoras), 'pnl': pnl,
+                                  'comisiones': comisiones, 'duracion_ms': int(duracion_ms), 'secuencia': secuencia}
+        pico, max_drawdown = self._consultar(SQL_DRAWDOWN)[0]
+        return {'por_activo': por_activo, 'pico': pico or 0.0, 'max_drawdown': max_drawdown or 0.0}
+    
+    def exportar_csv(self, ruta: str = ARCHIVO_OPERACIONES, activo: Optional[str] = None,
+                     desde: Optional[int] = None, hasta: Optional[int] = None) -> int:
+        """Exportar al esquema de operaciones.csv (una fila por operación, con su último estado)"""
+        operaciones = self.consultar(activo, desde, hasta)
+        with open(ruta, 'w', newline='') as f:
+            escritor = csv.writer(f)
+            escritor.writerow(COLUMNAS_OPERACIONES)
+            for operacion in operaciones:
+                operacion['operacion'] = operacion['id']
+                escritor.writerow(['' if operacion.get(columna) is None else operacion[columna]
+                                   for columna in COLUMNAS_OPERACIONES])
+        return len(operaciones)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Consultar el diario de operaciones")
+    parser.add_argument('--diario', default=ARCHIVO_DIARIO, help="Base de datos SQLite del diario")
+    parser.add_argument('--activo', help="Filtrar por símbolo")
+    parser.add_argument('--desde', type=int, default=None, help="Timestamp inicial (ms)")
+    parser.add_argument('--hasta', type=int, default=None, help="Timestamp final (ms)")
+    parser.add_argument('--exportar', help="Exportar las operaciones a este CSV")
+    args = parser.parse_args()
+
+    diario = DiarioOperaciones(args.diario)
+    print(f"📒 {args.diario}: {diario.resumen(args.activo, args.desde, args.hasta)}")
+    if args.exportar:
+        n = diario.exportar_csv(args.exportar, args.activo, args.desde, args.hasta)
+        print(f"✅ {n} operaciones exportadas a {args.exportar}")
+    diario.cerrar()
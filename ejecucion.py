@@ -1,55 +1,74 @@
+import asyncio
 import pandas as pd
 import time
+from collections import deque
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
 from api_connection import APIConnection
 from estrategia import EstrategiaMACD, Signal
-from config import CONFIG_TRADING, ARCHIVO_OPERACIONES
+from flujo_usuario import FlujoUsuario
+from niveles import IndiceNiveles
+from bus_eventos import BusEventos
+from diario_operaciones import DiarioOperaciones
+from estadisticas_operaciones import EstadisticasOperaciones
+from config import CONFIG_TRADING, CONFIG_OPERACIONES, ARCHIVO_DIARIO, CODIGO_REDUCE_ONLY_RECHAZADA
 
 class GestorOperaciones:
-    def __init__(self, api: APIConnection, estrategia: EstrategiaMACD):
+    def __init__(self, api: APIConnection, estrategia: EstrategiaMACD, activo: Optional[str] = None,
+                 flujo_usuario: Optional[FlujoUsuario] = None, reloj: Callable[[], float] = time.time,
+                 diario: Optional[DiarioOperaciones] = None,
+                 estadisticas: Optional[EstadisticasOperaciones] = None,
+                 eventos: Optional[BusEventos] = None):
         self.api = api
+        # Reloj inyectable (segundos): el replay usa uno virtual
+        self.reloj = reloj
+        # Ejecuciones reales (precio medio, cantidad y comisión) desde el user data stream
+        self.flujo_usuario = flujo_usuario
         self.estrategia = estrategia
         self.config = CONFIG_TRADING
+        self.activo = activo or self.config['activo']
         self.operaciones_activas = []
-        self.operaciones_cerradas = []
-        self.archivo_operaciones = ARCHIVO_OPERACIONES
-        self.inicializar_archivo()
-        
-    def inicializar_archivo(self):
-        """Inicializar archivo CSV para operaciones si no existe"""
-        try:
-            with open(self.archivo_operaciones, 'x') as f:
-                f.write("timestamp,operacion,activo,direccion,precio_entrada,cantidad,stop_loss,take_profit,precio_salida,comision,pnl,pnl_percentaje,razon_cierre\n")
-        except FileExistsError:
-            pass  # El archivo ya existe, no hay problema
+        # Solo las últimas cerradas: el historial completo está en el diario
+        self.operaciones_cerradas = deque(maxlen=CONFIG_OPERACIONES['ventana_memoria'])
+        # TP/SL de las operaciones abiertas ordenados por precio
+        self.niveles = IndiceNiveles()
+        # Órdenes TP/SL colocadas en el exchange por operación: id operación -> {orderId: razón}
+        self.protecciones: Dict[int, Dict[int, str]] = {}
+        # Cierres fallidos seguidos por operación (espera creciente entre reintentos)
+        self.reintentos_cierre: Dict[int, int] = {}
+        # Diario compartido por los gestores del bot; uno propio si se usa suelto
+        self.diario = diario or DiarioOperaciones(ARCHIVO_DIARIO)
+        # Agregados de las operaciones cerradas (compartidos entre gestores para el total)
+        self.estadisticas = estadisticas or EstadisticasOperaciones()
+        # Aperturas y cierres hacia el panel en vivo
+        self.eventos = eventos or BusEventos()
+        self.lock_apertura = asyncio.Lock()
+        # Latencias recientes entre el envío de la entrada y la confirmación de TP/SL (ms)
+        self.latencias_proteccion = deque(maxlen=100)
     
     def guardar_operacion(self, operacion: Dict):
-        """Guardar operación en archivo CSV"""
-        try:
-            with open(self.archivo_operaciones, 'a') as f:
-                f.write(f"{operacion['timestamp']},{operacion['id']},{operacion['activo']},"
-                        f"{operacion['direccion']},{operacion['precio_entrada']},{operacion['cantidad']},"
-                        f"{operacion.get('stop_loss', '')},{operacion.get('take_profit', '')},"
-                        f"{operacion.get('precio_salida', '')},{operacion.get('comision', 0)},"
-                        f"{operacion.get('pnl', 0)},{operacion.get('pnl_percentaje', 0)},"
-                        f"{operacion.get('razon_cierre', '')}\n")
-        except Exception as e:
-            print(f"Error guardando operación: {e}")
+        """Guardar el estado de la operación en el diario (lo escribe su hilo, en lotes)"""
+        self.diario.registrar(operacion)
     
     def configurar_cuenta(self):
         """Configurar cuenta con apalancamiento y tipo de margen"""
         print("Configurando cuenta...")
         
+        # Cargar filtros de símbolos una sola vez y mantenerlos actualizados en segundo plano
+        if not self.api.simbolos.simbolos and self.api.simbolos.cargar():
+            print(f"Información de {len(self.api.simbolos.simbolos)} símbolos cargada")
+        self.api.simbolos.iniciar_refresco()
+        
         # Establecer apalancamiento
-        resultado = self.api.set_leverage(self.config['activo'], self.config['apalancamiento'])
+        resultado = self.api.set_leverage(self.activo, self.config['apalancamiento'])
         if resultado:
-            print(f"Apalancamiento establecido a {self.config['apalancamiento']}x")
+            print(f"Apalancamiento de {self.activo} establecido a {self.config['apalancamiento']}x")
         
         # Establecer tipo de margen
-        resultado = self.api.set_margin_type(self.config['activo'], self.config['tipo_margen'])
+        resultado = self.api.set_margin_type(self.activo, self.config['tipo_margen'])
         if resultado:
-            print(f"Tipo de margen establecido a {self.config['tipo_margen']}")
+            print(f"Tipo de margen de {self.activo} establecido a {self.config['tipo_margen']}")
     
     def calcular_cantidad(self, precio: float) -> float:
         """Calcular cantidad a operar basado en el monto configurado"""
@@ -57,65 +76,62 @@ class GestorOperaciones:
         monto = self.config['monto_operacion']
         cantidad_cruda = monto / precio
         
-        # Obtener información de precisión del símbolo
-        try:
-            # Obtener información del exchange
-            exchange_info = self.api.client.futures_exchange_info()
-            symbol_info = None
+        # Filtros del símbolo desde la caché (sin llamada REST en el camino de la orden)
+        info = self.api.get_symbol_info(self.activo)
+        if info and info.step_size > 0:
+            cantidad_ajustada = info.ajustar_cantidad(cantidad_cruda)
+            print(f"Cantidad cruda: {cantidad_cruda}, Ajustada: {cantidad_ajustada}")
             
-            for symbol in exchange_info['symbols']:
-                if symbol['symbol'] == self.config['activo']:
-                    symbol_info = symbol
-                    break
-            
-            if symbol_info:
-                # Encontrar el filtro de LOT_SIZE
-                lot_size_filter = None
-                for filtro in symbol_info['filters']:
-                    if filtro['filterType'] == 'LOT_SIZE':
-                        lot_size_filter = filtro
-                        break
-                
-                if lot_size_filter:
-                    # Obtener step size (precisión permitida)
-                    step_size = float(lot_size_filter['stepSize'])
-                    # Redondear a la precisión permitida
-                    cantidad_ajustada = round(cantidad_cruda / step_size) * step_size
-                    print(f"Cantidad cruda: {cantidad_cruda}, Ajustada: {cantidad_ajustada}")
-                    return cantidad_ajustada
-        
-        except Exception as e:
-            print(f"Error obteniendo información de precisión: {e}")
+            if cantidad_ajustada < info.min_qty:
+                print(f"Cantidad por debajo del mínimo del símbolo ({info.min_qty})")
+                return 0
+            if cantidad_ajustada * precio < info.min_notional:
+                print(f"Valor nocional por debajo del mínimo del símbolo ({info.min_notional} USDT)")
+                return 0
+            return cantidad_ajustada
         
         # Fallback: redondear a 6 decimales
         return round(cantidad_cruda, 6)
     
-    def obtener_precio_entrada_real(self, orden: dict) -> float:
-        """Obtener el precio real de entrada de la orden"""
+    async def obtener_ejecucion(self, orden: dict, cantidad: float) -> Tuple[float, float, float]:
+        """Precio medio, cantidad ejecutada y comisión reales de una orden a mercado"""
+        # ORDER_TRADE_UPDATE del user data stream: datos exactos y sin llamada REST extra
+        if self.flujo_usuario is not None:
+            relleno = await self.flujo_usuario.esperar_relleno(orden['orderId'])
+            if relleno is not None and relleno.cantidad_ejecutada > 0 and relleno.precio_medio > 0:
+                if relleno.comision_activo and relleno.comision_activo != 'USDT':
+                    print(f"⚠️  Comisión cobrada en {relleno.comision_activo}, no en USDT")
+                return relleno.precio_medio, relleno.cantidad_ejecutada, relleno.comision
+        
         try:
-            # Intentar obtener el precio promedio de la orden
-            if 'avgPrice' in orden and orden['avgPrice']:
-                return float(orden['avgPrice'])
+            # Sin user data stream: precio promedio de la respuesta, si viene informado
+            if 'avgPrice' in orden and float(orden['avgPrice'] or 0):
+                return float(orden['avgPrice']), float(orden.get('executedQty') or cantidad), 0.0
             
-            # Si no está disponible, obtener el precio actual
-            ticker = self.api.client.futures_symbol_ticker(symbol=self.config['activo'])
-            return float(ticker['price'])
+            # Si no está disponible, obtener el precio actual (aproximado)
+            ticker = await self.api.get_symbol_ticker_async(self.activo)
+            return float(ticker['price']), cantidad, 0.0
             
         except Exception as e:
-            print(f"Error obteniendo precio de entrada real: {e}")
-            return 0
+            print(f"Error obteniendo ejecución de la orden: {e}")
+            return 0, cantidad, 0.0
 
-    def abrir_operacion(self, senal: Signal) -> bool:
+    async def abrir_operacion(self, senal: Signal) -> bool:
         """Abrir una nueva operación basada en una señal"""
-        if len(self.operaciones_activas) >= self.config['max_operaciones_simultaneas']:
-            print("Máximo de operaciones simultáneas alcanzado")
+        # Las aperturas de un mismo activo se serializan para respetar el límite de operaciones
+        async with self.lock_apertura:
+            return await self._abrir_operacion(senal)
+    
+    async def _abrir_operacion(self, senal: Signal) -> bool:
+        if len(self.operaciones_activas) >= self.config['max_operaciones_por_activo']:
+            print(f"Máximo de operaciones simultáneas alcanzado en {self.activo}")
             return False
         
         print(f"Procesando señal: {senal.tipo} a precio {senal.precio}")
         
         # Calcular cantidad
         cantidad = self.calcular_cantidad(senal.precio)
-        print(f"Cantidad calculada: {cantidad} {self.config['activo'].replace('USDT', '')}")
+        print(f"Cantidad calculada: {cantidad} {self.activo.replace('USDT', '')}")
         
         if cantidad <= 0:
             print("Cantidad inválida para operar")
@@ -124,25 +140,14 @@ class GestorOperaciones:
         # Determinar lado de la operación
         lado = 'BUY' if senal.tipo == 'long' else 'SELL'
         
-        # Calcular stop loss y take profit BASADO EN EL PRECIO DE SEÑAL (temporal)
-        if hasattr(self, 'estrategia') and self.estrategia is not None:
-            stop_loss, take_profit = self.estrategia.calcular_stop_loss_take_profit(
-                senal.precio, senal.atr, senal.tipo
-            )
-        else:
-            # Fallback para pruebas
-            if senal.tipo == 'long':
-                take_profit = senal.precio * 1.01
-                stop_loss = senal.precio * 0.99
-            else:
-                take_profit = senal.precio * 0.99
-                stop_loss = senal.precio * 1.01
-        
-        print(f"Stop Loss calculado: {stop_loss}, Take Profit calculado: {take_profit}")
+        # Los precios de TP/SL se redondean al tickSize real del símbolo
+        info = self.api.get_symbol_info(self.activo)
+        tick_size = info.tick_size if info else None
         
         # Crear orden
-        orden = self.api.create_order(
-            symbol=self.config['activo'],
+        inicio_entrada = time.perf_counter()
+        orden = await self.api.create_order_async(
+            symbol=self.activo,
             side=lado,
             quantity=cantidad,
             order_type='MARKET'
@@ -152,16 +157,16 @@ class GestorOperaciones:
             print("Error creando orden")
             return False
         
-        # Obtener el precio real de ejecución
-        precio_entrada_real = self.obtener_precio_entrada_real(orden)
+        # Obtener el precio, la cantidad y la comisión reales de la ejecución
+        precio_entrada_real, cantidad, comision = await self.obtener_ejecucion(orden, cantidad)
         if precio_entrada_real == 0:
             print("⚠️  Advertencia: No se pudo obtener el precio de entrada real, usando precio de señal")
             precio_entrada_real = senal.precio
         
-        # RECALCULAR STOP LOSS Y TAKE PROFIT CON EL PRECIO REAL
+        # CALCULAR STOP LOSS Y TAKE PROFIT CON EL PRECIO REAL
         if hasattr(self, 'estrategia') and self.estrategia is not None:
             stop_loss, take_profit = self.estrategia.calcular_stop_loss_take_profit(
-                precio_entrada_real, senal.atr, senal.tipo
+                precio_entrada_real, senal.atr, senal.tipo, tick_size
             )
         else:
             if senal.tipo == 'long':
@@ -174,128 +179,145 @@ class GestorOperaciones:
         # Registrar operación
         operacion = {
             'id': orden['orderId'],
-            'timestamp': int(time.time() * 1000),
-            'activo': self.config['activo'],
+            'timestamp': int(self.reloj() * 1000),
+            'activo': self.activo,
             'direccion': senal.tipo,
             'precio_entrada': precio_entrada_real,
             'cantidad': cantidad,
             'stop_loss': stop_loss,
             'take_profit': take_profit,
-            'comision': float(orden.get('commission', 0)),
+            'comision': comision,
             'estado': 'abierta'
         }
         
         self.operaciones_activas.append(operacion)
+        self.niveles.agregar(operacion)
+        
+        # COLOCAR ÓRDENES DE STOP LOSS Y TAKE PROFIT EN BINANCE (en paralelo, justo tras la entrada)
+        print("\n🎯 Colocando órdenes de Stop Loss y Take Profit...")
+        await self.colocar_ordenes_stop(operacion)
+        latencia_ms = (time.perf_counter() - inicio_entrada) * 1000
+        self.latencias_proteccion.append(latencia_ms)
+        
+        # El registro en disco y los mensajes quedan fuera de la ventana sin protección
         self.guardar_operacion(operacion)
+        self.eventos.publicar('apertura', operacion)
         print(f"✅ Operación {senal.tipo} abierta a {precio_entrada_real}")
         print(f"   Stop Loss: {stop_loss}")
         print(f"   Take Profit: {take_profit}")
-        print(f"   Cantidad: {cantidad} {self.config['activo'].replace('USDT', '')}")
+        print(f"   Cantidad: {cantidad} {self.activo.replace('USDT', '')}")
+        print(f"   Latencia entrada → protección: {latencia_ms:.1f} ms")
         
-        # COLOCAR ÓRDENES DE STOP LOSS Y TAKE PROFIT EN BINANCE
-        print("\n🎯 Colocando órdenes de Stop Loss y Take Profit...")
+        return True
+    
+    async def colocar_ordenes_stop(self, operacion: Dict):
+        """Colocar órdenes de stop loss y take profit en Binance de forma concurrente"""
+        lado_cierre = 'SELL' if operacion['direccion'] == 'long' else 'BUY'
+        ordenes = [{
+            'symbol': operacion['activo'],
+            'side': lado_cierre,
+            'quantity': operacion['cantidad'],
+            'order_type': 'TAKE_PROFIT_MARKET',
+            'stop_price': operacion['take_profit'],
+            'reduce_only': True
+        }]
+        if operacion['stop_loss'] > 0:
+            ordenes.append({
+                'symbol': operacion['activo'],
+                'side': lado_cierre,
+                'quantity': operacion['cantidad'],
+                'order_type': 'STOP_MARKET',
+                'stop_price': operacion['stop_loss'],
+                'reduce_only': True
+            })
         
-        # Orden de Take Profit
-        tp_orden = self.api.create_order(
-            symbol=self.config['activo'],
-            side='SELL' if senal.tipo == 'long' else 'BUY',
-            quantity=operacion['cantidad'],
-            order_type='TAKE_PROFIT_MARKET',
-            stop_price=operacion['take_profit'],
-            reduce_only=True
-        )
+        try:
+            resultados = await self.api.create_orders_concurrentes(ordenes)
+        except Exception as e:
+            print(f"Error colocando órdenes de stop: {e}")
+            return
         
+        # Si el exchange ejecuta un TP/SL, la operación se cierra aquí sin enviar otra orden
+        protecciones = self.protecciones.setdefault(operacion['id'], {})
+        for resultado, razon in zip(resultados, ('take_profit', 'stop_loss')):
+            if resultado:
+                # python-binance envía los TP/SL al servicio de órdenes algorítmicas, que responde con algoId
+                order_id = resultado.get('orderId', resultado.get('algoId'))
+                protecciones[order_id] = razon
+                if self.flujo_usuario is not None:
+                    self.flujo_usuario.vigilar_orden(order_id,
+                                                     partial(self.proteccion_terminada, operacion, order_id, razon))
+        
+        tp_orden = resultados[0]
         if tp_orden:
             print(f"✅ Orden Take Profit colocada a {operacion['take_profit']}")
         else:
             print("❌ Error colocando orden Take Profit")
         
-        # Orden de Stop Loss
-        sl_orden = self.api.create_order(
-            symbol=self.config['activo'],
-            side='SELL' if senal.tipo == 'long' else 'BUY',
-            quantity=operacion['cantidad'],
-            order_type='STOP_MARKET',
-            stop_price=operacion['stop_loss'],
-            reduce_only=True
-        )
-        
-        if sl_orden:
-            print(f"✅ Orden Stop Loss colocada a {operacion['stop_loss']}")
-        else:
-            print("❌ Error colocando orden Stop Loss")
-        
-        return True
-    
-    def colocar_ordenes_stop(self, operacion: Dict):
-        """Colocar órdenes de stop loss y take profit en Binance"""
-        try:
-            # Orden de Take Profit
-            tp_orden = self.api.create_order(
-                symbol=operacion['activo'],
-                side='SELL' if operacion['direccion'] == 'long' else 'BUY',
-                quantity=operacion['cantidad'],
-                order_type='TAKE_PROFIT_MARKET',
-                stop_price=operacion['take_profit'],
-                reduce_only=True
-            )
-            
-            if tp_orden:
-                print(f"✅ Orden Take Profit colocada a {operacion['take_profit']}")
-            
-            # Orden de Stop Loss
-            sl_orden = self.api.create_order(
-                symbol=operacion['activo'],
-                side='SELL' if operacion['direccion'] == 'long' else 'BUY',
-                quantity=operacion['cantidad'],
-                order_type='STOP_MARKET',
-                stop_price=operacion['stop_loss'],
-                reduce_only=True
-            )
-            
-            if sl_orden:
+        if len(resultados) > 1:
+            if resultados[1]:
                 print(f"✅ Orden Stop Loss colocada a {operacion['stop_loss']}")
-                
-        except Exception as e:
-            print(f"Error colocando órdenes de stop: {e}")
+            else:
+                print("❌ Error colocando orden Stop Loss")
+    
+    def proteccion_terminada(self, operacion: Dict, order_id: int, razon: str, relleno):
+        """Una orden TP/SL del exchange ha terminado; si se ejecutó, la posición ya está cerrada"""
+        self.protecciones.get(operacion['id'], {}).pop(order_id, None)
+        if relleno.estado != 'FILLED' or operacion['estado'] == 'cerrada':
+            return
+        self.niveles.quitar(operacion)
+        self.registrar_cierre(operacion, relleno.precio_medio, razon, relleno.comision)
+        if self.protecciones.get(operacion['id']):
+            asyncio.get_running_loop().create_task(self.cancelar_protecciones(operacion))
+    
+    async def cancelar_protecciones(self, operacion: Dict):
+        """Cancelar los TP/SL pendientes de una operación ya cerrada para que no actúen sobre otra posición"""
+        protecciones = self.protecciones.pop(operacion['id'], {})
+        if self.flujo_usuario is not None:
+            for order_id in protecciones:
+                self.flujo_usuario.dejar_de_vigilar(order_id)
+        await asyncio.gather(*(self.api.cancel_order_async(operacion['activo'], order_id, condicional=True)
+                               for order_id in protecciones))
+    
+    def estadisticas_latencia(self) -> Dict:
+        """Latencia entre el envío de la entrada y la confirmación de TP/SL (ms)"""
+        if not self.latencias_proteccion:
+            return {'muestras': 0}
+        latencias = sorted(self.latencias_proteccion)
+        return {
+            'muestras': len(latencias),
+            'ultima_ms': round(self.latencias_proteccion[-1], 1),
+            'p50_ms': round(latencias[len(latencias) // 2], 1),
+            'p95_ms': round(latencias[min(len(latencias) - 1, int(len(latencias) * 0.95))], 1),
+            'max_ms': round(latencias[-1], 1)
+        }
+    
+    def operaciones_disparadas(self, precio_actual: float) -> List[Tuple[Dict, str]]:
+        """Operaciones abiertas cuyo TP o SL ha alcanzado el precio; quedan marcadas como 'cerrando'"""
+        disparadas = self.niveles.extraer_disparados(precio_actual)
+        for operacion, _ in disparadas:
+            # Evita que ticks posteriores vuelvan a cerrar la misma operación
+            operacion['estado'] = 'cerrando'
+        return disparadas
     
-    def verificar_cierre_operaciones(self, precio_actual: float):
+    async def cerrar_operaciones(self, disparadas: List[Tuple[Dict, str]], precio_actual: float):
+        """Cerrar en paralelo las operaciones disparadas"""
+        await asyncio.gather(*(self.cerrar_operacion(operacion, precio_actual, razon)
+                               for operacion, razon in disparadas))
+    
+    async def verificar_cierre_operaciones(self, precio_actual: float):
         """Verificar si alguna operación activa debe cerrarse"""
-        for operacion in self.operaciones_activas[:]:
-            if operacion['estado'] == 'open':
-                debe_cerrar = False
-                razon = ""
-                
-                if operacion['direccion'] == 'long':
-                    # Verificar take profit
-                    if precio_actual >= operacion['take_profit']:
-                        debe_cerrar = True
-                        razon = "take_profit"
-                    # Verificar stop loss
-                    elif operacion['stop_loss'] > 0 and precio_actual <= operacion['stop_loss']:
-                        debe_cerrar = True
-                        razon = "stop_loss"
-                        
-                else:  # short
-                    # Verificar take profit
-                    if precio_actual <= operacion['take_profit']:
-                        debe_cerrar = True
-                        razon = "take_profit"
-                    # Verificar stop loss
-                    elif operacion['stop_loss'] > 0 and precio_actual >= operacion['stop_loss']:
-                        debe_cerrar = True
-                        razon = "stop_loss"
-                
-                if debe_cerrar:
-                    self.cerrar_operacion(operacion, precio_actual, razon)
+        disparadas = self.operaciones_disparadas(precio_actual)
+        if disparadas:
+            await self.cerrar_operaciones(disparadas, precio_actual)
     
-    def cerrar_operacion(self, operacion: Dict, exit_price: float, reason: str):
+    async def cerrar_operacion(self, operacion: Dict, exit_price: float, reason: str):
         """Cerrar una operación"""
         # Determinar lado para cerrar (opuesto al de entrada)
         lado_cierre = 'SELL' if operacion['direccion'] == 'long' else 'BUY'
         
         # Crear orden de cierre
-        orden = self.api.create_order(
+        orden = await self.api.create_order_async(
             symbol=operacion['activo'],
             side=lado_cierre,
             quantity=operacion['cantidad'],
@@ -304,14 +326,47 @@ class GestorOperaciones:
         )
         
         if not orden:
-            print("Error cerrando operación")
+            if operacion['estado'] == 'cerrada':
+                # Un TP/SL del exchange cerró la posición antes (el reduceOnly se rechaza)
+                return
+            if (self.api.ultimo_error_orden == CODIGO_REDUCE_ONLY_RECHAZADA and self.flujo_usuario is not None
+                    and self.protecciones.get(operacion['id'])):
+                # La posición ya no existe: un TP/SL del exchange la cerró y su evento aún no ha llegado.
+                # Queda en 'cerrando' hasta que proteccion_terminada la registre
+                print(f"Cierre de la operación {operacion['id']} rechazado (ReduceOnly): se espera al TP/SL del exchange")
+                return
+            intentos = self.reintentos_cierre.get(operacion['id'], 0) + 1
+            self.reintentos_cierre[operacion['id']] = intentos
+            if intentos > self.config['max_reintentos_cierre']:
+                print(f"❌ Error cerrando la operación {operacion['id']} tras {intentos - 1} reintentos: queda en 'cerrando'")
+                return
+            # Se reintentará con el primer precio tras la espera, no con cada tick
+            espera = self.config['reintento_cierre_segundos'] * 2 ** (intentos - 1)
+            print(f"Error cerrando operación; nuevo intento en {espera:.0f}s")
+            asyncio.get_running_loop().call_later(espera, self.reactivar_cierre, operacion)
             return
         
         # Calcular PNL
-        precio_cierre = self.obtener_precio_entrada_real(orden)
+        precio_cierre, _, comision = await self.obtener_ejecucion(orden, operacion['cantidad'])
         if precio_cierre == 0:
             precio_cierre = exit_price
-            
+        
+        # Durante la consulta pudo llegar el relleno de un TP/SL del exchange y quedar ya registrada
+        if operacion['estado'] == 'cerrada':
+            return
+        self.registrar_cierre(operacion, precio_cierre, reason, comision)
+        await self.cancelar_protecciones(operacion)
+    
+    def reactivar_cierre(self, operacion: Dict):
+        """Volver a vigilar los niveles de una operación cuyo cierre falló (si nada la ha cerrado entretanto)"""
+        if operacion['estado'] == 'cerrando':
+            operacion['estado'] = 'abierta'
+            self.niveles.agregar(operacion)
+    
+    def registrar_cierre(self, operacion: Dict, precio_cierre: float, reason: str, comision: float):
+        """Calcular el PNL y pasar la operación a cerradas (una sola vez por operación)"""
+        if operacion['estado'] == 'cerrada':
+            return
         if operacion['direccion'] == 'long':
             pnl = (precio_cierre - operacion['precio_entrada']) * operacion['cantidad']
         else:
@@ -321,18 +376,21 @@ class GestorOperaciones:
         
         # Actualizar operación
         operacion['precio_salida'] = precio_cierre
-        operacion['comision'] += float(orden.get('commission', 0))
+        operacion['comision'] += comision
         operacion['pnl'] = pnl
         operacion['pnl_percentaje'] = pnl_percentaje
         operacion['razon_cierre'] = reason
         operacion['estado'] = 'cerrada'
-        operacion['timestamp_cierre'] = int(time.time() * 1000)
+        operacion['timestamp_cierre'] = int(self.reloj() * 1000)
+        self.reintentos_cierre.pop(operacion['id'], None)
         
         # Mover a operaciones cerradas
         self.operaciones_activas.remove(operacion)
         self.operaciones_cerradas.append(operacion)
+        self.estadisticas.agregar(operacion)
         
-        # Actualizar archivo
+        # Actualizar la fila de la operación en el diario
         self.guardar_operacion(operacion)
+        self.eventos.publicar('cierre', operacion)
         
         print(f"Operación {operacion['direccion']} cerrada: {reason}, PNL: {pnl:.2f} USDT ({pnl_percentaje:.2f}%)")
\ No newline at end of file
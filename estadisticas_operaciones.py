@@ -0,0 +1,115 @@
+from bisect import bisect_left, bisect_right
+from collections import deque
+from itertools import islice
+from typing import Dict, Iterable, List, Optional
+from config import CONFIG_OPERACIONES
+
+def _secuencia(operacion: Dict) -> int:
+    return operacion['secuencia']
+
+class EstadisticasOperaciones:
+    """Agregados de las operaciones cerradas, actualizados en O(1) en cada cierre, y ventana de las más recientes"""
+
+    def __init__(self, ventana: Optional[int] = None):
+        self.operaciones = 0
+        # Secuencia (cursor) del último cierre
+        self.secuencia = 0
+        self.ganadoras = 0
+        self.pnl = 0.0
+        self.comisiones = 0.0
+        self.duracion_total_ms = 0
+        # Curva de PnL neto acumulado, su máximo y la mayor caída desde él (mismo criterio que backtest.resumir)
+        self.pnl_neto = 0.0
+        self.pico = 0.0
+        self.max_drawdown = 0.0
+        self.por_activo: Dict[str, Dict] = {}
+        # Últimas operaciones cerradas por secuencia; las anteriores se leen del diario
+        self.recientes = deque(maxlen=ventana or CONFIG_OPERACIONES['ventana_memoria'])
+
+    def agregar(self, operacion: Dict):
+        """Contabilizar una operación recién cerrada y asignarle su secuencia"""
+        operacion['secuencia'] = self.secuencia + 1
+        self._acumular(operacion)
+
+    def sembrar(self, agregados: Dict, recientes: Iterable[Dict]):
+        """Partir de los agregados del diario (agregados_cerradas) y de sus últimos cierres, en orden de secuencia"""
+        for simbolo, datos in agregados['por_activo'].items():
+            self.operaciones += datos['operaciones']
+            self.ganadoras += datos['ganadoras']
+            self.pnl += datos['pnl']
+            self.comisiones += datos['comisiones']
+            self.duracion_total_ms += datos['duracion_ms']
+            self.secuencia = max(self.secuencia, datos['secuencia'])
+            self.por_activo[simbolo] = {campo: datos[campo] for campo in ('operaciones', 'ganadoras', 'pnl', 'comisiones')}
+        self.pnl_neto = self.pnl - self.comisiones
+        self.pico = agregados['pico']
+        self.max_drawdown = agregados['max_drawdown']
+        self.recientes.extend(recientes)
+
+    def _acumular(self, operacion: Dict):
+        self.secuencia = operacion['secuencia']
+        self.operaciones += 1
+        neto = operacion['pnl'] - operacion['comision']
+        ganadora = neto > 0
+        self.ganadoras += ganadora
+        self.pnl += operacion['pnl']
+        self.comisiones += operacion['comision']
+        if operacion.get('timestamp_cierre') is not None:
+            self.duracion_total_ms += operacion['timestamp_cierre'] - operacion['timestamp']
+
+        self.pnl_neto += neto
+        self.pico = max(self.pico, self.pnl_neto)
+        self.max_drawdown = max(self.max_drawdown, self.pico - self.pnl_neto)
+
+        activo = self.por_activo.get(operacion['activo'])
+        if activo is None:
+            activo = self.por_activo[operacion['activo']] = {'operaciones': 0, 'ganadoras': 0, 'pnl': 0.0,
+                                                            'comisiones': 0.0}
+        activo['operaciones'] += 1
+        activo['ganadoras'] += ganadora
+        activo['pnl'] += operacion['pnl']
+        activo['comisiones'] += operacion['comision']
+
+        self.recientes.append(operacion)
+
+    def resumen(self) -> Dict:
+        """Agregados totales y por símbolo (no recorre las operaciones)"""
+        n = self.operaciones
+        return {
+            'operaciones': n,
+            'pnl': self.pnl,
+            'comisiones': self.comisiones,
+            'pnl_neto': self.pnl_neto,
+            'tasa_acierto': self.ganadoras / n if n else 0.0,
+            'duracion_media_s': self.duracion_total_ms / n / 1000 if n else 0.0,
+            'max_drawdown': self.max_drawdown,
+            'cursor': self.secuencia,
+            'por_activo': {
+                simbolo: {
+                    'operaciones': datos['operaciones'],
+                    'pnl': datos['pnl'],
+                    'comisiones': datos['comisiones'],
+                    'pnl_neto': datos['pnl'] - datos['comisiones'],
+                    'tasa_acierto': datos['ganadoras'] / datos['operaciones']
+                } for simbolo, datos in self.por_activo.items()
+            }
+        }
+
+    def pagina(self, desde: Optional[int] = None, antes: Optional[int] = None,
+               limite: int = 50) -> Optional[List[Dict]]:
+        """Página desde la ventana en memoria, o None si cae fuera de ella y hay que ir al diario
+
+        desde: cierres posteriores a ese cursor, de más antiguo a más reciente.
+        antes: cierres anteriores a ese cursor (por defecto, los últimos), de más reciente a más antiguo.
+        """
+        completa = len(self.recientes) == self.operaciones
+        if desde is not None:
+            if not completa and desde + 1 < self.recientes[0]['secuencia']:
+                return None
+            inicio = bisect_right(self.recientes, desde, key=_secuencia)
+            return list(islice(self.recientes, inicio, inicio + limite))
+        fin = len(self.recientes) if antes is None else bisect_left(self.recientes, antes, key=_secuencia)
+        if fin < limite and not completa:
+            # La página empieza antes de la ventana
+            return None
+        return [self.recientes[i] for i in range(fin - 1, max(fin - limite, 0) - 1, -1)]
@@ -0,0 +1,111 @@
+import asyncio
+import time
+from typing import Dict, Optional
+from config import CONFIG_ESTADO_CUENTA
+
+class EstadoCuenta:
+    """Saldos y posiciones en memoria: ACCOUNT_UPDATE del user data stream y REST solo cuando caducan"""
+
+    def __init__(self, api, flujo_usuario=None, config: Optional[Dict] = None):
+        self.api = api
+        self.config = config or CONFIG_ESTADO_CUENTA
+        self.flujo_usuario = flujo_usuario
+        # activo (USDT, BNB...) -> saldos; símbolo -> posición abierta
+        self.activos: Dict[str, Dict[str, float]] = {}
+        self.posiciones: Dict[str, Dict[str, float]] = {}
+        self.actualizado = None  # time.monotonic() del último dato recibido
+        self.origen = None  # 'rest' o 'stream'
+        self.conectado = False  # Si la última consulta REST funcionó
+        self.consultas_rest = 0
+        self.ultima_consulta = None  # Aunque falle, no se reintenta antes del TTL
+        self._refresco: Optional[asyncio.Task] = None
+        if flujo_usuario is not None:
+            flujo_usuario.register_callback('ACCOUNT_UPDATE', self.procesar_account_update)
+
+    def ttl(self) -> float:
+        """Con el user data stream conectado los cambios llegan solos: el REST es solo una red de seguridad"""
+        if self.flujo_usuario is not None and self.flujo_usuario.conectado.is_set():
+            return self.config['ttl_con_flujo']
+        return self.config['ttl_segundos']
+
+    def caducado(self) -> bool:
+        referencia = max(self.actualizado or 0.0, self.ultima_consulta or 0.0)
+        return referencia == 0.0 or time.monotonic() - referencia > self.ttl()
+
+    def cargar_snapshot(self, cuenta: Dict):
+        """Sustituir el estado por una respuesta de futures_account"""
+        self.activos = {
+            activo['asset']: {
+                'walletBalance': float(activo['walletBalance']),
+                'availableBalance': float(activo['availableBalance']),
+                'unrealizedProfit': float(activo.get('unrealizedProfit', 0))
+            } for activo in cuenta.get('assets', [])
+        }
+        # futures_account devuelve todos los símbolos; solo interesan los que tienen posición
+        self.posiciones = {
+            posicion['symbol']: {
+                'positionAmt': float(posicion['positionAmt']),
+                'entryPrice': float(posicion['entryPrice']),
+                'unrealizedProfit': float(posicion.get('unrealizedProfit', 0))
+            } for posicion in cuenta.get('positions', []) if float(posicion['positionAmt']) != 0
+        }
+        self.actualizado = time.monotonic()
+        self.origen = 'rest'
+
+    def procesar_account_update(self, data: Dict):
+        """Aplicar los saldos (B) y posiciones (P) que cambian en un ACCOUNT_UPDATE"""
+        cambios = data['a']
+        for saldo in cambios.get('B', []):
+            activo = self.activos.setdefault(saldo['a'], {'walletBalance': 0.0, 'availableBalance': 0.0,
+                                                          'unrealizedProfit': 0.0})
+            nuevo = float(saldo['wb'])
+            # El evento no trae el saldo disponible: se desplaza lo mismo que el saldo total
+            activo['availableBalance'] += nuevo - activo['walletBalance']
+            activo['walletBalance'] = nuevo
+        for posicion in cambios.get('P', []):
+            if float(posicion['pa']) == 0:
+                self.posiciones.pop(posicion['s'], None)
+            else:
+                self.posiciones[posicion['s']] = {
+                    'positionAmt': float(posicion['pa']),
+                    'entryPrice': float(posicion['ep']),
+                    'unrealizedProfit': float(posicion.get('up', 0))
+                }
+        self.actualizado = time.monotonic()
+        self.origen = 'stream'
+
+    async def refrescar(self):
+        """Consultar la cuenta por REST (una sola petición aunque la pidan varios a la vez)"""
+        self.consultas_rest += 1
+        self.ultima_consulta = time.monotonic()
+        try:
+            cuenta = await self.api.get_account_info_async()
+        except Exception as e:
+            # Red caída, timeout...: se sigue sirviendo el último estado, marcado como desconectado
+            print(f"Error consultando la cuenta: {e}")
+            cuenta = None
+        self.conectado = cuenta is not None
+        if cuenta is not None:
+            self.cargar_snapshot(cuenta)
+
+    async def obtener(self) -> Dict:
+        """Estado desde memoria; si caducó se refresca en segundo plano y se sirve el anterior"""
+        if self.caducado() and (self._refresco is None or self._refresco.done()):
+            self._refresco = asyncio.create_task(self.refrescar())
+        if self.actualizado is None and self._refresco is not None:
+            # Primera consulta: no hay nada que servir hasta que responda el REST
+            await asyncio.shield(self._refresco)
+        return self.resumen()
+
+    def resumen(self) -> Dict:
+        return {
+            'conectado': self.conectado or self.origen == 'stream',
+            'activos': self.activos,
+            'posiciones': self.posiciones,
+            'origen': self.origen,
+            'antiguedad_s': None if self.actualizado is None else round(time.monotonic() - self.actualizado, 1),
+            'consultas_rest': self.consultas_rest
+        }
+
+    def disponible(self, activo: str = 'USDT') -> float:
+        return self.activos.get(activo, {}).get('availableBalance', 0.0)
@@ -1,10 +1,15 @@
+import math
 import pandas as pd
 import numpy as np
-import talib
 import time
 from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
 from config import CONFIG_TRADING
+from buffer_ohlcv import BufferOHLCV, COLUMNAS_VELAS
+from indicadores import MotorIndicadores
+from registro_simbolos import redondear_a_paso
+from remuestreo import Remuestreador, intervalo_ms
+from alineacion import SerieAsOf
 
 @dataclass
 class Signal:
@@ -14,76 +19,94 @@ class Signal:
     atr: float = 0.0
 
 class EstrategiaMACD:
-    def __init__(self):
-        self.config = CONFIG_TRADING
-        self.datos_1m = pd.DataFrame()
-        self.datos_macd = pd.DataFrame()
-        self.macd_aligned = pd.DataFrame()
-        
-    def agregar_dato_ohlcv(self, timestamp: int, open: float, high: float, low: float, close: float, volume: float, timeframe: str):
-        """Agregar datos OHLCV a los DataFrames correspondientes"""
-        nuevo_dato = pd.DataFrame({
-            'timestamp': [timestamp],
-            'open': [open],
-            'high': [high],
-            'low': [low],
-            'close': [close],
-            'volume': [volume]
-        })
-        nuevo_dato.set_index('timestamp', inplace=True)
+    def __init__(self, config: Optional[Dict] = None, remuestrear: bool = False):
+        self.config = config if config is not None else CONFIG_TRADING
+        self.buffer_1m = BufferOHLCV(self.config['max_velas_1m'])
+        self.buffer_macd = BufferOHLCV(
+            self.config['max_velas_macd'],
+            columnas_extra=('macd', 'signal', 'histogram', 'atr')
+        )
+        self.motor_indicadores = MotorIndicadores(self.config)
+        # Apertura de la última vela del MACD que ya pasó por el motor (cada vela se procesa una vez)
+        self.ultimo_timestamp_indicadores: Optional[int] = None
+        # Con remuestreo, las velas del MACD salen de las de operaciones y no hace falta su stream
+        self.remuestreador = Remuestreador(
+            self.config['temporalidad_operaciones'], (self.config['temporalidad_macd'],)
+        ) if remuestrear else None
+        self.duracion_1m = intervalo_ms(self.config['temporalidad_operaciones'])
+        self.duracion_macd = intervalo_ms(self.config['temporalidad_macd'])
+        # (macd, signal, atr) de las últimas velas del MACD por hora de cierre, para consultarlos a fecha de t
+        self.macd_asof = SerieAsOf()
+
+    @property
+    def datos_1m(self) -> pd.DataFrame:
+        """Vista pandas de las velas de operaciones (se construye bajo demanda)"""
+        return self.buffer_1m.a_dataframe()
+
+    @property
+    def datos_macd(self) -> pd.DataFrame:
+        """Vista pandas de las velas e indicadores del MACD (se construye bajo demanda)"""
+        return self.buffer_macd.a_dataframe()
         
+    def agregar_dato_ohlcv(self, timestamp: int, open: float, high: float, low: float, close: float, volume: float, timeframe: str) -> bool:
+        """Agregar datos OHLCV a los buffers correspondientes; devuelve False si la vela ya se tenía"""
         if timeframe == self.config['temporalidad_operaciones']:
-            self.datos_1m = pd.concat([self.datos_1m, nuevo_dato])
-            # Limpiar datos antiguos para optimizar memoria
-            if len(self.datos_1m) > 1000:
-                self.datos_1m = self.datos_1m.iloc[-500:]
+            # Ingesta idempotente por hora de apertura: se descartan duplicados y velas desordenadas
+            ultimo = self.buffer_1m.ultimo_timestamp
+            if ultimo is not None and timestamp <= ultimo:
+                return False
+            # El buffer circular descarta solo las velas más antiguas
+            self.buffer_1m.agregar(timestamp, open, high, low, close, volume)
+            if self.remuestreador is not None:
+                # Si esta vela completa una del MACD, se incorpora antes de generar la señal
+                for vela in self.remuestreador.agregar(timestamp, open, high, low, close, volume):
+                    self.agregar_dato_ohlcv(vela.timestamp, vela.open, vela.high, vela.low, vela.close,
+                                            vela.volume, vela.temporalidad)
                 
         elif timeframe == self.config['temporalidad_macd']:
-            self.datos_macd = pd.concat([self.datos_macd, nuevo_dato])
-            # Calcular MACD cuando tengamos suficientes datos
-            if len(self.datos_macd) > self.config['macd_slow'] + 10:
-                self.calcular_macd()
-                # Alinear MACD con datos de 1m
-                if not self.datos_1m.empty:
-                    self.alinear_macd()
+            ultimo = self.buffer_macd.ultimo_timestamp
+            if ultimo is not None and timestamp <= ultimo:
+                return False
+            self.buffer_macd.agregar(timestamp, open, high, low, close, volume)
+            # Los indicadores se actualizan en cada vela para mantener su estado
+            self.calcular_macd()
+        
+        return True
+    
+    def sembrar_historial(self, velas_1m: Dict[str, np.ndarray], velas_macd: Dict[str, np.ndarray]):
+        """Cargar historial cerrado de golpe (arranque en caliente) antes de recibir datos en vivo"""
+        # Solo cuentan las últimas velas que caben en los buffers (evita recorrer años de un memmap)
+        velas_macd = {c: velas_macd[c][-self.buffer_macd.capacidad:] for c in COLUMNAS_VELAS}
+        velas_1m = {c: velas_1m[c][-self.buffer_1m.capacidad:] for c in COLUMNAS_VELAS}
+        for fila in zip(*(velas_macd[c].tolist() for c in COLUMNAS_VELAS)):
+            self.agregar_dato_ohlcv(*fila, self.config['temporalidad_macd'])
+        for fila in zip(*(velas_1m[c].tolist() for c in COLUMNAS_VELAS)):
+            self.agregar_dato_ohlcv(*fila, self.config['temporalidad_operaciones'])
     
     def calcular_macd(self):
-        """Calcular indicadores MACD"""
-        if len(self.datos_macd) < self.config['macd_slow'] + 10:
+        """Actualizar MACD y ATR de forma incremental con la última vela del MACD (sin efecto si ya se procesó)"""
+        timestamp = self.buffer_macd.ultimo_timestamp
+        if timestamp is None or timestamp == self.ultimo_timestamp_indicadores:
             return
+        self.ultimo_timestamp_indicadores = timestamp
             
-        close_prices = self.datos_macd['close'].ffill()
-        
-        # Calcular MACD
-        macd, signal, hist = talib.MACD(
-            close_prices,
-            fastperiod=self.config['macd_fast'],
-            slowperiod=self.config['macd_slow'],
-            signalperiod=self.config['macd_signal']
+        # Solo se procesa la vela nueva: el estado de las EMAs y del ATR se conserva
+        macd, signal, hist, atr = self.motor_indicadores.actualizar(
+            self.buffer_macd.ultimo('high'),
+            self.buffer_macd.ultimo('low'),
+            self.buffer_macd.ultimo('close')
         )
         
-        self.datos_macd['macd'] = macd
-        self.datos_macd['signal'] = signal
-        self.datos_macd['histogram'] = hist
-        
-        # Calcular ATR
-        self.datos_macd['atr'] = talib.ATR(
-            self.datos_macd['high'].ffill(),
-            self.datos_macd['low'].ffill(),
-            self.datos_macd['close'].ffill(),
-            timeperiod=self.config['atr_periodo']
-        )
-        
-        # Rellenar valores NaN
-        self.datos_macd = self.datos_macd.ffill()
+        self.buffer_macd.asignar_ultimo('macd', macd)
+        self.buffer_macd.asignar_ultimo('signal', signal)
+        self.buffer_macd.asignar_ultimo('histogram', hist)
+        self.buffer_macd.asignar_ultimo('atr', atr)
+        # Los valores de una vela del MACD rigen desde su cierre, no desde su apertura
+        self.macd_asof.agregar(self.buffer_macd.ultimo_timestamp + self.duracion_macd, (macd, signal, atr))
     
-    def alinear_macd(self):
-        """Alinear datos MACD con el timeframe de operaciones"""
-        if self.datos_macd.empty or self.datos_1m.empty:
-            return
-            
-        # Reindexar datos MACD al índice de 1m usando forward fill
-        self.macd_aligned = self.datos_macd.reindex(self.datos_1m.index, method='ffill')
+    def valores_macd_en(self, instante: int) -> Optional[Tuple[float, float, float]]:
+        """(macd, signal, atr) de la última vela del MACD cerrada en instante (ms), en O(1)"""
+        return self.macd_asof.en(instante)
     
     def generar_senal(self) -> Optional[Signal]:
         # SEÑAL DE PRUEBA - descomenta la siguiente línea para testing
@@ -92,34 +115,41 @@ class EstrategiaMACD:
         
         # Generar señal de trading basada en MACD
         
-        if self.macd_aligned.empty or len(self.macd_aligned) < 2:
+        if len(self.buffer_macd) <= self.config['macd_slow'] + 10 or len(self.buffer_1m) == 0:
             return None
-            
-        # Obtener los últimos dos valores alineados
-        current = self.macd_aligned.iloc[-1]
-        previous = self.macd_aligned.iloc[-2]
+        
+        # MACD vigente al cierre de la última vela de 1m y al cierre de la anterior: el cruce
+        # se detecta en la vela de 1m en la que entra en vigor la vela del MACD que lo produce
+        instante = self.buffer_1m.ultimo_timestamp + self.duracion_1m
+        actual = self.valores_macd_en(instante)
+        anterior = self.valores_macd_en(instante - self.duracion_1m)
+        if actual is None or anterior is None:
+            return None
+        (previous_macd, previous_signal, _), (current_macd, current_signal, current_atr) = anterior, actual
         
         # Verificar que tenemos todos los datos necesarios
-        if any(pd.isna([current['macd'], current['signal'], previous['macd'], previous['signal']])):
+        if any(math.isnan(valor) for valor in (current_macd, current_signal, previous_macd, previous_signal)):
             return None
         
         # Precio actual
-        current_price = self.datos_1m.iloc[-1]['close']
-        current_atr = current['atr'] if not pd.isna(current['atr']) else 0
+        current_price = self.buffer_1m.ultimo('close')
+        current_atr = current_atr if not math.isnan(current_atr) else 0
         
         # Señal LONG: MACD cruza por encima de la señal
-        if current['macd'] > current['signal'] and previous['macd'] <= previous['signal']:
-            return Signal(tipo='long', precio=current_price, timestamp=self.datos_1m.index[-1], atr=current_atr)
+        if current_macd > current_signal and previous_macd <= previous_signal:
+            return Signal(tipo='long', precio=current_price, timestamp=self.buffer_1m.ultimo_timestamp, atr=current_atr)
         
         # Señal SHORT: MACD cruza por debajo de la señal
-        elif current['macd'] < current['signal'] and previous['macd'] >= previous['signal']:
-            return Signal(tipo='short', precio=current_price, timestamp=self.datos_1m.index[-1], atr=current_atr)
+        elif current_macd < current_signal and previous_macd >= previous_signal:
+            return Signal(tipo='short', precio=current_price, timestamp=self.buffer_1m.ultimo_timestamp, atr=current_atr)
         
         return None
         
     
-    def calcular_stop_loss_take_profit(self, entry_price: float, atr: float, direction: str) -> Tuple[float, float]:
+    def calcular_stop_loss_take_profit(self, entry_price: float, atr: float, direction: str,
+                                       tick_size: Optional[float] = None) -> Tuple[float, float]:
         #Calcular stop loss y take profit según configuración
+        #Con tick_size los precios se ajustan al PRICE_FILTER del símbolo en lugar de a 2 decimales
         # Take Profit
         if self.config['take_profit_tipo'] == 'atr':
             if direction == 'long':
@@ -150,6 +180,8 @@ class EstrategiaMACD:
         else:
             stop_loss = 0.0  # No usar stop loss
         
+        if tick_size:
+            return redondear_a_paso(stop_loss, tick_size), redondear_a_paso(take_profit, tick_size)
         return round(stop_loss, 2), round(take_profit, 2)
     
     """
@@ -0,0 +1,384 @@
+import itertools
+import time
+from bisect import bisect_left, bisect_right, insort
+from typing import Callable, Dict, List, Optional
+from config import CONFIG_TRADING, CODIGO_REDUCE_ONLY_RECHAZADA
+from registro_simbolos import InfoSimbolo
+
+class RegistroSimbolosSimulado:
+    """Filtros de símbolo fijos, con la misma interfaz que RegistroSimbolos"""
+
+    def __init__(self, simbolos: Optional[Dict[str, InfoSimbolo]] = None):
+        self.simbolos = simbolos or {'BTCUSDT': InfoSimbolo('BTCUSDT', 0.001, 0.001, 0.1, 5.0, 3, 2)}
+
+    def obtener(self, simbolo: str) -> Optional[InfoSimbolo]:
+        return self.simbolos.get(simbolo)
+
+    def cargar(self) -> bool:
+        return True
+
+    def solicitar_recarga(self):
+        pass
+
+    def iniciar_refresco(self):
+        pass
+
+    def detener_refresco(self):
+        pass
+
+class PosicionSimulada:
+    """Posición neta (modo one-way) de un símbolo con margen aislado"""
+    __slots__ = ('cantidad', 'precio_entrada', 'margen', 'precio_liquidacion')
+
+    def __init__(self):
+        self.cantidad = 0.0  # Positiva en largo, negativa en corto
+        self.precio_entrada = 0.0
+        self.margen = 0.0
+        self.precio_liquidacion = 0.0
+
+class OrdenSimulada:
+    __slots__ = ('order_id', 'client_order_id', 'simbolo', 'lado', 'tipo', 'cantidad', 'stop_price',
+                 'reduce_only', 'estado', 'cantidad_ejecutada', 'precio_medio', 'comision', 'pnl_realizado')
+
+    def __init__(self, order_id: int, simbolo: str, lado: str, tipo: str, cantidad: float,
+                 stop_price: float, reduce_only: bool):
+        self.order_id = order_id
+        self.client_order_id = f"sim_{order_id}"
+        self.simbolo = simbolo
+        self.lado = lado
+        self.tipo = tipo
+        self.cantidad = cantidad
+        self.stop_price = stop_price
+        self.reduce_only = reduce_only
+        self.estado = 'NEW'
+        self.cantidad_ejecutada = 0.0
+        self.precio_medio = 0.0
+        self.comision = 0.0
+        self.pnl_realizado = 0.0
+
+    def respuesta(self) -> Dict:
+        """Respuesta con los campos de futures_create_order (números en lugar de cadenas)"""
+        return {
+            'orderId': self.order_id,
+            'clientOrderId': self.client_order_id,
+            'symbol': self.simbolo,
+            'status': self.estado,
+            'side': self.lado,
+            'type': self.tipo,
+            'origQty': self.cantidad,
+            'executedQty': self.cantidad_ejecutada,
+            'avgPrice': self.precio_medio,
+            'stopPrice': self.stop_price,
+            'reduceOnly': self.reduce_only,
+            'positionSide': 'BOTH'
+        }
+
+class ExchangeSimulado:
+    """Motor de emparejamiento local con la misma interfaz de órdenes y cuenta que APIConnection"""
+
+    def __init__(self, balance_inicial: float = 10000.0, comision: Optional[float] = None,
+                 api_mercado=None, simbolos: Optional[Dict[str, InfoSimbolo]] = None):
+        # Conexión real opcional para todo lo que no se simula (streams, klines...): trading en papel
+        self.api_mercado = api_mercado
+        if api_mercado is None:
+            self.simbolos = RegistroSimbolosSimulado(simbolos)
+            self.callbacks = {}
+            self._pipeline = None
+        else:
+            self.simbolos = api_mercado.simbolos
+        self.balance = balance_inicial
+        self.comision = CONFIG_TRADING['comision'] if comision is None else comision
+        self.precios: Dict[str, float] = {}
+        self.apalancamientos: Dict[str, int] = {}
+        self.tipos_margen: Dict[str, str] = {}
+        self.posiciones: Dict[str, PosicionSimulada] = {}
+        # Solo las órdenes stop pendientes: las órdenes a mercado se llenan al crearse
+        self.ordenes: Dict[int, OrdenSimulada] = {}
+        # Suma de los márgenes aislados de todas las posiciones
+        self.margen_total = 0.0
+        # Órdenes stop pendientes por símbolo, ordenadas por precio de disparo
+        self.stops_al_subir: Dict[str, List] = {}
+        self.stops_al_bajar: Dict[str, List] = {}
+        self._ids = itertools.count(1)
+        # Código de Binance de la última orden rechazada (mismo atributo que APIConnection)
+        self.ultimo_error_orden: Optional[int] = None
+        # Receptores de eventos con el formato del user data stream (ORDER_TRADE_UPDATE)
+        self.suscriptores: List[Callable[[Dict], None]] = []
+        self.eventos_orden = 0
+
+    def __getattr__(self, nombre: str):
+        # Solo se llama para atributos que no existen aquí: se delegan en la conexión real
+        api_mercado = self.__dict__.get('api_mercado')
+        if api_mercado is None:
+            raise AttributeError(nombre)
+        return getattr(api_mercado, nombre)
+
+    @property
+    def pipeline(self):
+        return self._pipeline if self.api_mercado is None else self.api_mercado.pipeline
+
+    @pipeline.setter
+    def pipeline(self, pipeline):
+        # Los mensajes de mercado los recibe la conexión real: es ella la que necesita el pipeline
+        if self.api_mercado is None:
+            self._pipeline = pipeline
+        else:
+            self.api_mercado.pipeline = pipeline
+
+    def suscribir(self, callback: Callable[[Dict], None]):
+        """Recibir ORDER_TRADE_UPDATE de cada cambio de estado de una orden"""
+        self.suscriptores.append(callback)
+
+    def _emitir(self, orden: OrdenSimulada, tipo_ejecucion: str, cantidad: float = 0.0,
+                precio: float = 0.0, comision: float = 0.0, pnl: float = 0.0):
+        self.eventos_orden += 1
+        if not self.suscriptores:
+            return
+        # Mismos campos que el user data stream, pero con números en lugar de cadenas
+        evento = {
+            'e': 'ORDER_TRADE_UPDATE', 'E': int(time.time() * 1000),
+            'o': {'s': orden.simbolo, 'c': orden.client_order_id, 'S': orden.lado, 'o': orden.tipo,
+                  'q': orden.cantidad, 'ap': orden.precio_medio, 'sp': orden.stop_price,
+                  'x': tipo_ejecucion, 'X': orden.estado, 'i': orden.order_id, 'l': cantidad,
+                  'z': orden.cantidad_ejecutada, 'L': precio, 'N': 'USDT', 'n': comision,
+                  'R': orden.reduce_only, 'rp': pnl}
+        }
+        for callback in self.suscriptores:
+            callback(evento)
+
+    # --- Cuenta -----------------------------------------------------------------
+
+    def set_leverage(self, symbol: str, leverage: int):
+        """Establecer apalancamiento"""
+        self.apalancamientos[symbol] = leverage
+        return {'symbol': symbol, 'leverage': leverage}
+
+    def set_margin_type(self, symbol: str, margin_type: str):
+        """Establecer tipo de margen (no se puede cambiar con posición abierta)"""
+        posicion = self.posiciones.get(symbol)
+        if posicion is not None and posicion.cantidad != 0:
+            print("Error estableciendo tipo de margen: hay una posición abierta")
+            return None
+        if self.tipos_margen.get(symbol, 'CROSSED') == margin_type:
+            return None  # Igual que APIConnection con "No need to change margin type"
+        self.tipos_margen[symbol] = margin_type
+        return {'code': 200, 'msg': 'success'}
+
+    def pnl_no_realizado(self, simbolo: str) -> float:
+        posicion = self.posiciones.get(simbolo)
+        if posicion is None or posicion.cantidad == 0:
+            return 0.0
+        return (self.precios.get(simbolo, posicion.precio_entrada) - posicion.precio_entrada) * posicion.cantidad
+
+    def get_account_info(self):
+        """Obtener información de la cuenta con el formato de futures_account"""
+        no_realizado = sum(self.pnl_no_realizado(simbolo) for simbolo in self.posiciones)
+        disponible = self.balance - self.margen_total
+        return {
+            'totalWalletBalance': str(self.balance),
+            'totalUnrealizedProfit': str(no_realizado),
+            'totalMarginBalance': str(self.balance + no_realizado),
+            'availableBalance': str(disponible),
+            'assets': [{
+                'asset': 'USDT',
+                'walletBalance': str(self.balance),
+                'unrealizedProfit': str(no_realizado),
+                'marginBalance': str(self.balance + no_realizado),
+                'availableBalance': str(disponible)
+            }],
+            'positions': [{
+                'symbol': simbolo,
+                'positionAmt': str(posicion.cantidad),
+                'entryPrice': str(posicion.precio_entrada),
+                'unrealizedProfit': str(self.pnl_no_realizado(simbolo)),
+                'isolatedMargin': str(posicion.margen),
+                'leverage': str(self.apalancamientos.get(simbolo, 20)),
+                'isolated': self.tipos_margen.get(simbolo) == 'ISOLATED',
+                'positionSide': 'BOTH'
+            } for simbolo, posicion in self.posiciones.items() if posicion.cantidad != 0]
+        }
+
+    async def get_account_info_async(self):
+        return self.get_account_info()
+
+    def get_symbol_info(self, symbol: str):
+        return self.simbolos.obtener(symbol)
+
+    async def get_symbol_ticker_async(self, symbol: str):
+        return {'symbol': symbol, 'price': str(self.precios.get(symbol, 0.0))}
+
+    # --- Órdenes ----------------------------------------------------------------
+
+    def create_order(self, symbol: str, side: str, quantity: float,
+                     order_type: str = 'MARKET', price: float = None,
+                     stop_price: float = None, reduce_only: bool = False):
+        """Crear una orden; devuelve None si el exchange la rechazaría (como APIConnection)"""
+        self.ultimo_error_orden = None
+        if quantity <= 0:
+            print("Error creando orden: cantidad inválida")
+            return None
+        orden = OrdenSimulada(next(self._ids), symbol, side, order_type, quantity, stop_price or 0.0, reduce_only)
+
+        if order_type == 'MARKET':
+            precio = self.precios.get(symbol)
+            if precio is None:
+                print(f"Error creando orden: sin precio de {symbol}")
+                return None
+            if not self._ejecutar(orden, precio):
+                return None
+            return orden.respuesta()
+
+        if order_type not in ('STOP_MARKET', 'TAKE_PROFIT_MARKET'):
+            print(f"Error creando orden: tipo {order_type} no soportado")
+            return None
+        if not stop_price:
+            print("Error creando orden: falta stopPrice")
+            return None
+
+        al_subir = (side == 'BUY') == (order_type == 'STOP_MARKET')
+        precio = self.precios.get(symbol)
+        if precio is not None and (precio >= stop_price if al_subir else precio <= stop_price):
+            # Código -2021 de Binance
+            print("Error creando orden: Order would immediately trigger")
+            return None
+
+        self.ordenes[orden.order_id] = orden
+        libro = self.stops_al_subir if al_subir else self.stops_al_bajar
+        insort(libro.setdefault(symbol, []), (stop_price, orden.order_id))
+        self._emitir(orden, 'NEW')
+        return orden.respuesta()
+
+    async def create_order_async(self, symbol: str, side: str, quantity: float,
+                                 order_type: str = 'MARKET', price: float = None,
+                                 stop_price: float = None, reduce_only: bool = False):
+        return self.create_order(symbol, side, quantity, order_type, price, stop_price, reduce_only)
+
+    async def create_orders_concurrentes(self, ordenes: List[Dict]) -> List:
+        return [self.create_order(**orden) for orden in ordenes]
+
+    def cancel_order(self, symbol: str, order_id: int):
+        """Cancelar una orden stop pendiente"""
+        orden = self.ordenes.pop(order_id, None)
+        if orden is None:
+            print(f"Error cancelando orden {order_id}: no está pendiente")
+            return None
+        self._quitar_stop(orden)
+        orden.estado = 'CANCELED'
+        self._emitir(orden, 'CANCELED')
+        return orden.respuesta()
+
+    async def cancel_order_async(self, symbol: str, order_id: int, condicional: bool = False):
+        return self.cancel_order(symbol, order_id)
+
+    def close_position(self, symbol: str, side: str, quantity: float):
+        """Cerrar una posición"""
+        close_side = 'SELL' if side == 'BUY' else 'BUY'
+        return self.create_order(symbol, close_side, quantity, reduce_only=True)
+
+    def _quitar_stop(self, orden: OrdenSimulada):
+        for libro in (self.stops_al_subir, self.stops_al_bajar):
+            lista = libro.get(orden.simbolo)
+            if lista:
+                i = bisect_left(lista, (orden.stop_price, orden.order_id))
+                if i < len(lista) and lista[i] == (orden.stop_price, orden.order_id):
+                    del lista[i]
+                    return
+
+    def _ejecutar(self, orden: OrdenSimulada, precio: float) -> bool:
+        """Llenar una orden a mercado contra la posición neta del símbolo"""
+        posicion = self.posiciones.get(orden.simbolo)
+        if posicion is None:
+            posicion = self.posiciones[orden.simbolo] = PosicionSimulada()
+        signo = 1.0 if orden.lado == 'BUY' else -1.0
+        cantidad = orden.cantidad
+
+        # Parte que reduce la posición contraria y parte que abre o aumenta
+        reduce = min(cantidad, abs(posicion.cantidad)) if posicion.cantidad * signo < 0 else 0.0
+        if orden.reduce_only:
+            if reduce == 0:
+                orden.estado = 'EXPIRED' if orden.tipo != 'MARKET' else 'REJECTED'
+                print(f"Orden {orden.order_id} rechazada: ReduceOnly sin posición que reducir")
+                self.ultimo_error_orden = CODIGO_REDUCE_ONLY_RECHAZADA
+                return False
+            cantidad = reduce
+        abre = cantidad - reduce
+
+        apalancamiento = self.apalancamientos.get(orden.simbolo, 20)
+        comision = cantidad * precio * self.comision
+        margen_nuevo = abre * precio / apalancamiento
+        if abre > 0 and margen_nuevo + comision > self.balance - self.margen_total + 1e-12:
+            orden.estado = 'REJECTED'
+            print("Error creando orden: Margin is insufficient")
+            return False
+
+        pnl = 0.0
+        margen_previo = posicion.margen
+        if reduce > 0:
+            pnl = (precio - posicion.precio_entrada) * reduce * -signo
+            posicion.margen -= posicion.margen * reduce / abs(posicion.cantidad)
+            posicion.cantidad += signo * reduce
+            if abs(posicion.cantidad) < 1e-12:
+                posicion.cantidad = 0.0
+                posicion.precio_entrada = 0.0
+                posicion.margen = 0.0
+        if abre > 0:
+            total = abs(posicion.cantidad) + abre
+            posicion.precio_entrada = (posicion.precio_entrada * abs(posicion.cantidad) + precio * abre) / total
+            posicion.cantidad += signo * abre
+            posicion.margen += margen_nuevo
+        if posicion.cantidad != 0:
+            # Margen aislado: se liquida cuando la pérdida agota el margen de la posición
+            posicion.precio_liquidacion = (posicion.precio_entrada -
+                                           posicion.margen / posicion.cantidad)
+        else:
+            posicion.precio_liquidacion = 0.0
+
+        self.margen_total += posicion.margen - margen_previo
+        self.balance += pnl - comision
+        orden.estado = 'FILLED'
+        orden.cantidad = cantidad
+        orden.cantidad_ejecutada = cantidad
+        orden.precio_medio = precio
+        orden.comision = comision
+        orden.pnl_realizado = pnl
+        self._emitir(orden, 'TRADE', cantidad, precio, comision, pnl)
+        return True
+
+    # --- Precio -----------------------------------------------------------------
+
+    def actualizar_precio(self, simbolo: str, precio: float):
+        """Nuevo precio del stream: dispara stops y liquidaciones"""
+        self.precios[simbolo] = precio
+
+        subir = self.stops_al_subir.get(simbolo)
+        if subir and subir[0][0] <= precio:
+            disparados = subir[:bisect_right(subir, (precio, float('inf')))]
+            del subir[:len(disparados)]
+            self._disparar(disparados, precio)
+        bajar = self.stops_al_bajar.get(simbolo)
+        if bajar and bajar[-1][0] >= precio:
+            inicio = bisect_left(bajar, (precio, float('-inf')))
+            disparados = bajar[inicio:]
+            del bajar[inicio:]
+            self._disparar(disparados, precio)
+
+        posicion = self.posiciones.get(simbolo)
+        if posicion is not None and posicion.cantidad != 0 and self.tipos_margen.get(simbolo) == 'ISOLATED':
+            if (posicion.cantidad > 0 and precio <= posicion.precio_liquidacion) or \
+               (posicion.cantidad < 0 and precio >= posicion.precio_liquidacion):
+                self._liquidar(simbolo, posicion)
+
+    def _disparar(self, disparados: List, precio: float):
+        for _, order_id in disparados:
+            orden = self.ordenes.pop(order_id)
+            # Una orden stop se ejecuta a mercado al precio que la dispara
+            if not self._ejecutar(orden, precio):
+                self._emitir(orden, 'EXPIRED')
+
+    def _liquidar(self, simbolo: str, posicion: PosicionSimulada):
+        """Cerrar la posición al precio de liquidación perdiendo todo su margen aislado"""
+        print(f"⚠️  Posición de {simbolo} liquidada a {posicion.precio_liquidacion}")
+        lado = 'SELL' if posicion.cantidad > 0 else 'BUY'
+        orden = OrdenSimulada(next(self._ids), simbolo, lado, 'MARKET', abs(posicion.cantidad), 0.0, True)
+        orden.client_order_id = f"autoclose-{orden.order_id}"
+        self._ejecutar(orden, posicion.precio_liquidacion)
@@ -0,0 +1,188 @@
+import asyncio
+import websockets
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Union
+from api_connection import APIConnection
+from config import CONFIG_FLUJO_USUARIO, CONFIG_WEBSOCKET
+from decodificacion import cargar_json
+
+# Estados de orden a partir de los cuales ya no habrá más ejecuciones
+ESTADOS_FINALES = ('FILLED', 'CANCELED', 'EXPIRED', 'REJECTED', 'EXPIRED_IN_MATCH')
+
+@dataclass
+class RellenoOrden:
+    order_id: int
+    client_order_id: str
+    simbolo: str
+    estado: str = 'NEW'
+    cantidad_ejecutada: float = 0.0
+    precio_medio: float = 0.0
+    comision: float = 0.0
+    comision_activo: str = ''
+    pnl_realizado: float = 0.0
+
+    @property
+    def terminada(self) -> bool:
+        return self.estado in ESTADOS_FINALES
+
+class FlujoUsuario:
+    """Suscripción al user data stream (listenKey) que resuelve precio, cantidad y comisión reales de cada orden"""
+
+    def __init__(self, api: APIConnection, config: Optional[Dict] = None):
+        self.api = api
+        self.config = config or CONFIG_FLUJO_USUARIO
+        # orderId -> relleno, acotado a las órdenes más recientes
+        self.ordenes: 'OrderedDict[int, RellenoOrden]' = OrderedDict()
+        self.por_cliente: Dict[str, int] = {}
+        self.esperas: Dict[int, asyncio.Future] = {}
+        # orderId -> callback(relleno) al terminar; para órdenes que el exchange ejecuta solo (TP/SL)
+        self.vigilancias: Dict[int, Callable[[RellenoOrden], None]] = {}
+        self.listen_key = None
+        self.conectado = asyncio.Event()
+        # Callbacks adicionales por tipo de evento (ACCOUNT_UPDATE, ...)
+        self.callbacks = {}
+
+    def register_callback(self, evento: str, callback):
+        """Registrar un callback para un tipo de evento del user data stream"""
+        self.callbacks[evento] = callback
+
+    async def ejecutar(self):
+        """Mantener la conexión del user data stream, renovando la listenKey y reconectando si se cae"""
+        espera = CONFIG_WEBSOCKET['backoff_inicial']
+        while True:
+            ws_connection = None
+            keepalive = None
+            try:
+                self.listen_key = await self.api.crear_listen_key_async()
+                ws_connection = await websockets.connect(f"{self.api.ws_url}/{self.listen_key}")
+                keepalive = asyncio.create_task(self.renovar_periodicamente())
+                self.conectado.set()
+                print("Conectado al user data stream")
+                espera = CONFIG_WEBSOCKET['backoff_inicial']
+
+                async for message in ws_connection:
+                    if self.procesar_evento(cargar_json(message)) == 'listenKeyExpired':
+                        print("listenKey caducada, renovando conexión del user data stream")
+                        break
+
+            except websockets.exceptions.ConnectionClosed:
+                print("Conexión del user data stream cerrada")
+            except Exception as e:
+                print(f"Error en el user data stream: {e}")
+            finally:
+                self.conectado.clear()
+                if keepalive is not None:
+                    keepalive.cancel()
+                if ws_connection is not None:
+                    await ws_connection.close()
+
+            print(f"Reconectando user data stream en {espera}s...")
+            await asyncio.sleep(espera)
+            espera = min(espera * 2, CONFIG_WEBSOCKET['backoff_maximo'])
+
+    async def renovar_periodicamente(self):
+        """La listenKey caduca a los 60 minutos sin keepalive"""
+        while True:
+            await asyncio.sleep(self.config['keepalive_segundos'])
+            try:
+                await self.api.renovar_listen_key_async(self.listen_key)
+            except Exception as e:
+                print(f"Error renovando listenKey: {e}")
+
+    def procesar_evento(self, data: Dict) -> Optional[str]:
+        """Actualizar el mapa de órdenes con un evento; devuelve el tipo de evento"""
+        evento = data.get('e')
+        if evento == 'ORDER_TRADE_UPDATE':
+            self.actualizar_orden(data['o'])
+        elif evento == 'ALGO_UPDATE':
+            self.actualizar_algo(data['o'])
+        elif evento in self.callbacks:
+            try:
+                self.callbacks[evento](data)
+            except Exception as e:
+                print(f"Error procesando evento {evento}: {e}")
+        return evento
+
+    def actualizar_orden(self, datos: Dict):
+        """Acumular una ejecución (parcial o total) de ORDER_TRADE_UPDATE"""
+        order_id = datos['i']
+        relleno = self.ordenes.get(order_id)
+        if relleno is None:
+            relleno = RellenoOrden(order_id, datos['c'], datos['s'])
+            self.ordenes[order_id] = relleno
+            self.por_cliente[relleno.client_order_id] = order_id
+            self.olvidar_antiguas()
+
+        relleno.estado = datos['X']
+        relleno.cantidad_ejecutada = float(datos['z'])
+        if float(datos['ap']):
+            relleno.precio_medio = float(datos['ap'])
+        if datos['x'] == 'TRADE':
+            # La comisión de cada ejecución llega por separado
+            relleno.comision += float(datos.get('n', 0))
+            relleno.comision_activo = datos.get('N') or relleno.comision_activo
+            relleno.pnl_realizado += float(datos.get('rp', 0))
+
+        if relleno.terminada:
+            espera = self.esperas.pop(order_id, None)
+            if espera is not None and not espera.done():
+                espera.set_result(relleno)
+            callback = self.vigilancias.pop(order_id, None)
+            if callback is not None:
+                try:
+                    callback(relleno)
+                except Exception as e:
+                    print(f"Error procesando el final de la orden {order_id}: {e}")
+
+    def actualizar_algo(self, datos: Dict):
+        """Un TP/SL condicional (algoId) que se dispara continúa como orden normal (orderId)"""
+        algo_id = datos['aid']
+        if algo_id not in self.vigilancias:
+            return
+        if datos['X'] in ('TRIGGERED', 'FINISHED') and datos.get('ai'):
+            self.vigilar_orden(int(datos['ai']), self.vigilancias.pop(algo_id))
+        elif datos['X'] in ('CANCELED', 'EXPIRED', 'REJECTED'):
+            self.vigilancias.pop(algo_id)
+
+    def vigilar_orden(self, order_id: int, callback: Callable[[RellenoOrden], None]):
+        """Llamar a callback(relleno) cuando la orden termine, aunque ya hubiera terminado"""
+        relleno = self.ordenes.get(order_id)
+        if relleno is not None and relleno.terminada:
+            callback(relleno)
+            return
+        self.vigilancias[order_id] = callback
+
+    def dejar_de_vigilar(self, order_id: int):
+        self.vigilancias.pop(order_id, None)
+
+    def olvidar_antiguas(self):
+        while len(self.ordenes) > self.config['max_ordenes_recordadas']:
+            _, relleno = self.ordenes.popitem(last=False)
+            self.por_cliente.pop(relleno.client_order_id, None)
+
+    def obtener(self, clave: Union[int, str]) -> Optional[RellenoOrden]:
+        """Relleno conocido de una orden por orderId o clientOrderId"""
+        if isinstance(clave, str):
+            clave = self.por_cliente.get(clave)
+        return self.ordenes.get(clave)
+
+    async def esperar_relleno(self, order_id: int, timeout: Optional[float] = None) -> Optional[RellenoOrden]:
+        """Esperar a que la orden termine; el evento puede haber llegado antes que la respuesta REST"""
+        relleno = self.ordenes.get(order_id)
+        if relleno is not None and relleno.terminada:
+            return relleno
+        if not self.conectado.is_set():
+            return relleno
+
+        espera = self.esperas.get(order_id)
+        if espera is None:
+            espera = asyncio.get_running_loop().create_future()
+            self.esperas[order_id] = espera
+        try:
+            return await asyncio.wait_for(asyncio.shield(espera),
+                                          timeout or self.config['timeout_relleno'])
+        except asyncio.TimeoutError:
+            self.esperas.pop(order_id, None)
+            # Puede haber ejecuciones parciales aunque la orden no haya terminado
+            return self.ordenes.get(order_id)
@@ -0,0 +1,112 @@
+from typing import Optional, Tuple
+
+NAN = float('nan')
+
+class EMAIncremental:
+    """Media móvil exponencial actualizada en O(1) con la misma semilla que TA-Lib"""
+
+    def __init__(self, periodo: int, descartar: int = 0):
+        self.periodo = periodo
+        self.k = 2.0 / (periodo + 1)
+        # Valores iniciales que TA-Lib ignora antes de tomar la semilla (caso MACD)
+        self.descartar = descartar
+        self.valor = NAN
+        self._vistos = 0
+        self._suma_semilla = 0.0
+
+    @property
+    def lista(self) -> bool:
+        return self._vistos >= self.descartar + self.periodo
+
+    def actualizar(self, precio: float) -> float:
+        """Incorporar un nuevo valor y devolver la EMA (NaN durante el calentamiento)"""
+        self._vistos += 1
+        if self._vistos <= self.descartar:
+            return NAN
+
+        if self._vistos < self.descartar + self.periodo:
+            self._suma_semilla += precio
+            return NAN
+
+        if self._vistos == self.descartar + self.periodo:
+            # Semilla: media simple de los primeros valores del periodo
+            self.valor = (self._suma_semilla + precio) / self.periodo
+        else:
+            self.valor = (precio - self.valor) * self.k + self.valor
+        return self.valor
+
+class MACDIncremental:
+    """MACD (línea, señal e histograma) actualizado en O(1), equivalente a talib.MACD"""
+
+    def __init__(self, fast: int, slow: int, signal: int):
+        # TA-Lib intercambia los periodos si vienen invertidos
+        if slow < fast:
+            fast, slow = slow, fast
+        self.fast = fast
+        self.slow = slow
+        self.signal = signal
+        # TA-Lib alinea ambas EMAs para que empiecen en la misma vela
+        self.ema_fast = EMAIncremental(fast, descartar=slow - fast)
+        self.ema_slow = EMAIncremental(slow)
+        self.ema_signal = EMAIncremental(signal)
+
+    def actualizar(self, close: float) -> Tuple[float, float, float]:
+        """Incorporar un cierre y devolver (macd, signal, histogram)"""
+        fast = self.ema_fast.actualizar(close)
+        slow = self.ema_slow.actualizar(close)
+        if not self.ema_slow.lista:
+            return NAN, NAN, NAN
+
+        macd = fast - slow
+        signal = self.ema_signal.actualizar(macd)
+        if not self.ema_signal.lista:
+            # TA-Lib no publica la línea MACD hasta que la señal está disponible
+            return NAN, NAN, NAN
+        return macd, signal, macd - signal
+
+class ATRIncremental:
+    """Average True Range con suavizado de Wilder actualizado en O(1), equivalente a talib.ATR"""
+
+    def __init__(self, periodo: int):
+        self.periodo = periodo
+        self.valor = NAN
+        self._close_anterior: Optional[float] = None
+        self._rangos = 0
+        self._suma_semilla = 0.0
+
+    def actualizar(self, high: float, low: float, close: float) -> float:
+        """Incorporar una vela y devolver el ATR (NaN durante el calentamiento)"""
+        close_anterior = self._close_anterior
+        self._close_anterior = close
+        if close_anterior is None:
+            # La primera vela no tiene true range
+            return NAN
+
+        rango = max(high - low, abs(high - close_anterior), abs(low - close_anterior))
+        self._rangos += 1
+
+        if self.periodo <= 1:
+            self.valor = rango
+        elif self._rangos < self.periodo:
+            self._suma_semilla += rango
+            return NAN
+        elif self._rangos == self.periodo:
+            self.valor = (self._suma_semilla + rango) / self.periodo
+        else:
+            self.valor = (self.valor * (self.periodo - 1) + rango) / self.periodo
+        return self.valor
+
+class MotorIndicadores:
+    """Estado incremental de MACD y ATR para un timeframe"""
+
+    def __init__(self, config: dict):
+        self.macd = MACDIncremental(config['macd_fast'], config['macd_slow'], config['macd_signal'])
+        self.atr = ATRIncremental(config['atr_periodo'])
+        self.velas = 0
+
+    def actualizar(self, high: float, low: float, close: float) -> Tuple[float, float, float, float]:
+        """Actualizar con una vela cerrada y devolver (macd, signal, histogram, atr)"""
+        self.velas += 1
+        macd, signal, hist = self.macd.actualizar(close)
+        atr = self.atr.actualizar(high, low, close)
+        return macd, signal, hist, atr
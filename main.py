@@ -1,18 +1,33 @@
-from flask import Flask, jsonify, render_template_string
-import threading
-import time
 import asyncio
+import time
+from string import Template
+from aiohttp import web
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
 from api_connection import APIConnection
-from estrategia import EstrategiaMACD
+from estrategia import EstrategiaMACD, intervalo_ms
 from ejecucion import GestorOperaciones
-from config import CONFIG_TRADING
-
-app = Flask(__name__)
+from precarga import PrecargaHistorica
+from pipeline import PipelineEventos
+from flujo_usuario import FlujoUsuario
+from registro_mercado import GrabadorMercado
+from decodificacion import VelaKline
+from exchange_simulado import ExchangeSimulado
+from estado_cuenta import EstadoCuenta
+from bus_eventos import BusEventos, frame_sse
+from diario_operaciones import DiarioOperaciones
+from estadisticas_operaciones import EstadisticasOperaciones
+from config import CONFIG_TRADING, CONFIG_REGISTRO, CONFIG_OPERACIONES, CONFIG_EVENTOS, ARCHIVO_DIARIO
 
-# Estado global del bot
+# Estado global del bot (solo se toca desde el bucle de eventos, no necesita locks)
 bot_state = {
     'running': False,
     'bot_instance': None,
+    'tarea': None,
+    'api': None,
+    'cuenta': None,
+    'eventos': BusEventos(),  # Panel en vivo: sobrevive a los reinicios del bot
+    'tarea_estado': None,
     'last_error': None,
     'start_time': None
 }
@@ -93,6 +108,18 @@ HTML_TEMPLATE = """
             color: #6c757d; 
             margin: 10px 0; 
         }
+        .live { 
+            display: flex; 
+            flex-wrap: wrap; 
+            justify-content: space-around; 
+            margin-bottom: 10px; 
+        }
+        #eventosLista { 
+            font-family: monospace; 
+            font-size: 13px; 
+            max-height: 200px; 
+            overflow-y: auto; 
+        }
     </style>
 </head>
 <body>
@@ -100,7 +127,14 @@ HTML_TEMPLATE = """
         <h1>🤖 Bot de Trading Binance</h1>
         
         <div class="status" id="statusBox">
-            {% if bot_running %}✅ Bot funcionando{% else %}❌ Bot detenido{% endif %}
+            $estado_bot
+        </div>
+
+        <div class="live" id="liveBox">
+            <span>💵 USDT: <b id="liveBalance">-</b></span>
+            <span>📂 Abiertas: <b id="liveAbiertas">-</b></span>
+            <span>📕 Cerradas: <b id="liveCerradas">-</b></span>
+            <span>📈 PnL neto: <b id="livePnl">-</b></span>
         </div>
 
         <div class="btn-container">
@@ -114,6 +148,11 @@ HTML_TEMPLATE = """
         <div id="result"></div>
         <div id="loading" class="loading" style="display: none;">Cargando...</div>
 
+        <div class="info-box">
+            <h3>⚡ En vivo:</h3>
+            <div id="eventosLista">Esperando eventos...</div>
+        </div>
+
         <div class="info-box">
             <h3>📋 Endpoints API:</h3>
             <ul>
@@ -122,7 +161,9 @@ HTML_TEMPLATE = """
                 <li><code>GET /start</code> - Iniciar bot</li>
                 <li><code>GET /stop</code> - Detener bot</li>
                 <li><code>GET /balance</code> - Balance de cuenta</li>
-                <li><code>GET /operaciones</code> - Operaciones</li>
+                <li><code>GET /operaciones?limite=&amp;antes=&amp;desde=</code> - Operaciones (paginadas por cursor)</li>
+                <li><code>GET /operaciones/resumen</code> - PnL, tasa de acierto y drawdown</li>
+                <li><code>GET /eventos</code> - Estado, señales y operaciones en vivo (Server-Sent Events)</li>
             </ul>
         </div>
     </div>
@@ -185,19 +226,64 @@ HTML_TEMPLATE = """
                 });
         }
 
+        function pintarEstado(data) {
+            const statusBox = document.getElementById('statusBox');
+            if (data.bot_running) {
+                statusBox.innerHTML = '✅ Bot funcionando';
+                statusBox.className = 'status online';
+            } else {
+                statusBox.innerHTML = '❌ Bot detenido';
+                statusBox.className = 'status offline';
+            }
+            if ('usdt_balance' in data) {
+                document.getElementById('liveBalance').textContent = data.usdt_balance.toFixed(2);
+            }
+            if ('operaciones_activas' in data) {
+                document.getElementById('liveAbiertas').textContent = data.operaciones_activas;
+            }
+            if (data.resumen) {
+                document.getElementById('liveCerradas').textContent = data.resumen.operaciones;
+                document.getElementById('livePnl').textContent = data.resumen.pnl_neto.toFixed(2);
+            }
+        }
+
         function updateStatus() {
             fetch('/status')
                 .then(response => response.json())
-                .then(data => {
-                    const statusBox = document.getElementById('statusBox');
-                    if (data.bot_running) {
-                        statusBox.innerHTML = '✅ Bot funcionando';
-                        statusBox.className = 'status online';
-                    } else {
-                        statusBox.innerHTML = '❌ Bot detenido';
-                        statusBox.className = 'status offline';
-                    }
-                });
+                .then(pintarEstado);
+        }
+
+        function agregarEvento(texto) {
+            const lista = document.getElementById('eventosLista');
+            if (!lista.dataset.iniciada) {
+                lista.innerHTML = '';
+                lista.dataset.iniciada = '1';
+            }
+            const linea = document.createElement('div');
+            linea.textContent = new Date().toLocaleTimeString() + ' ' + texto;
+            lista.prepend(linea);
+            while (lista.children.length > 50) {
+                lista.removeChild(lista.lastChild);
+            }
+        }
+
+        function conectarEventos() {
+            // El servidor empuja los cambios: sin sondeo y sin consultas a Binance por cada navegador
+            const eventos = new EventSource('/eventos');
+            eventos.addEventListener('estado', e => pintarEstado(JSON.parse(e.data)));
+            eventos.addEventListener('senal', e => {
+                const s = JSON.parse(e.data);
+                agregarEvento('📡 Señal ' + s.tipo + ' en ' + s.activo + ' a ' + s.precio);
+            });
+            eventos.addEventListener('apertura', e => {
+                const op = JSON.parse(e.data);
+                agregarEvento('🟢 Abierta ' + op.direccion + ' ' + op.activo + ' a ' + op.precio_entrada);
+            });
+            eventos.addEventListener('cierre', e => {
+                const op = JSON.parse(e.data);
+                agregarEvento('🔴 Cerrada ' + op.direccion + ' ' + op.activo + ' (' + op.razon_cierre +
+                              '), PnL ' + op.pnl.toFixed(2));
+            });
         }
 
         function showResult(content) {
@@ -210,169 +296,355 @@ HTML_TEMPLATE = """
             document.getElementById('loading').style.display = show ? 'block' : 'none';
         }
 
-        // Actualizar estado cada 10 segundos
-        setInterval(updateStatus, 10000);
+        if (window.EventSource) {
+            conectarEventos();
+        } else {
+            // Navegadores sin EventSource: sondeo como antes
+            setInterval(updateStatus, 10000);
+        }
     </script>
 </body>
 </html>
 """
 
 class TradingBot:
-    def __init__(self):
-        self.api = APIConnection()
-        self.estrategia = EstrategiaMACD()
-        self.gestor = GestorOperaciones(self.api, self.estrategia)
+    def __init__(self, api: Optional[APIConnection] = None, reloj: Callable[[], float] = time.time,
+                 grabar: bool = CONFIG_REGISTRO['habilitado'], diario: Optional[DiarioOperaciones] = None,
+                 eventos: Optional[BusEventos] = None):
         self.config = CONFIG_TRADING
-        self.ultimo_tiempo_macd = 0
+        if api is None and self.config['modo_papel']:
+            # Órdenes contra el exchange simulado y datos de mercado de la conexión real
+            api = ExchangeSimulado(self.config['balance_papel'], api_mercado=APIConnection())
+        self.api = api or APIConnection()
+        self.papel = isinstance(self.api, ExchangeSimulado)
+        # Reloj inyectable (segundos): el replay lo sustituye por uno virtual
+        self.reloj = reloj
+        self.activos = self.config.get('activos') or [self.config['activo']]
+        
+        # Ejecuciones reales de las órdenes, compartidas por todos los gestores
+        self.flujo_usuario = FlujoUsuario(self.api)
+        if self.papel:
+            # El exchange simulado entrega los ORDER_TRADE_UPDATE sin listenKey ni WebSocket
+            self.api.suscribir(self.flujo_usuario.procesar_evento)
+            self.flujo_usuario.conectado.set()
+        # Saldos y posiciones en memoria para los endpoints, al día con los ACCOUNT_UPDATE
+        self.estado_cuenta = EstadoCuenta(self.api, self.flujo_usuario)
+        
+        # Un único diario (y un único hilo escritor) para las operaciones de todos los símbolos
+        self.diario = diario or DiarioOperaciones(ARCHIVO_DIARIO)
+        # Agregados de todas las operaciones cerradas: una consulta de agregados y solo la ventana reciente en memoria
+        self.estadisticas = EstadisticasOperaciones()
+        self.estadisticas.sembrar(
+            self.diario.agregados_cerradas(),
+            reversed(self.diario.cerradas(limite=self.estadisticas.recientes.maxlen))
+        )
+        # Señales y operaciones hacia el panel en vivo
+        self.eventos = eventos or BusEventos()
+        
+        # Una estrategia y un gestor por símbolo, compartiendo la misma conexión
+        self.estrategias: Dict[str, EstrategiaMACD] = {}
+        self.gestores: Dict[str, GestorOperaciones] = {}
+        for activo in self.activos:
+            self.estrategias[activo] = EstrategiaMACD(remuestrear=self.config['remuestrear_macd'])
+            self.gestores[activo] = GestorOperaciones(
+                self.api, self.estrategias[activo], activo, self.flujo_usuario, reloj, self.diario,
+                self.estadisticas, self.eventos
+            )
+        
         self.running = False
+        self.tarea = None
+        # Recepción, estrategia y ejecución desacopladas: el WebSocket solo decodifica y encola
+        grabador = GrabadorMercado() if grabar else None
+        self.pipeline = PipelineEventos(self.api.callbacks, grabador=grabador)
+        self.api.pipeline = self.pipeline
+        self.aperturas_pendientes = 0
+        # Stream -> (activo, temporalidad), para saber qué rellenar tras una reconexión
+        self.streams: Dict[str, Tuple[str, str]] = {}
+        # Stream de precio -> activo, para vigilar TP/SL en cada tick
+        self.streams_precio: Dict[str, str] = {}
         
     async def run(self):
         """Ejecutar el bot de trading"""
-        print("Inicializando bot de trading...")
-        
-        # Configurar cuenta
-        self.gestor.configurar_cuenta()
-        
-        # Suscribir a streams de WebSocket
-        symbol_lower = self.config['activo'].lower()
-        streams = [
-            f"{symbol_lower}@kline_{self.config['temporalidad_operaciones']}",
-            f"{symbol_lower}@kline_{self.config['temporalidad_macd']}"
-        ]
+        print(f"Inicializando bot de trading para {len(self.activos)} activos...")
+        self.tarea = asyncio.current_task()
         
-        # Registrar callbacks
-        self.api.register_callback(f"{symbol_lower}@kline_{self.config['temporalidad_operaciones']}", self.procesar_kline_1m)
-        self.api.register_callback(f"{symbol_lower}@kline_{self.config['temporalidad_macd']}", self.procesar_kline_macd)
+        try:
+            await self.inicializar()
+            
+            print("Bot inicializado y escuchando mercados...")
+            self.running = True
+            self.pipeline.iniciar()
+            # Se ejecuta hasta que stop() cancela la tarea
+            tareas = [self.api.conectar_streams(list(self.streams) + list(self.streams_precio))]
+            if not self.papel:
+                tareas.append(self.flujo_usuario.ejecutar())
+            await asyncio.gather(*tareas)
+        finally:
+            # Al cancelar, connect_websocket cierra sus conexiones en su finally
+            self.running = False
+            await self.pipeline.detener()
+            await self.api.cerrar_async_client()
+            self.api.simbolos.detener_refresco()
+            # Escribir las operaciones que queden en cola antes de soltar el diario
+            await asyncio.to_thread(self.diario.cerrar)
+            print("Bot detenido")
+    
+    async def inicializar(self):
+        """Configurar la cuenta, precargar historial y registrar los streams"""
+        # Configurar cuenta (llamadas REST síncronas que solo se hacen al arrancar)
+        for gestor in self.gestores.values():
+            await asyncio.to_thread(gestor.configurar_cuenta)
         
-        # Iniciar conexión WebSocket en un hilo separado
-        websocket_thread = threading.Thread(target=self.run_websocket, args=(streams,))
-        websocket_thread.daemon = True
-        websocket_thread.start()
+        # Arranque en caliente: sembrar velas e indicadores antes de conectar el WebSocket.
+        # El hueco hasta la conexión lo cubre rellenar_huecos y los duplicados se descartan
+        await PrecargaHistorica(self.api).precargar(self.estrategias)
         
-        print("Bot inicializado y escuchando mercados...")
-        self.running = True
+        # Suscribir a streams de WebSocket y registrar callbacks
+        # (la tabla de callbacks resuelve cada stream a su símbolo en O(1))
+        for activo in self.activos:
+            symbol_lower = activo.lower()
+            stream_operaciones = f"{symbol_lower}@kline_{self.config['temporalidad_operaciones']}"
+            self.api.register_callback(stream_operaciones, partial(self.procesar_kline_1m, activo))
+            self.streams[stream_operaciones] = (activo, self.config['temporalidad_operaciones'])
+            if not self.config['remuestrear_macd']:
+                stream_macd = f"{symbol_lower}@kline_{self.config['temporalidad_macd']}"
+                self.api.register_callback(stream_macd, partial(self.procesar_kline_macd, activo))
+                self.streams[stream_macd] = (activo, self.config['temporalidad_macd'])
+            
+            stream_precio = f"{symbol_lower}@{self.config['stream_precio']}"
+            self.api.register_callback(stream_precio, partial(self.procesar_precio, activo))
+            self.streams_precio[stream_precio] = activo
         
-        # Mantener el bot ejecutándose
-        while self.running:
-            await asyncio.sleep(1)
+        # Tras cada (re)conexión se recuperan por REST las velas que no llegaron
+        self.api.register_reconnect_callback(self.rellenar_huecos)
+    
+    async def rellenar_huecos(self, streams: List[str]):
+        """Recuperar por REST las velas cerradas que se perdieron mientras el WebSocket estaba caído"""
+        for stream in streams:
+            if stream not in self.streams:
+                continue
+            activo, temporalidad = self.streams[stream]
+            estrategia = self.estrategias[activo]
+            operaciones = temporalidad == self.config['temporalidad_operaciones']
+            buffer = estrategia.buffer_1m if operaciones else estrategia.buffer_macd
+            if buffer.ultimo_timestamp is None:
+                continue  # Sin historial previo no hay hueco que rellenar
+            
+            klines = await self.api.get_klines_async(
+                activo, temporalidad, start_time=buffer.ultimo_timestamp + intervalo_ms(temporalidad)
+            )
+            ahora = int(self.reloj() * 1000)
+            recuperadas = 0
+            senales = []
+            for kline in klines:
+                if kline[6] >= ahora:
+                    break  # Vela aún abierta: llegará cerrada por el WebSocket
+                if estrategia.agregar_dato_ohlcv(
+                    kline[0], float(kline[1]), float(kline[2]), float(kline[3]),
+                    float(kline[4]), float(kline[5]), temporalidad
+                ):
+                    recuperadas += 1
+                    if operaciones:
+                        senales.append(estrategia.generar_senal())
+            if recuperadas:
+                print(f"Recuperadas {recuperadas} velas de {activo} {temporalidad} tras la reconexión")
+                # Las señales de velas anteriores a la última ya no son actuales: se avisa pero no se operan
+                for senal in senales[:-1]:
+                    if senal:
+                        print(f"⚠️  Señal {senal.tipo} de {activo} ({senal.timestamp}) durante la desconexión: no se opera")
+                # La última vela recuperada pasa por la estrategia igual que si hubiera llegado en vivo
+                self.evaluar_senal(activo)
     
-    def run_websocket(self, streams):
-        """Ejecutar WebSocket en un hilo separado"""
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(self.api.connect_websocket(streams))
+    def total_operaciones_activas(self) -> int:
+        return sum(len(gestor.operaciones_activas) for gestor in self.gestores.values())
     
-    def procesar_kline_1m(self, data):
+    def lanzar_tarea(self, coroutine):
+        """Pasar una corrutina de órdenes a la etapa de ejecución sin frenar la estrategia"""
+        self.pipeline.encolar_orden(coroutine)
+    
+    async def abrir_operacion(self, gestor: GestorOperaciones, senal):
+        try:
+            await gestor.abrir_operacion(senal)
+        finally:
+            self.aperturas_pendientes -= 1
+    
+    def procesar_kline_1m(self, activo: str, vela: VelaKline):
         """Procesar datos de kline de 1 minuto"""
-        if data['e'] != 'kline':
+        if not vela.cerrada:  # Si la vela no está cerrada, ignorar
             return
-            
-        kline = data['k']
-        if not kline['x']:  # Si la vela no está cerrada, ignorar
-            return
-            
-        timestamp = kline['t']
-        open_price = float(kline['o'])
-        high_price = float(kline['h'])
-        low_price = float(kline['l'])
-        close_price = float(kline['c'])
-        volume = float(kline['v'])
         
-        # Agregar datos a la estrategia
-        self.estrategia.agregar_dato_ohlcv(
-            timestamp, open_price, high_price, low_price, close_price, volume,
+        estrategia = self.estrategias[activo]
+        
+        # Agregar datos a la estrategia (las velas repetidas tras una reconexión se ignoran)
+        if not estrategia.agregar_dato_ohlcv(
+            vela.timestamp, vela.open, vela.high, vela.low, vela.close, vela.volume,
             self.config['temporalidad_operaciones']
-        )
+        ):
+            return
         
-        # Verificar cierre de operaciones con el precio actual
-        self.gestor.verificar_cierre_operaciones(close_price)
-        
-        # Generar y ejecutar señales (solo cada cierto tiempo para MACD)
-        current_time = time.time()
-        if current_time - self.ultimo_tiempo_macd >= 60:  # Cada minuto verificar MACD
-            senal = self.estrategia.generar_senal()
-            if senal:
-                print(f"Señal generada: {senal.tipo} a {senal.precio}")
-                self.gestor.abrir_operacion(senal)
-            self.ultimo_tiempo_macd = current_time
+        # generar_senal es O(1): se evalúa en cada vela cerrada, que llega una sola vez
+        self.evaluar_senal(activo)
     
-    def procesar_kline_macd(self, data):
-        """Procesar datos de kline para el timeframe del MACD"""
-        if data['e'] != 'kline':
+    def evaluar_senal(self, activo: str):
+        """Generar la señal del activo con los datos actuales y lanzar la apertura si procede"""
+        senal = self.estrategias[activo].generar_senal()
+        if senal:
+            print(f"Señal generada en {activo}: {senal.tipo} a {senal.precio}")
+            self.eventos.publicar('senal', {'activo': activo, 'tipo': senal.tipo, 'precio': senal.precio,
+                                            'timestamp': senal.timestamp})
+            # Las aperturas aún en vuelo también cuentan para el límite global
+            if self.total_operaciones_activas() + self.aperturas_pendientes >= self.config['max_operaciones_simultaneas']:
+                print("Máximo de operaciones simultáneas alcanzado")
+            else:
+                self.aperturas_pendientes += 1
+                self.lanzar_tarea(self.abrir_operacion(self.gestores[activo], senal))
+    
+    def procesar_precio(self, activo: str, data):
+        """Comprobar los TP/SL de un activo con cada tick de markPrice o bookTicker"""
+        if data['e'] == 'markPriceUpdate':
+            precio = float(data['p'])
+        elif data['e'] == 'bookTicker':
+            precio = (float(data['b']) + float(data['a'])) / 2
+        else:
             return
-            
-        kline = data['k']
-        if not kline['x']:  # Si la vela no está cerrada, ignorar
+        
+        if self.papel:
+            # Primero el exchange simulado: sus TP/SL se ejecutan antes que la vigilancia local
+            self.api.actualizar_precio(activo, precio)
+        
+        # La comprobación es síncrona y O(1) si no hay disparo; solo se encola trabajo si hay cierres
+        disparadas = self.gestores[activo].operaciones_disparadas(precio)
+        if disparadas:
+            self.lanzar_tarea(self.gestores[activo].cerrar_operaciones(disparadas, precio))
+    
+    def procesar_kline_macd(self, activo: str, vela: VelaKline):
+        """Procesar datos de kline para el timeframe del MACD"""
+        if not vela.cerrada:  # Si la vela no está cerrada, ignorar
             return
-            
-        timestamp = kline['t']
-        open_price = float(kline['o'])
-        high_price = float(kline['h'])
-        low_price = float(kline['l'])
-        close_price = float(kline['c'])
-        volume = float(kline['v'])
         
         # Agregar datos a la estrategia
-        self.estrategia.agregar_dato_ohlcv(
-            timestamp, open_price, high_price, low_price, close_price, volume,
+        estrategia = self.estrategias[activo]
+        if not estrategia.agregar_dato_ohlcv(
+            vela.timestamp, vela.open, vela.high, vela.low, vela.close, vela.volume,
             self.config['temporalidad_macd']
-        )
+        ):
+            return
+        
+        # Si la vela de 1m que cierra a la vez llegó antes, el MACD vigente en ese instante acaba de cambiar
+        ultimo_1m = estrategia.buffer_1m.ultimo_timestamp
+        if ultimo_1m is not None and ultimo_1m + estrategia.duracion_1m >= vela.timestamp + estrategia.duracion_macd:
+            self.evaluar_senal(activo)
     
     def stop(self):
-        """Detener el bot"""
-        self.running = False
-        print("Bot detenido")
+        """Detener el bot cancelando su tarea (cierra el WebSocket y las etapas del pipeline)"""
+        if self.tarea is not None and not self.tarea.done():
+            self.tarea.cancel()
+    
+    def operaciones_activas(self) -> List[Dict]:
+        return [op for gestor in self.gestores.values() for op in gestor.operaciones_activas]
+    
+    async def operaciones_cerradas(self, desde: Optional[int] = None, antes: Optional[int] = None,
+                                   limite: int = CONFIG_OPERACIONES['limite_pagina']) -> List[Dict]:
+        """Página de cerradas por secuencia: de la ventana en memoria o, si es más antigua, del diario"""
+        pagina = self.estadisticas.pagina(desde, antes, limite)
+        if pagina is None:
+            pagina = await asyncio.to_thread(self.diario.cerradas, desde, antes, limite)
+        return pagina
     
     def get_status(self):
         """Obtener estado del bot"""
         return {
             'running': self.running,
-            'operaciones_activas': len(self.gestor.operaciones_activas),
-            'operaciones_cerradas': len(self.gestor.operaciones_cerradas)
+            'activos': self.activos,
+            'operaciones_activas': self.total_operaciones_activas(),
+            'operaciones_cerradas': self.estadisticas.operaciones,
+            'latencia_proteccion': {activo: gestor.estadisticas_latencia() for activo, gestor in self.gestores.items()},
+            'pipeline': self.pipeline.estadisticas()
         }
 
-def run_bot():
-    """Función para ejecutar el bot en un hilo separado"""
+async def run_bot(bot: TradingBot):
+    """Tarea del bot dentro del bucle de eventos del servidor"""
     try:
-        bot = TradingBot()
-        bot_state['bot_instance'] = bot
-        bot_state['last_error'] = None
-        
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(bot.run())
-        
+        await bot.run()
+    except asyncio.CancelledError:
+        pass
     except Exception as e:
         bot_state['last_error'] = str(e)
         print(f"Error en el bot: {e}")
+    finally:
+        bot_state['running'] = False
+
+async def obtener_api() -> APIConnection:
+    """Conexión del bot si está en marcha; si no, una compartida por los endpoints"""
+    if bot_state['bot_instance']:
+        return bot_state['bot_instance'].api
+    if bot_state['api'] is None:
+        # El cliente síncrono hace un ping al crearse: fuera del bucle de eventos
+        bot_state['api'] = await asyncio.to_thread(APIConnection)
+    return bot_state['api']
+
+async def obtener_estado_cuenta() -> EstadoCuenta:
+    """Estado de cuenta del bot o, si no existe, uno compartido: el REST no depende de cuántos miren"""
+    if bot_state['bot_instance']:
+        return bot_state['bot_instance'].estado_cuenta
+    if bot_state['cuenta'] is None:
+        bot_state['cuenta'] = EstadoCuenta(await obtener_api())
+    return bot_state['cuenta']
+
+async def estado_panel() -> Dict:
+    """Estado compacto del panel, construido desde memoria (el mismo para todos los navegadores)"""
+    cuenta = await obtener_estado_cuenta()
+    resumen_cuenta = await cuenta.obtener()
+    bot = bot_state['bot_instance']
+    return {
+        'bot_running': bot_state['running'],
+        'binance_connected': resumen_cuenta['conectado'],
+        'usdt_balance': cuenta.disponible('USDT'),
+        'pnl_no_realizado': sum(posicion['unrealizedProfit'] for posicion in resumen_cuenta['posiciones'].values()),
+        'operaciones_activas': bot.total_operaciones_activas() if bot else 0,
+        'resumen': bot.estadisticas.resumen() if bot else None,
+        'start_time': bot_state['start_time'],
+        'last_error': bot_state['last_error']
+    }
+
+async def emitir_estado():
+    """Una única tarea publica el estado cuando cambia, haya uno o mil navegadores conectados"""
+    bus = bot_state['eventos']
+    ultimo = None
+    while True:
+        await asyncio.sleep(CONFIG_EVENTOS['intervalo_estado'])
+        if not bus.suscriptores:
+            ultimo = None
+            continue
+        try:
+            estado = await estado_panel()
+        except Exception as e:
+            print(f"Error obteniendo el estado del panel: {e}")
+            continue
+        if estado != ultimo:
+            bus.publicar('estado', estado)
+            ultimo = estado
 
 # Endpoints de la API
-@app.route('/')
-def home():
+async def home(request):
     """Página principal con interfaz web"""
-    return render_template_string(HTML_TEMPLATE, bot_running=bot_state['running'])
+    estado = '✅ Bot funcionando' if bot_state['running'] else '❌ Bot detenido'
+    html = Template(HTML_TEMPLATE).safe_substitute(estado_bot=estado)
+    return web.Response(text=html, content_type='text/html')
 
-@app.route('/status')
-def status():
+async def status(request):
     """Endpoint de estado del bot"""
     try:
-        # Verificar conexión a Binance
-        api = APIConnection()
-        balance_info = api.get_account_info()
-        
-        # Obtener balance de USDT
-        usdt_balance = 0
-        if balance_info:
-            for asset in balance_info['assets']:
-                if asset['asset'] == 'USDT':
-                    usdt_balance = float(asset['availableBalance'])
-                    break
+        # Saldo desde memoria (se refresca en segundo plano si está caducado)
+        cuenta = await obtener_estado_cuenta()
+        resumen = await cuenta.obtener()
         
         status_info = {
             'status': 'online',
             'bot_running': bot_state['running'],
-            'binance_connected': balance_info is not None,
-            'usdt_balance': usdt_balance,
+            'binance_connected': resumen['conectado'],
+            'usdt_balance': cuenta.disponible('USDT'),
+            'cuenta_antiguedad_s': resumen['antiguedad_s'],
             'operaciones_activas': 0,
             'operaciones_cerradas': 0,
             'uptime': None,
@@ -388,107 +660,208 @@ def status():
         if bot_state['start_time']:
             status_info['uptime'] = time.time() - bot_state['start_time']
         
-        return jsonify(status_info)
+        return web.json_response(status_info)
         
     except Exception as e:
-        return jsonify({
+        return web.json_response({
             'status': 'error',
             'message': str(e)
-        }), 500
+        }, status=500)
 
-@app.route('/start')
-def start_bot():
+async def start_bot(request):
     """Iniciar el bot"""
     if bot_state['running']:
-        return jsonify({'status': 'already_running', 'message': 'El bot ya está en ejecución'})
+        return web.json_response({'status': 'already_running', 'message': 'El bot ya está en ejecución'})
     
     try:
-        # Iniciar el bot en un hilo separado
-        bot_thread = threading.Thread(target=run_bot)
-        bot_thread.daemon = True
-        bot_thread.start()
+        # Mismo bucle de eventos que el servidor: sin hilos ni bucles adicionales
+        bot = await asyncio.to_thread(partial(TradingBot, eventos=bot_state['eventos']))
+        bot_state['bot_instance'] = bot
+        bot_state['tarea'] = asyncio.create_task(run_bot(bot))
         
         bot_state['running'] = True
         bot_state['start_time'] = time.time()
         bot_state['last_error'] = None
         
-        return jsonify({'status': 'started', 'message': 'Bot iniciado correctamente'})
+        return web.json_response({'status': 'started', 'message': 'Bot iniciado correctamente'})
         
     except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 500
+        return web.json_response({'status': 'error', 'message': str(e)}, status=500)
 
-@app.route('/stop')
-def stop_bot():
+async def stop_bot(request):
     """Detener el bot"""
     if not bot_state['running'] or not bot_state['bot_instance']:
-        return jsonify({'status': 'not_running', 'message': 'El bot no está en ejecución'})
+        return web.json_response({'status': 'not_running', 'message': 'El bot no está en ejecución'})
     
     try:
         bot_state['bot_instance'].stop()
+        # Esperar a que la cancelación cierre el WebSocket antes de responder
+        await asyncio.wait([bot_state['tarea']], timeout=5)
         bot_state['running'] = False
-        return jsonify({'status': 'stopped', 'message': 'Bot detenido correctamente'})
+        return web.json_response({'status': 'stopped', 'message': 'Bot detenido correctamente'})
         
     except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 500
+        return web.json_response({'status': 'error', 'message': str(e)}, status=500)
 
-@app.route('/balance')
-def get_balance():
+async def get_balance(request):
     """Obtener balance de la cuenta"""
     try:
-        api = APIConnection()
-        balance_info = api.get_account_info()
+        cuenta = await obtener_estado_cuenta()
+        resumen = await cuenta.obtener()
         
-        if not balance_info:
-            return jsonify({'status': 'error', 'message': 'No se pudo obtener información de la cuenta'}), 500
+        if resumen['origen'] is None:
+            return web.json_response({'status': 'error', 'message': 'No se pudo obtener información de la cuenta'}, status=500)
         
         # Filtrar solo los balances relevantes
         balances = []
-        for asset in balance_info['assets']:
-            if float(asset['walletBalance']) > 0:
+        for asset, saldos in resumen['activos'].items():
+            if saldos['walletBalance'] > 0:
                 balances.append({
-                    'asset': asset['asset'],
-                    'balance': float(asset['walletBalance']),
-                    'available': float(asset['availableBalance'])
+                    'asset': asset,
+                    'balance': saldos['walletBalance'],
+                    'available': saldos['availableBalance']
                 })
         
-        return jsonify({
+        return web.json_response({
             'status': 'success',
-            'balances': balances
+            'balances': balances,
+            'antiguedad_s': resumen['antiguedad_s']
         })
         
     except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 500
+        return web.json_response({'status': 'error', 'message': str(e)}, status=500)
+
+def parametro_entero(request, nombre: str) -> Optional[int]:
+    valor = request.query.get(nombre)
+    return None if valor in (None, '') else int(valor)
 
-@app.route('/operaciones')
-def get_operaciones():
-    """Obtener información de las operaciones"""
+async def get_operaciones(request):
+    """Obtener las operaciones activas y una página de cerradas
+
+    ?desde=<cursor>: cerradas después del cursor (consulta incremental, de antigua a reciente).
+    ?antes=<cursor>: cerradas anteriores al cursor (páginas hacia atrás, de reciente a antigua).
+    """
     try:
-        if not bot_state['bot_instance']:
-            return jsonify({'status': 'error', 'message': 'Bot no inicializado'}), 400
+        bot = bot_state['bot_instance']
+        if not bot:
+            return web.json_response({'status': 'error', 'message': 'Bot no inicializado'}, status=400)
+        
+        try:
+            desde = parametro_entero(request, 'desde')
+            antes = parametro_entero(request, 'antes')
+            limite = parametro_entero(request, 'limite') or CONFIG_OPERACIONES['limite_pagina']
+        except ValueError:
+            return web.json_response({'status': 'error', 'message': 'desde, antes y limite deben ser enteros'},
+                                     status=400)
+        limite = max(1, min(limite, CONFIG_OPERACIONES['limite_maximo']))
+        
+        cerradas = await bot.operaciones_cerradas(desde, antes, limite)
+        if desde is not None:
+            # Siguiente consulta incremental: ?desde=cursor
+            cursor = cerradas[-1]['secuencia'] if cerradas else desde
+            siguiente = None
+        else:
+            cursor = bot.estadisticas.secuencia
+            # Página anterior: ?antes=siguiente
+            siguiente = cerradas[-1]['secuencia'] if len(cerradas) == limite and cerradas[-1]['secuencia'] > 1 else None
         
         operaciones = {
-            'activas': bot_state['bot_instance'].gestor.operaciones_activas,
-            'cerradas': bot_state['bot_instance'].gestor.operaciones_cerradas
+            'activas': bot.operaciones_activas(),
+            'cerradas': cerradas
         }
         
-        return jsonify({
+        return web.json_response({
             'status': 'success',
-            'operaciones': operaciones
+            'operaciones': operaciones,
+            'cursor': cursor,
+            'siguiente': siguiente
         })
         
     except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 500
+        return web.json_response({'status': 'error', 'message': str(e)}, status=500)
+
+async def get_resumen_operaciones(request):
+    """Agregados de las operaciones cerradas (mantenidos en cada cierre, sin recorrerlas)"""
+    try:
+        if not bot_state['bot_instance']:
+            return web.json_response({'status': 'error', 'message': 'Bot no inicializado'}, status=400)
+        
+        return web.json_response({
+            'status': 'success',
+            'resumen': bot_state['bot_instance'].estadisticas.resumen()
+        })
+        
+    except Exception as e:
+        return web.json_response({'status': 'error', 'message': str(e)}, status=500)
+
+async def eventos(request):
+    """Canal Server-Sent Events: estado, señales, aperturas y cierres"""
+    respuesta = web.StreamResponse(headers={
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Sin buffer en proxies tipo nginx
+    })
+    await respuesta.prepare(request)
+    bus = bot_state['eventos']
+    cola = bus.suscribir()
+    try:
+        # Estado completo al conectar; después solo los cambios
+        await respuesta.write(b"retry: 2000\n\n" + frame_sse('estado', await estado_panel()))
+        while True:
+            try:
+                frame = await asyncio.wait_for(cola.get(), CONFIG_EVENTOS['keepalive_segundos'])
+            except asyncio.TimeoutError:
+                frame = b": keepalive\n\n"
+            if frame is None:
+                break
+            await respuesta.write(frame)
+    except ConnectionResetError:
+        pass  # El navegador cerró la pestaña
+    finally:
+        bus.desuscribir(cola)
+    return respuesta
+
+async def al_iniciar(app):
+    bot_state['tarea_estado'] = asyncio.create_task(emitir_estado())
+
+async def al_apagar(app):
+    """Detener el bot y cerrar sesiones HTTP al apagar el servidor"""
+    # Terminar los streams de eventos para que el apagado no espere por ellos
+    bot_state['eventos'].cerrar()
+    if bot_state['tarea_estado'] is not None:
+        bot_state['tarea_estado'].cancel()
+    if bot_state['bot_instance']:
+        bot_state['bot_instance'].stop()
+        await asyncio.wait([bot_state['tarea']], timeout=5)
+    if bot_state['api'] is not None:
+        await bot_state['api'].cerrar_async_client()
+
+def crear_app() -> web.Application:
+    app = web.Application()
+    app.router.add_get('/', home)
+    app.router.add_get('/status', status)
+    app.router.add_get('/start', start_bot)
+    app.router.add_get('/stop', stop_bot)
+    app.router.add_get('/balance', get_balance)
+    app.router.add_get('/operaciones', get_operaciones)
+    app.router.add_get('/operaciones/resumen', get_resumen_operaciones)
+    app.router.add_get('/eventos', eventos)
+    app.on_startup.append(al_iniciar)
+    app.on_shutdown.append(al_apagar)
+    return app
 
 if __name__ == "__main__":
     print("Iniciando servidor web del bot de trading...")
-    print("🌐 Interfaz web disponible en: http://localhost:5000")
+    print("🌐 Interfaz web disponible en: http://localhost:10000")
     print("📋 Endpoints disponibles:")
     print("  - GET / → Interfaz web con botones")
     print("  - GET /status → Estado del bot y conexiones")
     print("  - GET /start → Iniciar bot")
     print("  - GET /stop → Detener bot")
     print("  - GET /balance → Ver balance")
-    print("  - GET /operaciones → Ver operaciones")
+    print("  - GET /operaciones → Ver operaciones (?limite=, ?antes=, ?desde=)")
+    print("  - GET /operaciones/resumen → Resumen de operaciones cerradas")
+    print("  - GET /eventos → Panel en vivo (Server-Sent Events)")
     
-    # Iniciar el servidor Flask
-    app.run(host='0.0.0.0', port=10000, debug=False)
\ No newline at end of file
+    # Servidor HTTP, WebSocket, estrategia y órdenes comparten un único bucle de eventos
+    web.run_app(crear_app(), host='0.0.0.0', port=10000, print=None)
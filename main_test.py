@@ -46,7 +46,7 @@ class TestBot:
         self.estrategia.config['stop_loss_habilitado'] = True
         
         # Abrir operación
-        resultado = self.gestor.abrir_operacion(senal_prueba)
+        resultado = await self.gestor.abrir_operacion(senal_prueba)
         
         if resultado and self.gestor.operaciones_activas:
             operacion = self.gestor.operaciones_activas[0]
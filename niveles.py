@@ -0,0 +1,72 @@
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, List, Tuple
+
+class IndiceNiveles:
+    """Niveles de TP/SL de un símbolo ordenados por precio para comprobar cada tick en O(log n)"""
+
+    def __init__(self):
+        # Niveles que se disparan cuando el precio sube hasta ellos (TP de largos, SL de cortos)
+        self.al_subir: List[Tuple[float, int]] = []
+        # Niveles que se disparan cuando el precio baja hasta ellos (SL de largos, TP de cortos)
+        self.al_bajar: List[Tuple[float, int]] = []
+        self.operaciones: Dict[int, Dict] = {}
+
+    def __len__(self) -> int:
+        return len(self.operaciones)
+
+    @staticmethod
+    def _niveles(operacion: Dict) -> Tuple[float, float]:
+        """(nivel al subir, nivel al bajar); 0 si la operación no tiene ese nivel"""
+        stop_loss = operacion['stop_loss'] if operacion['stop_loss'] > 0 else 0
+        if operacion['direccion'] == 'long':
+            return operacion['take_profit'], stop_loss
+        return stop_loss, operacion['take_profit']
+
+    def agregar(self, operacion: Dict):
+        if operacion['id'] in self.operaciones:
+            return
+        self.operaciones[operacion['id']] = operacion
+        subir, bajar = self._niveles(operacion)
+        if subir > 0:
+            insort(self.al_subir, (subir, operacion['id']))
+        if bajar > 0:
+            insort(self.al_bajar, (bajar, operacion['id']))
+
+    def quitar(self, operacion: Dict):
+        if self.operaciones.pop(operacion['id'], None) is None:
+            return
+        subir, bajar = self._niveles(operacion)
+        for lista, nivel in ((self.al_subir, subir), (self.al_bajar, bajar)):
+            if nivel > 0:
+                i = bisect_left(lista, (nivel, operacion['id']))
+                if i < len(lista) and lista[i] == (nivel, operacion['id']):
+                    del lista[i]
+
+    def hay_disparo(self, precio: float) -> bool:
+        """Comprobación O(1) contra los niveles más cercanos por arriba y por abajo"""
+        return bool((self.al_subir and self.al_subir[0][0] <= precio) or
+                    (self.al_bajar and self.al_bajar[-1][0] >= precio))
+
+    def extraer_disparados(self, precio: float) -> List[Tuple[Dict, str]]:
+        """Quitar del índice y devolver las operaciones cuyo TP o SL ha alcanzado el precio"""
+        if not self.hay_disparo(precio):
+            return []
+
+        disparados = {}
+        # Todos los niveles al subir <= precio y todos los niveles al bajar >= precio
+        for _, id_operacion in self.al_subir[:bisect_right(self.al_subir, (precio, float('inf')))]:
+            operacion = self.operaciones[id_operacion]
+            disparados[id_operacion] = 'take_profit' if operacion['direccion'] == 'long' else 'stop_loss'
+        for _, id_operacion in self.al_bajar[bisect_left(self.al_bajar, (precio, float('-inf'))):]:
+            operacion = self.operaciones[id_operacion]
+            # Si saltaran ambos a la vez se prioriza el stop loss (criterio conservador del backtest)
+            razon = 'stop_loss' if operacion['direccion'] == 'long' else 'take_profit'
+            if razon == 'stop_loss' or id_operacion not in disparados:
+                disparados[id_operacion] = razon
+
+        resultado = []
+        for id_operacion, razon in disparados.items():
+            operacion = self.operaciones[id_operacion]
+            self.quitar(operacion)
+            resultado.append((operacion, razon))
+        return resultado
@@ -0,0 +1,121 @@
+import argparse
+import itertools
+import json
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+from backtest import Backtester, cargar_klines, resumir, COLUMNAS_KLINES
+
+# Parámetros de los que dependen las señales; el resto solo afecta a la simulación
+PARAMETROS_INDICADORES = ('macd_fast', 'macd_slow', 'macd_signal', 'atr_periodo')
+
+ESPACIO_POR_DEFECTO = {
+    'macd_fast': [8, 12, 16],
+    'macd_slow': [21, 26, 34],
+    'macd_signal': [7, 9],
+    'atr_periodo': [14],
+    'take_profit_tipo': ['atr', 'porcentaje'],
+    'take_profit_valor': [1.0, 2.0, 3.0],
+    'stop_loss_tipo': ['porcentaje', 'rr_ratio'],
+    'stop_loss_valor': [0.5, 1.0, 2.0]
+}
+
+# Velas compartidas por cada proceso (memmap de solo lectura)
+_velas_worker: Dict[str, Dict[str, np.ndarray]] = {}
+
+def construir_grid(espacio: Dict[str, List]) -> List[Dict]:
+    """Producto cartesiano del espacio de parámetros"""
+    claves = list(espacio)
+    grid = [dict(zip(claves, valores)) for valores in itertools.product(*(espacio[c] for c in claves))]
+    # Descartar combinaciones en las que la EMA rápida no es más rápida que la lenta
+    return [p for p in grid if p.get('macd_fast', 0) < p.get('macd_slow', float('inf'))]
+
+def agrupar_por_indicadores(grid: List[Dict]) -> Dict[Tuple, List[Dict]]:
+    """Agrupar combinaciones que comparten las mismas series de indicadores"""
+    grupos = {}
+    for parametros in grid:
+        clave = tuple(parametros.get(p) for p in PARAMETROS_INDICADORES)
+        grupos.setdefault(clave, []).append(parametros)
+    return grupos
+
+def guardar_velas_compartidas(velas_1m: Dict[str, np.ndarray], velas_macd: Dict[str, np.ndarray], directorio: str):
+    """Volcar las velas a archivos .npy para que los procesos las abran con memmap"""
+    for nombre, velas in (('1m', velas_1m), ('macd', velas_macd)):
+        for columna in COLUMNAS_KLINES:
+            np.save(os.path.join(directorio, f"{nombre}_{columna}.npy"), velas[columna])
+
+def _inicializar_worker(directorio: str):
+    """Abrir las velas compartidas sin copiarlas ni recibirlas serializadas"""
+    for nombre in ('1m', 'macd'):
+        _velas_worker[nombre] = {
+            columna: np.load(os.path.join(directorio, f"{nombre}_{columna}.npy"), mmap_mode='r')
+            for columna in COLUMNAS_KLINES
+        }
+
+def _evaluar_grupo(parametros_grupo: List[Dict]) -> List[Dict]:
+    """Generar las señales una vez por grupo y simular cada combinación de TP/SL"""
+    velas_1m, velas_macd = _velas_worker['1m'], _velas_worker['macd']
+
+    inicio = time.perf_counter()
+    senales = Backtester(parametros_grupo[0]).generar_senales(velas_1m, velas_macd)
+    duracion_senales = time.perf_counter() - inicio
+
+    resultados = []
+    for parametros in parametros_grupo:
+        inicio = time.perf_counter()
+        operaciones = Backtester(parametros).simular(senales, velas_1m)
+        resultados.append({
+            **parametros,
+            **resumir(operaciones),
+            'duracion': time.perf_counter() - inicio,
+            'duracion_senales': duracion_senales
+        })
+    return resultados
+
+def optimizar(velas_1m: Dict[str, np.ndarray], velas_macd: Dict[str, np.ndarray],
+              espacio: Dict[str, List], procesos: Optional[int] = None) -> pd.DataFrame:
+    """Evaluar todo el espacio de parámetros en un pool de procesos y devolver la tabla ordenada"""
+    grupos = agrupar_por_indicadores(construir_grid(espacio))
+    total = sum(len(g) for g in grupos.values())
+    print(f"Evaluando {total} combinaciones en {len(grupos)} grupos de indicadores...")
+
+    resultados = []
+    with tempfile.TemporaryDirectory() as directorio:
+        guardar_velas_compartidas(velas_1m, velas_macd, directorio)
+        with ProcessPoolExecutor(max_workers=procesos, initializer=_inicializar_worker,
+                                 initargs=(directorio,)) as pool:
+            futuros = [pool.submit(_evaluar_grupo, grupo) for grupo in grupos.values()]
+            for futuro in as_completed(futuros):
+                resultados.extend(futuro.result())
+                print(f"   {len(resultados)}/{total} combinaciones evaluadas")
+
+    tabla = pd.DataFrame(resultados)
+    if tabla.empty:
+        return tabla
+    return tabla.sort_values(['pnl_neto', 'max_drawdown'], ascending=[False, True]).reset_index(drop=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Búsqueda de parámetros de CONFIG_TRADING sobre klines históricas")
+    parser.add_argument('--velas-1m', required=True, help="CSV de klines de la temporalidad de operaciones")
+    parser.add_argument('--velas-macd', required=True, help="CSV de klines de la temporalidad del MACD")
+    parser.add_argument('--espacio', help="JSON con listas de valores por parámetro (por defecto ESPACIO_POR_DEFECTO)")
+    parser.add_argument('--procesos', type=int, default=None, help="Número de procesos (por defecto todos los núcleos)")
+    parser.add_argument('--salida', default='optimizacion_resultados.csv', help="CSV con la tabla de resultados")
+    args = parser.parse_args()
+
+    espacio = ESPACIO_POR_DEFECTO
+    if args.espacio:
+        with open(args.espacio) as f:
+            espacio = json.load(f)
+
+    inicio = time.perf_counter()
+    tabla = optimizar(cargar_klines(args.velas_1m), cargar_klines(args.velas_macd), espacio, args.procesos)
+    tabla.to_csv(args.salida, index=False)
+
+    print(f"✅ Optimización completada en {time.perf_counter() - inicio:.2f}s")
+    print(tabla.head(10).to_string())
+    print(f"   Resultados guardados en {args.salida}")
@@ -0,0 +1,168 @@
+import asyncio
+import itertools
+import time
+from collections import deque
+from typing import Any, Callable, Coroutine, Dict, Optional, Tuple
+from config import CONFIG_PIPELINE
+from decodificacion import VelaKline
+
+# Eventos de precio en los que solo importa el último valor
+EVENTOS_COALESCIBLES = ('markPriceUpdate', 'bookTicker')
+
+def es_evento_final(data) -> bool:
+    """Una kline sin cerrar o un tick de precio puede sustituirse por el siguiente; el resto de eventos no"""
+    if isinstance(data, VelaKline):
+        return data.cerrada
+    if data.get('e') in EVENTOS_COALESCIBLES:
+        return False
+    kline = data.get('k')
+    return kline is None or kline.get('x', True)
+
+def resumir_tiempos(muestras: deque) -> Dict:
+    """Percentiles de una ventana de tiempos en milisegundos"""
+    if not muestras:
+        return {'muestras': 0}
+    ordenadas = sorted(muestras)
+    return {
+        'muestras': len(ordenadas),
+        'p50_ms': round(ordenadas[len(ordenadas) // 2], 3),
+        'p95_ms': round(ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * 0.95))], 3),
+        'max_ms': round(ordenadas[-1], 3)
+    }
+
+class ColaCoalescente:
+    """Cola FIFO acotada que conserva solo el último evento no final de cada stream"""
+
+    def __init__(self, capacidad: int):
+        self.capacidad = capacidad
+        # Los dict mantienen el orden de inserción: sirven de FIFO con sustitución en O(1)
+        self.pendientes: Dict[Any, Tuple[str, Dict, float]] = {}
+        self._secuencia = itertools.count()
+        self._hay_eventos = asyncio.Event()
+        self._hay_hueco = asyncio.Event()
+        self._hay_hueco.set()
+        self.coalescidos = 0
+        self.descartados = 0
+        self.profundidad_maxima = 0
+
+    def __len__(self) -> int:
+        return len(self.pendientes)
+
+    async def poner(self, stream: str, data: Dict):
+        """Encolar un evento; solo las velas cerradas esperan si la cola está llena"""
+        encolado = time.perf_counter()
+        if not es_evento_final(data):
+            if stream in self.pendientes:
+                # Se sustituye el dato pero se conserva la antigüedad para medir el retraso real
+                self.pendientes[stream] = (stream, data, self.pendientes[stream][2])
+                self.coalescidos += 1
+                return
+            if len(self.pendientes) >= self.capacidad:
+                self.descartados += 1
+                return
+            self.pendientes[stream] = (stream, data, encolado)
+        else:
+            while len(self.pendientes) >= self.capacidad:
+                self._hay_hueco.clear()
+                await self._hay_hueco.wait()
+            # La vela cerrada deja obsoleta la parcial pendiente del mismo stream
+            if self.pendientes.pop(stream, None) is not None:
+                self.coalescidos += 1
+            self.pendientes[(stream, next(self._secuencia))] = (stream, data, encolado)
+
+        self.profundidad_maxima = max(self.profundidad_maxima, len(self.pendientes))
+        self._hay_eventos.set()
+
+    async def obtener(self) -> Tuple[str, Dict, float]:
+        """Sacar el evento más antiguo: (stream, datos, instante de encolado)"""
+        while not self.pendientes:
+            self._hay_eventos.clear()
+            await self._hay_eventos.wait()
+        evento = self.pendientes.pop(next(iter(self.pendientes)))
+        self._hay_hueco.set()
+        return evento
+
+class PipelineEventos:
+    """Recepción, estrategia y ejecución en etapas separadas para que el WebSocket nunca espere al REST"""
+
+    def __init__(self, callbacks: Dict[str, Callable], config: Optional[Dict] = None, grabador=None):
+        self.config = config or CONFIG_PIPELINE
+        self.callbacks = callbacks
+        # GrabadorMercado opcional: registra cada evento antes de coalescer
+        self.grabador = grabador
+        self.cola_mercado = ColaCoalescente(self.config['capacidad_cola'])
+        # Las órdenes no se descartan nunca: la cola de ejecución no tiene límite
+        self.cola_ordenes: asyncio.Queue = asyncio.Queue()
+        self.tareas = []
+        self.retraso_estrategia = deque(maxlen=1000)
+        self.duracion_estrategia = deque(maxlen=1000)
+        self.retraso_ejecucion = deque(maxlen=1000)
+        self.eventos_procesados = 0
+        self.ordenes_procesadas = 0
+
+    def iniciar(self):
+        """Arrancar las etapas de estrategia y ejecución en el bucle actual"""
+        self.tareas.append(asyncio.create_task(self.etapa_estrategia()))
+        for _ in range(self.config['trabajadores_ejecucion']):
+            self.tareas.append(asyncio.create_task(self.etapa_ejecucion()))
+        if self.grabador is not None:
+            self.tareas.append(asyncio.create_task(self.grabador.volcar_periodicamente()))
+
+    async def detener(self):
+        for tarea in self.tareas:
+            tarea.cancel()
+        await asyncio.gather(*self.tareas, return_exceptions=True)
+        self.tareas.clear()
+
+    async def recibir(self, stream: str, data: Dict, crudo=None):
+        """Etapa de recepción: solo encola el mensaje ya decodificado (y lo graba si hay grabador)"""
+        if self.grabador is not None:
+            self.grabador.registrar(data, crudo)
+        await self.cola_mercado.poner(stream, data)
+
+    def encolar_orden(self, corrutina: Coroutine):
+        """Pasar trabajo de órdenes (REST) a la etapa de ejecución"""
+        self.cola_ordenes.put_nowait((corrutina, time.perf_counter()))
+
+    async def etapa_estrategia(self):
+        """Aplicar los callbacks de estrategia en orden de llegada"""
+        while True:
+            stream, data, encolado = await self.cola_mercado.obtener()
+            inicio = time.perf_counter()
+            self.retraso_estrategia.append((inicio - encolado) * 1000)
+            callback = self.callbacks.get(stream)
+            if callback is not None:
+                try:
+                    callback(data)
+                except Exception as e:
+                    print(f"Error procesando evento de {stream}: {e}")
+            self.duracion_estrategia.append((time.perf_counter() - inicio) * 1000)
+            self.eventos_procesados += 1
+
+    async def etapa_ejecucion(self):
+        """Ejecutar las corrutinas de órdenes; varios trabajadores permiten órdenes simultáneas"""
+        while True:
+            corrutina, encolado = await self.cola_ordenes.get()
+            self.retraso_ejecucion.append((time.perf_counter() - encolado) * 1000)
+            try:
+                await corrutina
+            except Exception as e:
+                print(f"Error ejecutando orden: {e}")
+            finally:
+                self.ordenes_procesadas += 1
+                self.cola_ordenes.task_done()
+
+    def estadisticas(self) -> Dict:
+        """Profundidad de las colas y retraso de procesamiento de cada etapa"""
+        return {
+            'cola_mercado': len(self.cola_mercado),
+            'cola_mercado_maxima': self.cola_mercado.profundidad_maxima,
+            'coalescidos': self.cola_mercado.coalescidos,
+            'descartados': self.cola_mercado.descartados,
+            'cola_ordenes': self.cola_ordenes.qsize(),
+            'eventos_procesados': self.eventos_procesados,
+            'ordenes_procesadas': self.ordenes_procesadas,
+            'retraso_estrategia': resumir_tiempos(self.retraso_estrategia),
+            'duracion_estrategia': resumir_tiempos(self.duracion_estrategia),
+            'retraso_ejecucion': resumir_tiempos(self.retraso_ejecucion)
+        }
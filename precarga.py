@@ -0,0 +1,105 @@
+import asyncio
+import os
+import time
+import numpy as np
+from typing import Dict, List, Optional
+from api_connection import APIConnection
+from estrategia import EstrategiaMACD, intervalo_ms
+from buffer_ohlcv import COLUMNAS_VELAS
+from config import DIRECTORIO_CACHE_VELAS
+
+LIMITE_KLINES_REST = 1500  # Máximo de velas por petición en /fapi/v1/klines
+PETICIONES_SIMULTANEAS = 10
+
+class PrecargaHistorica:
+    """Descarga (o lee de caché) el historial necesario para arrancar las estrategias con indicadores listos"""
+
+    def __init__(self, api: APIConnection, directorio_cache: Optional[str] = DIRECTORIO_CACHE_VELAS):
+        self.api = api
+        self.directorio_cache = directorio_cache
+        self.semaforo = asyncio.Semaphore(PETICIONES_SIMULTANEAS)
+
+    def _ruta_cache(self, activo: str, temporalidad: str) -> str:
+        return os.path.join(self.directorio_cache, f"{activo}_{temporalidad}.npz")
+
+    def leer_cache(self, activo: str, temporalidad: str) -> Optional[Dict[str, np.ndarray]]:
+        """Leer velas guardadas en una ejecución anterior"""
+        if not self.directorio_cache:
+            return None
+        try:
+            with np.load(self._ruta_cache(activo, temporalidad)) as datos:
+                return {columna: datos[columna] for columna in COLUMNAS_VELAS}
+        except (FileNotFoundError, KeyError, ValueError):
+            return None
+
+    def guardar_cache(self, activo: str, temporalidad: str, velas: Dict[str, np.ndarray]):
+        if not self.directorio_cache:
+            return
+        try:
+            os.makedirs(self.directorio_cache, exist_ok=True)
+            np.savez(self._ruta_cache(activo, temporalidad), **velas)
+        except OSError as e:
+            print(f"Error guardando caché de velas de {activo} {temporalidad}: {e}")
+
+    async def descargar(self, activo: str, temporalidad: str, desde: int) -> List[list]:
+        """Descargar por REST las velas cerradas desde un timestamp, paginando si hace falta"""
+        klines = []
+        ahora = int(time.time() * 1000)
+        while desde < ahora:
+            async with self.semaforo:
+                pagina = await self.api.get_klines_async(activo, temporalidad, start_time=desde,
+                                                         limit=LIMITE_KLINES_REST)
+            # Solo velas cerradas: la que sigue abierta llegará por el WebSocket
+            cerradas = [kline for kline in pagina if kline[6] < ahora]
+            klines.extend(cerradas)
+            if len(pagina) < LIMITE_KLINES_REST or len(cerradas) < len(pagina):
+                break
+            desde = pagina[-1][0] + intervalo_ms(temporalidad)
+        return klines
+
+    async def obtener_velas(self, activo: str, temporalidad: str, cantidad: int) -> Dict[str, np.ndarray]:
+        """Últimas velas cerradas de un activo: caché local completada con REST"""
+        duracion = intervalo_ms(temporalidad)
+        inicio = int(time.time() * 1000) - (cantidad + 1) * duracion
+
+        velas = self.leer_cache(activo, temporalidad)
+        if velas is not None and len(velas['timestamp']) and velas['timestamp'][-1] >= inicio:
+            desde = int(velas['timestamp'][-1]) + duracion
+        else:
+            velas, desde = None, inicio
+
+        klines = await self.descargar(activo, temporalidad, desde)
+        nuevas = {
+            'timestamp': np.array([kline[0] for kline in klines], dtype=np.int64),
+            **{columna: np.array([float(kline[i + 1]) for kline in klines], dtype=np.float64)
+               for i, columna in enumerate(COLUMNAS_VELAS[1:])}
+        }
+
+        if velas is not None:
+            nuevas = {columna: np.concatenate([velas[columna], nuevas[columna]]) for columna in COLUMNAS_VELAS}
+        velas = {columna: valores[-cantidad:] for columna, valores in nuevas.items()}
+
+        self.guardar_cache(activo, temporalidad, velas)
+        return velas
+
+    async def precargar(self, estrategias: Dict[str, EstrategiaMACD]):
+        """Descargar en paralelo el historial de todos los activos y sembrar sus estrategias"""
+        inicio = time.perf_counter()
+        activos = list(estrategias)
+        tareas = []
+        for activo in activos:
+            config = estrategias[activo].config
+            tareas.append(self.obtener_velas(activo, config['temporalidad_operaciones'], config['max_velas_1m']))
+            tareas.append(self.obtener_velas(activo, config['temporalidad_macd'], config['max_velas_macd']))
+
+        resultados = await asyncio.gather(*tareas, return_exceptions=True)
+
+        for i, activo in enumerate(activos):
+            velas_1m, velas_macd = resultados[2 * i], resultados[2 * i + 1]
+            if isinstance(velas_1m, Exception) or isinstance(velas_macd, Exception):
+                error = velas_1m if isinstance(velas_1m, Exception) else velas_macd
+                print(f"Error precargando historial de {activo}: {error}")
+                continue
+            estrategias[activo].sembrar_historial(velas_1m, velas_macd)
+
+        print(f"Historial precargado para {len(activos)} activos en {time.perf_counter() - inicio:.1f}s")
@@ -0,0 +1,249 @@
+import asyncio
+import os
+import time
+import numpy as np
+from typing import Dict, Iterator, List, Optional, Tuple
+from buffer_ohlcv import COLUMNAS_VELAS
+from config import CONFIG_REGISTRO
+from decodificacion import VelaKline
+
+# Columnas de ancho fijo de cada serie de klines (un archivo .bin por columna)
+DTYPES_KLINES = {
+    'timestamp': np.dtype('<i8'),
+    'open': np.dtype('<f8'),
+    'high': np.dtype('<f8'),
+    'low': np.dtype('<f8'),
+    'close': np.dtype('<f8'),
+    'volume': np.dtype('<f8'),
+    'recibido': np.dtype('<i8')  # Hora de evento de Binance (ms), para reproducir el orden real
+}
+DTYPES_FRAMES = {
+    'recibido': np.dtype('<i8'),
+    'posicion': np.dtype('<i8'),  # Byte de inicio del frame en frames.dat
+    'longitud': np.dtype('<i4')
+}
+# Índice temporal disperso: una entrada cada filas_por_indice filas
+DTYPE_INDICE = np.dtype([('timestamp', '<i8'), ('fila', '<i8')])
+
+class SerieColumnar:
+    """Serie append-only con una columna NumPy de ancho fijo por archivo y un índice temporal disperso"""
+
+    def __init__(self, directorio: str, dtypes: Dict[str, np.dtype], columna_tiempo: str,
+                 filas_por_indice: int = 1024):
+        self.directorio = directorio
+        self.dtypes = dtypes
+        self.columna_tiempo = columna_tiempo
+        self.filas_por_indice = filas_por_indice
+        self.pendientes: Dict[str, List] = {columna: [] for columna in dtypes}
+        self.filas = self._filas_en_disco()
+        self.ultimo_tiempo = self._ultimo_tiempo_en_disco()
+
+    def _ruta(self, columna: str) -> str:
+        return os.path.join(self.directorio, f"{columna}.bin")
+
+    def _filas_en_disco(self) -> int:
+        """Filas completas: si una escritura se cortó, las columnas pueden tener longitudes distintas"""
+        longitudes = []
+        for columna, dtype in self.dtypes.items():
+            try:
+                longitudes.append(os.path.getsize(self._ruta(columna)) // dtype.itemsize)
+            except FileNotFoundError:
+                longitudes.append(0)
+        return min(longitudes)
+
+    def _ultimo_tiempo_en_disco(self) -> Optional[int]:
+        if self.filas == 0:
+            return None
+        dtype = self.dtypes[self.columna_tiempo]
+        with open(self._ruta(self.columna_tiempo), 'rb') as f:
+            f.seek((self.filas - 1) * dtype.itemsize)
+            return int(np.frombuffer(f.read(dtype.itemsize), dtype=dtype)[0])
+
+    def __len__(self) -> int:
+        return self.filas + len(self.pendientes[self.columna_tiempo])
+
+    def agregar(self, **valores):
+        for columna, lista in self.pendientes.items():
+            lista.append(valores[columna])
+        self.ultimo_tiempo = valores[self.columna_tiempo]
+
+    def extraer_pendientes(self) -> Dict[str, List]:
+        """Quitar las filas en memoria para volcarlas (las nuevas siguen acumulándose)"""
+        pendientes = self.pendientes
+        self.pendientes = {columna: [] for columna in self.dtypes}
+        return pendientes
+
+    def volcar(self, pendientes: Optional[Dict[str, List]] = None):
+        """Añadir al final de cada archivo las filas pendientes"""
+        if pendientes is None:
+            pendientes = self.extraer_pendientes()
+        n = len(pendientes[self.columna_tiempo])
+        if n == 0:
+            return
+
+        os.makedirs(self.directorio, exist_ok=True)
+        # Recortar columnas que quedaron más largas tras un corte para no desalinear filas
+        for columna, dtype in self.dtypes.items():
+            ruta = self._ruta(columna)
+            if os.path.exists(ruta) and os.path.getsize(ruta) != self.filas * dtype.itemsize:
+                os.truncate(ruta, self.filas * dtype.itemsize)
+
+        for columna, dtype in self.dtypes.items():
+            with open(self._ruta(columna), 'ab') as f:
+                np.asarray(pendientes[columna], dtype=dtype).tofile(f)
+
+        # Entradas del índice para cada múltiplo de filas_por_indice que se ha cruzado
+        tiempos = pendientes[self.columna_tiempo]
+        primera = -(-self.filas // self.filas_por_indice) * self.filas_por_indice
+        entradas = [(tiempos[fila - self.filas], fila)
+                    for fila in range(primera, self.filas + n, self.filas_por_indice)]
+        if entradas:
+            with open(self._ruta('indice'), 'ab') as f:
+                np.array(entradas, dtype=DTYPE_INDICE).tofile(f)
+        self.filas += n
+
+    def abrir(self) -> Dict[str, np.ndarray]:
+        """Columnas completas como memmap de solo lectura (no se cargan en RAM)"""
+        filas = self._filas_en_disco()
+        if filas == 0:
+            return {columna: np.empty(0, dtype=dtype) for columna, dtype in self.dtypes.items()}
+        return {columna: np.memmap(self._ruta(columna), dtype=dtype, mode='r', shape=(filas,))
+                for columna, dtype in self.dtypes.items()}
+
+    def leer_indice(self) -> np.ndarray:
+        try:
+            return np.fromfile(self._ruta('indice'), dtype=DTYPE_INDICE)
+        except FileNotFoundError:
+            return np.empty(0, dtype=DTYPE_INDICE)
+
+    def rango_filas(self, columnas: Dict[str, np.ndarray], desde: Optional[int],
+                    hasta: Optional[int]) -> Tuple[int, int]:
+        """Filas [inicio, fin) con desde <= tiempo < hasta; el índice acota la búsqueda a un bloque"""
+        tiempos = columnas[self.columna_tiempo]
+        indice = self.leer_indice()
+
+        def buscar(valor: int) -> int:
+            bloque = np.searchsorted(indice['timestamp'], valor, side='left') - 1
+            inicio = min(int(indice['fila'][bloque]), len(tiempos)) if bloque >= 0 else 0
+            fin = int(indice['fila'][bloque + 1]) + 1 if bloque + 1 < len(indice) else len(tiempos)
+            fin = min(fin, len(tiempos))
+            return inicio + int(np.searchsorted(tiempos[inicio:fin], valor, side='left'))
+
+        inicio = 0 if desde is None else buscar(desde)
+        fin = len(tiempos) if hasta is None else buscar(hasta)
+        return inicio, max(inicio, fin)
+
+class GrabadorMercado:
+    """Etapa que persiste las klines (cerradas y en curso) y, opcionalmente, los frames crudos"""
+
+    def __init__(self, directorio: Optional[str] = None, config: Optional[Dict] = None):
+        self.config = config or CONFIG_REGISTRO
+        self.directorio = directorio or self.config['directorio']
+        self.series: Dict[Tuple[str, str, str], SerieColumnar] = {}
+        self.frames = None
+        if self.config['frames_crudos']:
+            self.frames = SerieColumnar(os.path.join(self.directorio, 'frames'), DTYPES_FRAMES,
+                                        'recibido', self.config['filas_por_indice'])
+            self.frames_pendientes: List[bytes] = []
+            self.bytes_frames = self._bytes_frames()
+
+    def _bytes_frames(self) -> int:
+        try:
+            return os.path.getsize(os.path.join(self.directorio, 'frames', 'frames.dat'))
+        except FileNotFoundError:
+            return 0
+
+    def serie(self, simbolo: str, temporalidad: str, tipo: str) -> SerieColumnar:
+        clave = (simbolo, temporalidad, tipo)
+        serie = self.series.get(clave)
+        if serie is None:
+            serie = SerieColumnar(os.path.join(self.directorio, simbolo, temporalidad, tipo), DTYPES_KLINES,
+                                  'timestamp', self.config['filas_por_indice'])
+            self.series[clave] = serie
+        return serie
+
+    def registrar(self, data, crudo=None):
+        """Guardar en memoria un evento recibido; el volcado a disco se hace aparte"""
+        ahora = int(time.time() * 1000)
+        if crudo is not None and self.frames is not None:
+            datos = crudo.encode() if isinstance(crudo, str) else crudo
+            # Hora local de llegada: ordena los frames de todos los streams
+            self.frames.agregar(recibido=ahora, posicion=self.bytes_frames, longitud=len(datos))
+            self.frames_pendientes.append(datos)
+            self.bytes_frames += len(datos)
+
+        if not isinstance(data, VelaKline):
+            return
+        serie = self.serie(data.simbolo, data.temporalidad, 'cerradas' if data.cerrada else 'parciales')
+        # Las cerradas quedan estrictamente ordenadas: se ignoran repeticiones tras reconectar
+        if data.cerrada and serie.ultimo_tiempo is not None and data.timestamp <= serie.ultimo_tiempo:
+            return
+        serie.agregar(timestamp=data.timestamp, open=data.open, high=data.high, low=data.low,
+                      close=data.close, volume=data.volume, recibido=data.evento or ahora)
+
+    def volcar(self):
+        """Escribir en disco todo lo pendiente"""
+        self.volcar_lote(self.extraer_lote())
+
+    async def volcar_periodicamente(self):
+        """Volcar cada intervalo_volcado segundos fuera del bucle de eventos"""
+        volcado = None
+        try:
+            while True:
+                await asyncio.sleep(self.config['intervalo_volcado'])
+                volcado = asyncio.ensure_future(asyncio.to_thread(self.volcar_lote, self.extraer_lote()))
+                await asyncio.shield(volcado)
+        finally:
+            # Si se cancela a mitad de un volcado, el hilo sigue escribiendo: hay que esperarle
+            # antes del volcado final, que recortaría las filas que aún está añadiendo
+            if volcado is not None and not volcado.done():
+                await asyncio.wait({volcado})
+            self.volcar()
+
+    def extraer_lote(self) -> List:
+        """Separar lo pendiente en el hilo del bucle para que el volcado no compita con registrar()"""
+        lote = [(serie, serie.extraer_pendientes()) for serie in list(self.series.values())]
+        if self.frames is not None and self.frames_pendientes:
+            datos, self.frames_pendientes = self.frames_pendientes, []
+            lote.append((None, datos))
+            lote.append((self.frames, self.frames.extraer_pendientes()))
+        return lote
+
+    def volcar_lote(self, lote: List):
+        for serie, pendientes in lote:
+            # Los bytes de los frames se escriben antes que las columnas que los referencian
+            if serie is None:
+                os.makedirs(self.frames.directorio, exist_ok=True)
+                with open(os.path.join(self.frames.directorio, 'frames.dat'), 'ab') as f:
+                    f.write(b''.join(pendientes))
+            else:
+                serie.volcar(pendientes)
+
+class LectorMercado:
+    """Lectura sin copias de lo grabado por GrabadorMercado mediante np.memmap"""
+
+    def __init__(self, directorio: Optional[str] = None):
+        self.directorio = directorio or CONFIG_REGISTRO['directorio']
+
+    def velas(self, simbolo: str, temporalidad: str, desde: Optional[int] = None,
+              hasta: Optional[int] = None, tipo: str = 'cerradas') -> Dict[str, np.ndarray]:
+        """Velas con desde <= timestamp < hasta en el formato de backtest y sembrar_historial (vistas memmap)"""
+        serie = SerieColumnar(os.path.join(self.directorio, simbolo, temporalidad, tipo), DTYPES_KLINES,
+                              'timestamp', CONFIG_REGISTRO['filas_por_indice'])
+        columnas = serie.abrir()
+        inicio, fin = serie.rango_filas(columnas, desde, hasta)
+        return {columna: columnas[columna][inicio:fin] for columna in COLUMNAS_VELAS + ('recibido',)}
+
+    def frames(self, desde: Optional[int] = None, hasta: Optional[int] = None) -> Iterator[Tuple[int, bytes]]:
+        """Frames crudos (hora de recepción, bytes) en orden de llegada"""
+        directorio = os.path.join(self.directorio, 'frames')
+        serie = SerieColumnar(directorio, DTYPES_FRAMES, 'recibido', CONFIG_REGISTRO['filas_por_indice'])
+        columnas = serie.abrir()
+        inicio, fin = serie.rango_filas(columnas, desde, hasta)
+        if fin <= inicio:
+            return
+        datos = np.memmap(os.path.join(directorio, 'frames.dat'), dtype=np.uint8, mode='r')
+        for recibido, posicion, longitud in zip(columnas['recibido'][inicio:fin].tolist(),
+                                                columnas['posicion'][inicio:fin].tolist(),
+                                                columnas['longitud'][inicio:fin].tolist()):
+            yield recibido, datos[posicion:posicion + longitud].tobytes()
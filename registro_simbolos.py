@@ -0,0 +1,121 @@
+import threading
+import time
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Optional
+
+def redondear_a_paso(valor: float, paso: float) -> float:
+    """Redondear un valor al múltiplo más cercano de paso (stepSize / tickSize) sin errores de coma flotante"""
+    if paso <= 0:
+        return valor
+    paso_decimal = Decimal(str(paso))
+    multiplos = (Decimal(str(valor)) / paso_decimal).to_integral_value(rounding=ROUND_HALF_UP)
+    return float(multiplos * paso_decimal)
+
+@dataclass
+class InfoSimbolo:
+    simbolo: str
+    step_size: float
+    min_qty: float
+    tick_size: float
+    min_notional: float
+    precision_cantidad: int
+    precision_precio: int
+
+    def ajustar_cantidad(self, cantidad: float) -> float:
+        """Ajustar una cantidad al stepSize del filtro LOT_SIZE"""
+        return redondear_a_paso(cantidad, self.step_size)
+
+    def ajustar_precio(self, precio: float) -> float:
+        """Ajustar un precio al tickSize del filtro PRICE_FILTER"""
+        return redondear_a_paso(precio, self.tick_size)
+
+    @classmethod
+    def desde_exchange_info(cls, datos: Dict) -> 'InfoSimbolo':
+        """Construir a partir de una entrada de 'symbols' de futures_exchange_info()"""
+        filtros = {filtro['filterType']: filtro for filtro in datos.get('filters', [])}
+        lot_size = filtros.get('LOT_SIZE', {})
+        price_filter = filtros.get('PRICE_FILTER', {})
+        min_notional = filtros.get('MIN_NOTIONAL', {})
+        return cls(
+            simbolo=datos['symbol'],
+            step_size=float(lot_size.get('stepSize', 0)),
+            min_qty=float(lot_size.get('minQty', 0)),
+            tick_size=float(price_filter.get('tickSize', 0)),
+            # En futuros el filtro usa la clave 'notional' (en spot 'minNotional')
+            min_notional=float(min_notional.get('notional', min_notional.get('minNotional', 0))),
+            precision_cantidad=int(datos.get('quantityPrecision', 8)),
+            precision_precio=int(datos.get('pricePrecision', 8))
+        )
+
+class RegistroSimbolos:
+    """Caché de filtros y precisión de los símbolos de futuros, indexada por símbolo y con TTL"""
+
+    def __init__(self, client, ttl: float):
+        self.client = client
+        self.ttl = ttl
+        self.simbolos: Dict[str, InfoSimbolo] = {}
+        self.ultima_carga = 0.0
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        # Pide al hilo de refresco una recarga inmediata sin esperar al TTL
+        self._recargar = threading.Event()
+        self._hilo_refresco = None
+
+    def cargar(self) -> bool:
+        """Descargar exchangeInfo una vez y reconstruir el índice por símbolo"""
+        try:
+            exchange_info = self.client.futures_exchange_info()
+        except Exception as e:
+            # Se conserva la última copia válida si la hubiera
+            print(f"Error cargando información de símbolos: {e}")
+            return False
+
+        simbolos = {}
+        for datos in exchange_info['symbols']:
+            simbolos[datos['symbol']] = InfoSimbolo.desde_exchange_info(datos)
+
+        with self._lock:
+            self.simbolos = simbolos
+            self.ultima_carga = time.time()
+        return True
+
+    def caducado(self) -> bool:
+        return time.time() - self.ultima_carga > self.ttl
+
+    def obtener(self, simbolo: str) -> Optional[InfoSimbolo]:
+        """Información del símbolo desde memoria (nunca llama a la API: se usa en el camino de las órdenes)
+
+        Si la caché está vacía o caducó sin refresco activo, la recarga se pide al hilo de fondo y se
+        devuelve lo que haya (None si aún no hay nada).
+        """
+        refresco_activo = self._hilo_refresco is not None and self._hilo_refresco.is_alive()
+        if not self.simbolos or (self.caducado() and not refresco_activo):
+            self.solicitar_recarga()
+        return self.simbolos.get(simbolo)
+
+    def solicitar_recarga(self):
+        """Recargar cuanto antes en el hilo de refresco (lo arranca si no estaba en marcha)"""
+        self.iniciar_refresco()
+        self._recargar.set()
+
+    def iniciar_refresco(self):
+        """Refrescar la caché en un hilo de fondo cada ttl segundos"""
+        if self._hilo_refresco is not None and self._hilo_refresco.is_alive():
+            return
+        self._detener.clear()
+        self._hilo_refresco = threading.Thread(target=self._refrescar_periodicamente, daemon=True)
+        self._hilo_refresco.start()
+
+    def detener_refresco(self):
+        self._detener.set()
+        self._recargar.set()
+
+    def _refrescar_periodicamente(self):
+        while True:
+            # Cada ttl segundos o en cuanto se pida una recarga
+            self._recargar.wait(self.ttl)
+            self._recargar.clear()
+            if self._detener.is_set():
+                break
+            self.cargar()
@@ -0,0 +1,93 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from decodificacion import VelaKline
+
+# El 1 de enero de 1970 fue jueves: las velas semanales de Binance empiezan el lunes 5 a las 00:00 UTC
+DESFASE_SEMANA_MS = 4 * 86_400_000
+
+def intervalo_ms(temporalidad: str) -> int:
+    """Duración en milisegundos de una temporalidad de Binance ('1m', '1h', '1d'...)"""
+    unidades = {'m': 60_000, 'h': 3_600_000, 'd': 86_400_000, 'w': 604_800_000}
+    return int(temporalidad[:-1]) * unidades[temporalidad[-1]]
+
+def inicio_vela(timestamp: int, temporalidad: str) -> int:
+    """Apertura (ms, UTC) de la vela de la temporalidad que contiene a timestamp"""
+    duracion = intervalo_ms(temporalidad)
+    desfase = DESFASE_SEMANA_MS if temporalidad.endswith('w') else 0
+    return timestamp - (timestamp - desfase) % duracion
+
+class VelaEnCurso:
+    """Vela de una temporalidad mayor que se va completando con las velas base"""
+    __slots__ = ('timestamp', 'open', 'high', 'low', 'close', 'volume', 'completa')
+
+    def __init__(self, timestamp: int, open: float, high: float, low: float, close: float, volume: float,
+                 completa: bool):
+        self.timestamp = timestamp
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        # Se vio desde su primera vela base (una vela empezada a medias no se emite)
+        self.completa = completa
+
+class Remuestreador:
+    """Velas de temporalidades mayores construidas en O(1) por vela base cerrada, alineadas como las de Binance"""
+
+    def __init__(self, base: str = '1m', destinos: Iterable[str] = ('1h',), simbolo: str = ''):
+        self.base = base
+        self.base_ms = intervalo_ms(base)
+        self.simbolo = simbolo
+        # temporalidad -> (duración, desfase) en ms
+        self.destinos: Dict[str, Tuple[int, int]] = {}
+        for temporalidad in destinos:
+            duracion = intervalo_ms(temporalidad)
+            if duracion <= self.base_ms or duracion % self.base_ms:
+                raise ValueError(f"{temporalidad} no es múltiplo de la temporalidad base {base}")
+            self.destinos[temporalidad] = (duracion, DESFASE_SEMANA_MS if temporalidad.endswith('w') else 0)
+        self.en_curso: Dict[str, Optional[VelaEnCurso]] = {temporalidad: None for temporalidad in self.destinos}
+        self.ultimo_timestamp: Optional[int] = None
+
+    def agregar(self, timestamp: int, open: float, high: float, low: float, close: float,
+                volume: float) -> List[VelaKline]:
+        """Incorporar una vela base cerrada; devuelve las velas mayores que cierra (en orden de temporalidad)"""
+        if self.ultimo_timestamp is not None and timestamp <= self.ultimo_timestamp:
+            return []  # Duplicada o desordenada
+        self.ultimo_timestamp = timestamp
+        cerradas = []
+        for temporalidad, (duracion, desfase) in self.destinos.items():
+            inicio = timestamp - (timestamp - desfase) % duracion
+            vela = self.en_curso[temporalidad]
+            if vela is not None and vela.timestamp != inicio:
+                # Hueco en la base: la vela anterior ya cerró aunque no llegara su última vela base
+                if vela.completa:
+                    cerradas.append(self._cerrar(temporalidad, vela, duracion))
+                vela = None
+            if vela is None:
+                vela = self.en_curso[temporalidad] = VelaEnCurso(inicio, open, high, low, close, volume,
+                                                                 timestamp == inicio)
+            else:
+                if high > vela.high:
+                    vela.high = high
+                if low < vela.low:
+                    vela.low = low
+                vela.close = close
+                vela.volume += volume
+            if timestamp + self.base_ms == inicio + duracion:
+                # Última vela base del intervalo: la vela mayor cierra a la vez que ella
+                if vela.completa:
+                    cerradas.append(self._cerrar(temporalidad, vela, duracion))
+                self.en_curso[temporalidad] = None
+        return cerradas
+
+    def _cerrar(self, temporalidad: str, vela: VelaEnCurso, duracion: int) -> VelaKline:
+        return VelaKline(self.simbolo, temporalidad, vela.timestamp, vela.timestamp + duracion - 1, vela.open,
+                         vela.high, vela.low, vela.close, vela.volume, True, vela.timestamp + duracion)
+
+    def parcial(self, temporalidad: str) -> Optional[VelaKline]:
+        """Vela aún abierta de una temporalidad (None si no hay o empezó a medias)"""
+        vela = self.en_curso[temporalidad]
+        if vela is None or not vela.completa:
+            return None
+        return VelaKline(self.simbolo, temporalidad, vela.timestamp, vela.timestamp + self.destinos[temporalidad][0] - 1,
+                         vela.open, vela.high, vela.low, vela.close, vela.volume, False,
+                         self.ultimo_timestamp + self.base_ms)
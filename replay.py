@@ -0,0 +1,191 @@
+import argparse
+import asyncio
+import contextlib
+import heapq
+import json
+import os
+import sys
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+from config import CONFIG_TRADING
+from decodificacion import VelaKline
+from diario_operaciones import DiarioOperaciones
+from estrategia import intervalo_ms
+from exchange_simulado import ExchangeSimulado
+from main import TradingBot
+from pipeline import resumir_tiempos
+from registro_mercado import LectorMercado
+
+class RelojVirtual:
+    """Reloj en segundos que avanza con los eventos reproducidos en lugar de con el tiempo real"""
+
+    def __init__(self, ahora: float = 0.0):
+        self.ahora = ahora
+
+    def __call__(self) -> float:
+        return self.ahora
+
+def mensajes_kline(velas: Dict, activo: str, temporalidad: str, prioridad: int) -> Iterator[Tuple]:
+    """Klines cerradas ya decodificadas, como las entrega el WebSocket, ordenables por hora de evento"""
+    duracion = intervalo_ms(temporalidad)
+    columnas = [velas[c].tolist() for c in ('timestamp', 'open', 'high', 'low', 'close', 'volume', 'recibido')]
+    for t, o, h, l, c, v, recibido in zip(*columnas):
+        # Si no se grabó la hora de evento se usa la de cierre de la vela
+        evento = recibido or t + duracion - 1
+        yield evento, prioridad, activo, temporalidad, VelaKline(activo, temporalidad, t, t + duracion - 1,
+                                                                 o, h, l, c, v, True, evento)
+
+def cargar_mensajes(lector: LectorMercado, activos: List[str], desde: Optional[int],
+                    hasta: Optional[int]) -> Iterator[Tuple]:
+    """Mezclar por hora de evento las klines grabadas de todos los activos; a igualdad, primero el MACD"""
+    fuentes = []
+    for activo in activos:
+        for prioridad, temporalidad in enumerate((CONFIG_TRADING['temporalidad_macd'],
+                                                  CONFIG_TRADING['temporalidad_operaciones'])):
+            velas = lector.velas(activo, temporalidad, desde, hasta)
+            fuentes.append(mensajes_kline(velas, activo, temporalidad, prioridad))
+    return heapq.merge(*fuentes, key=lambda mensaje: mensaje[:2])
+
+class ReplayBot:
+    """Reproduce mensajes grabados a través de los callbacks reales de TradingBot con un reloj virtual"""
+
+    def __init__(self, bot, api: ExchangeSimulado, reloj: RelojVirtual):
+        self.bot = bot
+        self.api = api
+        self.reloj = reloj
+        self.senales: List[Dict] = []
+        self.tiempos: Dict[str, List[float]] = {'kline_operaciones': [], 'kline_macd': [], 'precio': [], 'ordenes': []}
+        self.mensajes = 0
+        for activo, estrategia in bot.estrategias.items():
+            estrategia.generar_senal = self._registrar_senales(activo, estrategia.generar_senal)
+
+    def _registrar_senales(self, activo: str, generar_senal):
+        def generar():
+            senal = generar_senal()
+            if senal:
+                self.senales.append({'activo': activo, 'tipo': senal.tipo, 'precio': senal.precio,
+                                     'timestamp': senal.timestamp, 'atr': senal.atr})
+            return senal
+        return generar
+
+    async def ejecutar_ordenes(self):
+        """Ejecutar en orden las corrutinas de órdenes encoladas: el resultado es determinista"""
+        cola = self.bot.pipeline.cola_ordenes
+        while not cola.empty():
+            corrutina, _ = cola.get_nowait()
+            await corrutina
+
+    async def reproducir(self, mensajes: Iterator[Tuple]):
+        tf_operaciones = CONFIG_TRADING['temporalidad_operaciones']
+        reloj = time.perf_counter
+        for evento, _, activo, temporalidad, data in mensajes:
+            self.reloj.ahora = evento / 1000
+            self.mensajes += 1
+
+            if temporalidad == tf_operaciones:
+                # Sin ticks grabados, el cierre de cada vela hace de markPrice para los TP/SL
+                precio = data.close
+                inicio = reloj()
+                self.bot.procesar_precio(activo, {'e': 'markPriceUpdate', 'p': precio})
+                self.tiempos['precio'].append((reloj() - inicio) * 1000)
+                inicio = reloj()
+                self.bot.procesar_kline_1m(activo, data)
+                self.tiempos['kline_operaciones'].append((reloj() - inicio) * 1000)
+            else:
+                inicio = reloj()
+                self.bot.procesar_kline_macd(activo, data)
+                self.tiempos['kline_macd'].append((reloj() - inicio) * 1000)
+
+            if not self.bot.pipeline.cola_ordenes.empty():
+                inicio = reloj()
+                await self.ejecutar_ordenes()
+                self.tiempos['ordenes'].append((reloj() - inicio) * 1000)
+
+    def resultado(self) -> Dict:
+        """Señales y operaciones sin campos que dependan del tiempo real (comparables con un golden)"""
+        # Del diario: en memoria solo queda la ventana de las últimas cerradas
+        self.bot.diario.volcar()
+        operaciones = self.bot.diario.consultar()
+        return {'senales': self.senales, 'operaciones': operaciones}
+
+def comparar_golden(resultado: Dict, golden: Dict) -> List[str]:
+    """Diferencias entre una reproducción y su salida de referencia"""
+    diferencias = []
+    for clave in ('senales', 'operaciones'):
+        actual, esperado = resultado[clave], golden[clave]
+        if len(actual) != len(esperado):
+            diferencias.append(f"{clave}: {len(actual)} en lugar de {len(esperado)}")
+        for i, (a, b) in enumerate(zip(actual, esperado)):
+            if a != b:
+                diferencias.append(f"{clave}[{i}]: {a} != {b}")
+                break
+    return diferencias
+
+async def reproducir_registro(directorio: str, desde: Optional[int] = None, hasta: Optional[int] = None,
+                              archivo_operaciones: str = 'replay_operaciones.csv', silencioso: bool = True) -> Tuple[Dict, Dict]:
+    """Reproducir lo grabado en un directorio y devolver (resultado, métricas)"""
+    # Diario propio de la reproducción, exportado a CSV al terminar
+    archivo_diario = os.path.splitext(archivo_operaciones)[0] + '.db'
+    for ruta in (archivo_diario, archivo_diario + '-wal', archivo_diario + '-shm'):
+        if os.path.exists(ruta):
+            os.remove(ruta)
+
+    reloj = RelojVirtual()
+    api = ExchangeSimulado()
+    bot = TradingBot(api=api, reloj=reloj, grabar=False, diario=DiarioOperaciones(archivo_diario))
+    replay = ReplayBot(bot, api, reloj)
+    mensajes = cargar_mensajes(LectorMercado(directorio), bot.activos, desde, hasta)
+
+    inicio = time.perf_counter()
+    salida = open(os.devnull, 'w') if silencioso else sys.stdout
+    with contextlib.redirect_stdout(salida):
+        await replay.reproducir(mensajes)
+    duracion = time.perf_counter() - inicio
+    if silencioso:
+        salida.close()
+    bot.diario.volcar()
+    bot.diario.exportar_csv(archivo_operaciones)
+    bot.diario.cerrar()
+
+    metricas = {
+        'mensajes': replay.mensajes,
+        'segundos': duracion,
+        'mensajes_por_segundo': replay.mensajes / duracion if duracion else 0.0,
+        'etapas': {etapa: resumir_tiempos(tiempos) for etapa, tiempos in replay.tiempos.items()}
+    }
+    return replay.resultado(), metricas
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reproducción determinista de datos grabados a través de TradingBot")
+    parser.add_argument('--registro', required=True, help="Directorio de GrabadorMercado")
+    parser.add_argument('--desde', type=int, default=None, help="Timestamp inicial (ms)")
+    parser.add_argument('--hasta', type=int, default=None, help="Timestamp final (ms)")
+    parser.add_argument('--golden', help="JSON de referencia con el que comparar señales y operaciones")
+    parser.add_argument('--guardar-golden', help="Guardar el resultado como nuevo JSON de referencia")
+    parser.add_argument('--salida', default='replay_operaciones.csv', help="CSV de operaciones de la reproducción")
+    parser.add_argument('--verbose', action='store_true', help="Mostrar los mensajes del bot")
+    args = parser.parse_args()
+
+    resultado, metricas = asyncio.run(reproducir_registro(args.registro, args.desde, args.hasta,
+                                                          args.salida, not args.verbose))
+
+    print(f"✅ {metricas['mensajes']} mensajes en {metricas['segundos']:.2f}s "
+          f"({metricas['mensajes_por_segundo']:.0f} mensajes/s)")
+    for etapa, tiempos in metricas['etapas'].items():
+        print(f"   {etapa:<18} {tiempos}")
+    print(f"   Señales: {len(resultado['senales'])}, operaciones: {len(resultado['operaciones'])}")
+
+    if args.guardar_golden:
+        with open(args.guardar_golden, 'w') as f:
+            json.dump(resultado, f, indent=2)
+        print(f"   Golden guardado en {args.guardar_golden}")
+
+    if args.golden:
+        with open(args.golden) as f:
+            diferencias = comparar_golden(json.loads(json.dumps(resultado)), json.load(f))
+        if diferencias:
+            print("❌ La reproducción no coincide con el golden:")
+            for diferencia in diferencias:
+                print(f"   {diferencia}")
+            sys.exit(1)
+        print("✅ Coincide con el golden")
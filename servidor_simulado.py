@@ -0,0 +1,473 @@
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+import socket
+import tempfile
+import time
+import zlib
+from collections import deque
+from typing import Dict, List, Optional
+from aiohttp import web, WSMsgType
+from config import CONFIG_SERVIDOR_SIMULADO, CONFIG_TRADING, CONFIG_ENDPOINTS
+from decodificacion import hora_evento
+from estrategia import intervalo_ms
+from exchange_simulado import ExchangeSimulado
+from pipeline import resumir_tiempos
+from registro_simbolos import InfoSimbolo
+
+LIMITE_KLINES = 1500  # Máximo de velas por petición de /fapi/v1/klines
+SEPARADORES_JSON = (',', ':')  # JSON compacto, como el de Binance
+
+def simbolos_simulados(cantidad: int) -> List[str]:
+    """Activos configurados más 'cantidad' símbolos sintéticos"""
+    activos = CONFIG_TRADING.get('activos') or [CONFIG_TRADING['activo']]
+    return list(activos) + [f"SIM{i:03d}USDT" for i in range(cantidad)]
+
+def precio_sintetico(simbolo: str, t_ms: int) -> float:
+    """Precio determinista en función del tiempo: el historial REST y los streams siempre coinciden"""
+    semilla = zlib.crc32(simbolo.encode())
+    base = 30000.0 if simbolo == 'BTCUSDT' else 10.0 + semilla % 1000
+    t = t_ms / 1000 + semilla % 86400
+    # Ondas de 6 h, 40 min, 7 min y 50 s: cruces de MACD tanto en 1h como en 1m
+    variacion = (0.03 * math.sin(t * 2 * math.pi / 21600) + 0.01 * math.sin(t * 2 * math.pi / 2400) +
+                 0.004 * math.sin(t * 2 * math.pi / 420) + 0.001 * math.sin(t * 2 * math.pi / 50))
+    return round(base * math.exp(variacion), 2)
+
+def kline_sintetica(simbolo: str, inicio: int, duracion: int, hasta: int) -> tuple:
+    """(open, high, low, close, volume) de la vela que empieza en 'inicio', hasta el instante 'hasta'"""
+    fin = min(inicio + duracion - 1, hasta)
+    muestras = [precio_sintetico(simbolo, inicio + (fin - inicio) * k // 7) for k in range(8)]
+    volumen = round((zlib.crc32(simbolo.encode()) % 100 + 1) * (fin - inicio + 1) / duracion, 3)
+    return muestras[0], max(muestras), min(muestras), muestras[-1], volumen
+
+class ServidorSimulado:
+    """Imitación local de la API REST y WebSocket de Binance Futures sobre ExchangeSimulado"""
+
+    def __init__(self, config: Optional[Dict] = None):
+        self.config = config or CONFIG_SERVIDOR_SIMULADO
+        self.simbolos = simbolos_simulados(self.config['simbolos'])
+        info = {simbolo: InfoSimbolo(simbolo, 0.001, 0.001, 0.01, 5.0, 3, 2) for simbolo in self.simbolos}
+        self.exchange = ExchangeSimulado(self.config['balance'], simbolos=info)
+        self.exchange.suscribir(self.publicar_evento)
+        # Los TP/SL se crean como órdenes algorítmicas (algoId) y al dispararse generan una orden normal
+        self.ordenes_algo = set()
+        self._ids_disparo = itertools.count(1_000_000_000)
+        self.listen_key = f"simulado{random.getrandbits(64):016x}"
+        self.colas_usuario: List[asyncio.Queue] = []
+        self.mensajes_enviados = 0
+        self.peticiones = 0
+        self.errores_inyectados = 0
+        self.desconexiones = 0
+
+    def crear_app(self) -> web.Application:
+        app = web.Application(middlewares=[self.inyectar_fallos])
+        app.router.add_get('/api/v3/ping', self.ping)
+        app.router.add_get('/fapi/v1/ping', self.ping)
+        app.router.add_get('/api/v3/time', self.hora)
+        app.router.add_get('/fapi/v1/time', self.hora)
+        app.router.add_get('/fapi/v1/exchangeInfo', self.exchange_info)
+        app.router.add_get('/fapi/v1/klines', self.klines)
+        app.router.add_get('/fapi/v2/ticker/price', self.ticker)
+        app.router.add_get('/fapi/v1/ticker/price', self.ticker)
+        app.router.add_get('/fapi/v2/account', self.cuenta)
+        app.router.add_post('/fapi/v1/leverage', self.apalancamiento)
+        app.router.add_post('/fapi/v1/marginType', self.tipo_margen)
+        app.router.add_post('/fapi/v1/order', self.crear_orden)
+        app.router.add_delete('/fapi/v1/order', self.cancelar_orden)
+        app.router.add_post('/fapi/v1/algoOrder', self.crear_orden_algo)
+        app.router.add_delete('/fapi/v1/algoOrder', self.cancelar_orden_algo)
+        app.router.add_post('/fapi/v1/listenKey', self.listen_key_crear)
+        app.router.add_put('/fapi/v1/listenKey', self.listen_key_renovar)
+        app.router.add_delete('/fapi/v1/listenKey', self.listen_key_renovar)
+        app.router.add_get('/stream', self.stream_combinado)
+        app.router.add_get('/ws/{streams:.+}', self.stream_individual)
+        return app
+
+    @web.middleware
+    async def inyectar_fallos(self, request: web.Request, handler):
+        """Latencia y errores configurables en las peticiones REST (los WebSocket no pasan por aquí)"""
+        if request.path.startswith(('/ws/', '/stream')):
+            return await handler(request)
+        self.peticiones += 1
+        retardo = self.config['latencia_ms'] + random.uniform(0, self.config['jitter_ms'])
+        if retardo > 0:
+            await asyncio.sleep(retardo / 1000)
+        if random.random() < self.config['tasa_errores']:
+            self.errores_inyectados += 1
+            return self.error(-1001, "Internal error; unable to process your request. Please try again.", 500)
+        return await handler(request)
+
+    @staticmethod
+    def error(codigo: int, mensaje: str, estado: int = 400) -> web.Response:
+        """Error con el formato de Binance (python-binance lo convierte en BinanceAPIException)"""
+        return web.json_response({'code': codigo, 'msg': mensaje}, status=estado)
+
+    @staticmethod
+    async def parametros(request: web.Request) -> Dict[str, str]:
+        """Parámetros de la query y del cuerpo; la firma HMAC no se comprueba"""
+        parametros = dict(request.query)
+        if request.can_read_body:
+            parametros.update(await request.post())
+        return parametros
+
+    def precio(self, simbolo: str) -> float:
+        """Precio actual de un símbolo; también mueve el exchange (dispara TP/SL)"""
+        precio = precio_sintetico(simbolo, int(time.time() * 1000))
+        self.exchange.actualizar_precio(simbolo, precio)
+        return precio
+
+    # --- REST -------------------------------------------------------------------
+
+    async def ping(self, request: web.Request) -> web.Response:
+        return web.json_response({})
+
+    async def hora(self, request: web.Request) -> web.Response:
+        return web.json_response({'serverTime': int(time.time() * 1000)})
+
+    async def exchange_info(self, request: web.Request) -> web.Response:
+        simbolos = [{
+            'symbol': simbolo,
+            'status': 'TRADING',
+            'contractType': 'PERPETUAL',
+            'quantityPrecision': 3,
+            'pricePrecision': 2,
+            'filters': [
+                {'filterType': 'PRICE_FILTER', 'tickSize': '0.01', 'minPrice': '0.01', 'maxPrice': '1000000'},
+                {'filterType': 'LOT_SIZE', 'stepSize': '0.001', 'minQty': '0.001', 'maxQty': '1000'},
+                {'filterType': 'MIN_NOTIONAL', 'notional': '5'}
+            ]
+        } for simbolo in self.simbolos]
+        return web.json_response({'timezone': 'UTC', 'serverTime': int(time.time() * 1000), 'symbols': simbolos})
+
+    async def klines(self, request: web.Request) -> web.Response:
+        parametros = await self.parametros(request)
+        simbolo = parametros['symbol']
+        duracion = intervalo_ms(parametros['interval'])
+        limite = min(int(parametros.get('limit', 500)), LIMITE_KLINES)
+        ahora = int(time.time() * 1000)
+        hasta = min(int(parametros.get('endTime', ahora)), ahora)
+        if 'startTime' in parametros:
+            inicio = -(-int(parametros['startTime']) // duracion) * duracion
+        else:
+            inicio = (hasta // duracion - limite + 1) * duracion
+
+        klines = []
+        for t in range(inicio, hasta + 1, duracion):
+            if len(klines) >= limite:
+                break
+            o, h, l, c, v = kline_sintetica(simbolo, t, duracion, ahora)
+            volumen_quote = round(v * c, 2)
+            klines.append([t, str(o), str(h), str(l), str(c), str(v), t + duracion - 1, str(volumen_quote),
+                           100, str(v / 2), str(volumen_quote / 2), '0'])
+        return web.json_response(klines)
+
+    async def ticker(self, request: web.Request) -> web.Response:
+        simbolo = (await self.parametros(request))['symbol']
+        return web.json_response({'symbol': simbolo, 'price': str(self.precio(simbolo)),
+                                  'time': int(time.time() * 1000)})
+
+    async def cuenta(self, request: web.Request) -> web.Response:
+        return web.json_response(self.exchange.get_account_info())
+
+    async def apalancamiento(self, request: web.Request) -> web.Response:
+        parametros = await self.parametros(request)
+        self.exchange.set_leverage(parametros['symbol'], int(parametros['leverage']))
+        return web.json_response({'symbol': parametros['symbol'], 'leverage': int(parametros['leverage']),
+                                  'maxNotionalValue': '1000000'})
+
+    async def tipo_margen(self, request: web.Request) -> web.Response:
+        parametros = await self.parametros(request)
+        simbolo, tipo = parametros['symbol'], parametros['marginType']
+        if self.exchange.tipos_margen.get(simbolo, 'CROSSED') == tipo:
+            return self.error(-4046, "No need to change margin type.")
+        if self.exchange.set_margin_type(simbolo, tipo) is None:
+            return self.error(-4048, "Margin type cannot be changed if there exists position.")
+        return web.json_response({'code': 200, 'msg': 'success'})
+
+    def _orden(self, parametros: Dict[str, str], stop_price: Optional[float]) -> Optional[Dict]:
+        self.precio(parametros['symbol'])
+        return self.exchange.create_order(
+            parametros['symbol'], parametros['side'], float(parametros['quantity']),
+            parametros.get('type', 'MARKET'), stop_price=stop_price,
+            reduce_only=parametros.get('reduceOnly', '').lower() == 'true'
+        )
+
+    async def crear_orden(self, request: web.Request) -> web.Response:
+        parametros = await self.parametros(request)
+        orden = self._orden(parametros, float(parametros['stopPrice']) if 'stopPrice' in parametros else None)
+        if orden is None:
+            return self.error(-2010, "Order rejected by the simulated exchange.")
+        return web.json_response(orden)
+
+    async def cancelar_orden(self, request: web.Request) -> web.Response:
+        parametros = await self.parametros(request)
+        orden = self.exchange.cancel_order(parametros['symbol'], int(parametros['orderId']))
+        if orden is None:
+            return self.error(-2011, "Unknown order sent.")
+        return web.json_response(orden)
+
+    async def crear_orden_algo(self, request: web.Request) -> web.Response:
+        parametros = await self.parametros(request)
+        orden = self._orden(parametros, float(parametros['triggerPrice']))
+        if orden is None:
+            return self.error(-2021, "Order would immediately trigger.")
+        self.ordenes_algo.add(orden['orderId'])
+        return web.json_response({
+            'algoId': orden['orderId'], 'clientAlgoId': parametros.get('clientAlgoId', orden['clientOrderId']),
+            'algoType': 'CONDITIONAL', 'orderType': orden['type'], 'symbol': orden['symbol'],
+            'side': orden['side'], 'quantity': parametros['quantity'], 'triggerPrice': parametros['triggerPrice'],
+            'algoStatus': 'NEW', 'reduceOnly': orden['reduceOnly'], 'createTime': int(time.time() * 1000)
+        })
+
+    async def cancelar_orden_algo(self, request: web.Request) -> web.Response:
+        parametros = await self.parametros(request)
+        algo_id = int(parametros['algoId'])
+        if self.exchange.cancel_order(parametros['symbol'], algo_id) is None:
+            return self.error(-2011, "Unknown order sent.")
+        return web.json_response({'algoId': algo_id, 'code': '200', 'msg': 'success'})
+
+    async def listen_key_crear(self, request: web.Request) -> web.Response:
+        return web.json_response({'listenKey': self.listen_key})
+
+    async def listen_key_renovar(self, request: web.Request) -> web.Response:
+        return web.json_response({})
+
+    # --- User data stream ---------------------------------------------------------
+
+    def publicar_evento(self, evento: Dict):
+        """Reenviar los eventos del exchange al user data stream, traduciendo las órdenes algorítmicas"""
+        orden = evento['o']
+        if orden['i'] in self.ordenes_algo:
+            algo = {'caid': orden['c'], 'aid': orden['i'], 'at': 'CONDITIONAL', 'o': orden['o'],
+                    's': orden['s'], 'S': orden['S'], 'q': orden['q'], 'tp': orden['sp'], 'R': orden['R']}
+            if orden['x'] == 'TRADE':
+                self.ordenes_algo.discard(orden['i'])
+                algo['X'], algo['ai'] = 'TRIGGERED', next(self._ids_disparo)
+                self._enviar_usuario({'e': 'ALGO_UPDATE', 'E': evento['E'], 'o': algo})
+                evento = {**evento, 'o': {**orden, 'i': algo['ai'], 'c': f"sim_{algo['ai']}", 'o': 'MARKET'}}
+            else:
+                algo['X'] = orden['X']
+                if orden['X'] != 'NEW':
+                    self.ordenes_algo.discard(orden['i'])
+                evento = {'e': 'ALGO_UPDATE', 'E': evento['E'], 'o': algo}
+        self._enviar_usuario(evento)
+
+    def _enviar_usuario(self, evento: Dict):
+        texto = json.dumps(evento, separators=SEPARADORES_JSON)
+        for cola in self.colas_usuario:
+            cola.put_nowait(texto)
+
+    async def stream_usuario(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        cola = asyncio.Queue()
+        self.colas_usuario.append(cola)
+        lector = asyncio.create_task(self._descartar_entrantes(ws))
+        try:
+            while not ws.closed:
+                await ws.send_str(await cola.get())
+                self.mensajes_enviados += 1
+        except ConnectionResetError:
+            pass
+        finally:
+            self.colas_usuario.remove(cola)
+            lector.cancel()
+        return ws
+
+    # --- Streams de mercado -------------------------------------------------------
+
+    async def stream_combinado(self, request: web.Request) -> web.WebSocketResponse:
+        return await self.emitir_streams(request, request.query.get('streams', '').split('/'), True)
+
+    async def stream_individual(self, request: web.Request) -> web.WebSocketResponse:
+        streams = request.match_info['streams']
+        if streams == self.listen_key:
+            return await self.stream_usuario(request)
+        return await self.emitir_streams(request, streams.split('/'), False)
+
+    @staticmethod
+    async def _descartar_entrantes(ws: web.WebSocketResponse):
+        # Leer es lo que hace que aiohttp responda a los ping del cliente
+        async for mensaje in ws:
+            if mensaje.type == WSMsgType.ERROR:
+                break
+
+    async def emitir_streams(self, request: web.Request, streams: List[str], combinado: bool) -> web.WebSocketResponse:
+        """Enviar mensajes_por_segundo mensajes de cada stream hasta que el cliente se desconecte"""
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        lector = asyncio.create_task(self._descartar_entrantes(ws))
+        intervalo = 1 / self.config['mensajes_por_segundo']
+        velas_actuales: Dict[str, int] = {}
+        siguiente = time.perf_counter()
+        try:
+            while not ws.closed:
+                ahora = int(time.time() * 1000)
+                for stream in streams:
+                    for payload in self.mensajes_stream(stream, ahora, velas_actuales):
+                        await ws.send_str(json.dumps({'stream': stream, 'data': payload} if combinado else payload,
+                                                     separators=SEPARADORES_JSON))
+                        self.mensajes_enviados += 1
+                if random.random() < self.config['tasa_desconexiones']:
+                    self.desconexiones += 1
+                    await ws.close()
+                    break
+                # Ritmo fijo: si el cliente no da abasto, la contrapresión de send_str lo frena
+                siguiente += intervalo
+                await asyncio.sleep(max(0.0, siguiente - time.perf_counter()))
+        except ConnectionResetError:
+            pass
+        finally:
+            lector.cancel()
+        return ws
+
+    def mensajes_stream(self, stream: str, ahora: int, velas_actuales: Dict[str, int]) -> List[Dict]:
+        """Mensajes de un stream (<símbolo>@kline_<tf>, @markPrice[@1s] o @bookTicker) en este instante"""
+        simbolo, _, tipo = stream.partition('@')
+        simbolo = simbolo.upper()
+        if tipo.startswith('kline_'):
+            temporalidad = tipo[len('kline_'):]
+            duracion = intervalo_ms(temporalidad)
+            inicio = ahora // duracion * duracion
+            mensajes = []
+            anterior = velas_actuales.get(stream)
+            if anterior is not None and anterior < inicio:
+                # Como Binance: la vela se envía cerrada antes de la primera actualización de la siguiente
+                mensajes.append(self._kline(simbolo, temporalidad, anterior, duracion, ahora, True))
+            velas_actuales[stream] = inicio
+            mensajes.append(self._kline(simbolo, temporalidad, inicio, duracion, ahora, False))
+            return mensajes
+        precio = self.precio(simbolo)
+        if tipo.startswith('markPrice'):
+            return [{'e': 'markPriceUpdate', 'E': ahora, 's': simbolo, 'p': f"{precio:.2f}",
+                     'i': f"{precio:.2f}", 'P': f"{precio:.2f}", 'r': '0.00010000', 'T': ahora // 28_800_000 * 28_800_000 + 28_800_000}]
+        if tipo == 'bookTicker':
+            return [{'e': 'bookTicker', 'u': ahora, 'E': ahora, 'T': ahora, 's': simbolo,
+                     'b': f"{precio - 0.01:.2f}", 'B': '1.000', 'a': f"{precio + 0.01:.2f}", 'A': '1.000'}]
+        return []
+
+    @staticmethod
+    def _kline(simbolo: str, temporalidad: str, inicio: int, duracion: int, ahora: int, cerrada: bool) -> Dict:
+        o, h, l, c, v = kline_sintetica(simbolo, inicio, duracion, ahora)
+        return {'e': 'kline', 'E': ahora, 's': simbolo, 'k': {
+            't': inicio, 'T': inicio + duracion - 1, 's': simbolo, 'i': temporalidad, 'f': 0, 'L': 0,
+            'o': str(o), 'c': str(c), 'h': str(h), 'l': str(l), 'v': str(v), 'n': 100, 'x': cerrada,
+            'q': str(round(v * c, 2)), 'V': str(v / 2), 'Q': str(round(v * c / 2, 2)), 'B': '0'}}
+
+    def estadisticas(self) -> Dict:
+        return {'mensajes_enviados': self.mensajes_enviados, 'peticiones': self.peticiones,
+                'errores_inyectados': self.errores_inyectados, 'desconexiones': self.desconexiones}
+
+def servir(config: Dict):
+    """Arrancar el servidor (bloquea hasta Ctrl+C)"""
+    servidor = ServidorSimulado(config)
+    print(f"Servidor simulado de Binance Futures en http://{config['host']}:{config['puerto']} "
+          f"({len(servidor.simbolos)} símbolos, {config['mensajes_por_segundo']} mensajes/s por stream)")
+    web.run_app(servidor.crear_app(), host=config['host'], port=config['puerto'], print=None)
+
+def esperar_puerto(host: str, puerto: int, timeout: float = 10.0):
+    limite = time.time() + timeout
+    while True:
+        try:
+            socket.create_connection((host, puerto), timeout=1).close()
+            return
+        except OSError:
+            if time.time() > limite:
+                raise
+            time.sleep(0.1)
+
+def medir_latencia(callback, latencias: deque):
+    """Envolver un callback para medir el tiempo desde la hora de evento del servidor (E)"""
+    def medido(data):
+        callback(data)
+        latencias.append(time.time() * 1000 - hora_evento(data))
+    return medido
+
+async def medir_bot(segundos: float) -> Dict:
+    """Ejecutar TradingBot contra el servidor simulado y medir rendimiento y latencias"""
+    # Importación diferida: el proceso del servidor no necesita el bot
+    from main import TradingBot
+    bot = TradingBot(grabar=False)
+    tarea = asyncio.create_task(bot.run())
+    while not bot.running:
+        if tarea.done():
+            tarea.result()
+        await asyncio.sleep(0.1)
+
+    latencias = deque(maxlen=1_000_000)
+    for stream, callback in list(bot.api.callbacks.items()):
+        bot.api.callbacks[stream] = medir_latencia(callback, latencias)
+
+    # Las conexiones pueden tardar en establecerse y en recuperar huecos por REST
+    await asyncio.sleep(2)
+    inicial, inicio = bot.api.mensajes_recibidos, time.perf_counter()
+    await asyncio.sleep(segundos)
+    mensajes, duracion = bot.api.mensajes_recibidos - inicial, time.perf_counter() - inicio
+    estadisticas = bot.pipeline.estadisticas()
+
+    bot.stop()
+    await asyncio.gather(tarea, return_exceptions=True)
+    return {
+        'activos': len(bot.activos),
+        'streams': len(bot.streams) + len(bot.streams_precio),
+        'mensajes': mensajes,
+        'mensajes_por_segundo': mensajes / duracion,
+        'latencia_evento_estrategia': resumir_tiempos(latencias),
+        'pipeline': estadisticas,
+        'operaciones_abiertas': len(bot.operaciones_activas()),
+        'operaciones_cerradas': bot.estadisticas.operaciones
+    }
+
+def prueba_carga(config: Dict, segundos: float) -> Dict:
+    """Servidor en otro proceso y el bot completo (todos los símbolos simulados) en este"""
+    proceso = multiprocessing.Process(target=servir, args=(config,), daemon=True)
+    proceso.start()
+    try:
+        esperar_puerto(config['host'], config['puerto'])
+        CONFIG_ENDPOINTS['rest'] = f"http://{config['host']}:{config['puerto']}"
+        CONFIG_ENDPOINTS['ws'] = f"ws://{config['host']}:{config['puerto']}"
+        CONFIG_TRADING['activos'] = simbolos_simulados(config['simbolos'])
+        # Caché de velas, CSV de operaciones y grabaciones del bot fuera del directorio real
+        os.chdir(tempfile.mkdtemp(prefix='carga_'))
+        return asyncio.run(medir_bot(segundos))
+    finally:
+        # Sin cierre ordenado: aiohttp esperaría a los handlers de streams, que no terminan nunca
+        proceso.kill()
+        proceso.join()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor local que imita Binance Futures (REST + WebSocket)")
+    parser.add_argument('--puerto', type=int, default=CONFIG_SERVIDOR_SIMULADO['puerto'])
+    parser.add_argument('--simbolos', type=int, default=CONFIG_SERVIDOR_SIMULADO['simbolos'],
+                        help="Símbolos sintéticos además de los configurados")
+    parser.add_argument('--mensajes-por-segundo', type=float, default=CONFIG_SERVIDOR_SIMULADO['mensajes_por_segundo'],
+                        help="Mensajes por stream y segundo")
+    parser.add_argument('--latencia-ms', type=float, default=CONFIG_SERVIDOR_SIMULADO['latencia_ms'])
+    parser.add_argument('--jitter-ms', type=float, default=CONFIG_SERVIDOR_SIMULADO['jitter_ms'])
+    parser.add_argument('--tasa-errores', type=float, default=CONFIG_SERVIDOR_SIMULADO['tasa_errores'])
+    parser.add_argument('--tasa-desconexiones', type=float, default=CONFIG_SERVIDOR_SIMULADO['tasa_desconexiones'])
+    parser.add_argument('--carga', type=float, metavar='SEGUNDOS',
+                        help="Ejecutar el bot contra el servidor durante SEGUNDOS y medir su rendimiento")
+    args = parser.parse_args()
+
+    config = dict(CONFIG_SERVIDOR_SIMULADO, puerto=args.puerto, simbolos=args.simbolos,
+                  mensajes_por_segundo=args.mensajes_por_segundo, latencia_ms=args.latencia_ms,
+                  jitter_ms=args.jitter_ms, tasa_errores=args.tasa_errores,
+                  tasa_desconexiones=args.tasa_desconexiones)
+
+    if args.carga is None:
+        servir(config)
+    else:
+        resultado = prueba_carga(config, args.carga)
+        print(f"\n✅ {resultado['activos']} activos, {resultado['streams']} streams: "
+              f"{resultado['mensajes_por_segundo']:.0f} mensajes/s")
+        print(f"   Latencia evento → estrategia: {resultado['latencia_evento_estrategia']}")
+        for clave, valor in resultado['pipeline'].items():
+            print(f"   {clave:<22} {valor}")
+        print(f"   Operaciones abiertas: {resultado['operaciones_abiertas']}, "
+              f"cerradas: {resultado['operaciones_cerradas']}")